@@ -1,5 +1,11 @@
 """传感器数据采集客户端包"""
 
-from .client import main
+def main():
+    """启动客户端图形界面
 
-__all__ = ['main'] 
\ No newline at end of file
+    延迟导入，压力测试等无界面工具只使用 client.sensor 时不加载 PyQt5。
+    """
+    from .client import main as client_main
+    client_main()
+
+__all__ = ['main']
@@ -1,38 +1,316 @@
+import os
 import sys
 import socket
+import random
+import logging
 import time
-import json
-from threading import Thread, Event
-from typing import Tuple
+import argparse
+from collections import deque
+from threading import Thread, Event, Condition
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import quote
 from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
 
 from .ui.main_window import MainWindow
-from .sensor import SensorSimulator
-from common.protocol import Protocol, MessageType
+from .sensor import SensorSimulator, SAMPLE_DTYPE
+from .spool import SampleSpool, DEFAULT_SPOOL_CAPACITY
+from common.protocol import (Protocol, MessageType, FrameDecoder, RECV_BUFFER_SIZE, CODEC_JSON,
+                             MAX_BATCH_SIZE, MAX_BACKFILL_SIZE)
+
+# 建立连接和等待连接响应的超时（秒）
+CONNECT_TIMEOUT = 5.0
+# 自动重连的退避：第 n 次重试前等待 [0, min(上限, 基数 * 2^n)) 之间的随机时间（秒），
+# 避免服务器重启后大量客户端同时重连
+RECONNECT_BASE = 1.0
+RECONNECT_MAX = 60.0
+# 检查连接状态和补传进度的间隔（毫秒）
+LINK_INTERVAL = 100
+# 发送队列超过该字节数时视为发送积压，新的样本改为写入缓存
+SEND_QUEUE_LIMIT = 256 * 1024
+# 发送队列低于该字节数时才发送下一个补传帧，实时数据之前最多排着一个补传帧
+BACKFILL_WATERMARK = 16 * 1024
+# 默认的缓存目录，每个客户端ID一个缓存文件
+DEFAULT_SPOOL_DIR = os.path.join(os.path.expanduser('~'), '.sensor-client', 'spool')
+
+class ServerLink:
+    """一次服务器连接的发送队列和收发线程
+    
+    所有消息由发送线程按入队顺序写入 socket，界面线程不会因网络阻塞。连接中断时
+    队列中未发出的样本写入缓存，之后以补传方式重发。补传样本在收到服务器的补传
+    确认后才从缓存删除，确认之前连接中断的补传帧会在重连后重发。
+    """
+    
+    def __init__(self, sock: socket.socket, decoder: FrameDecoder, spool: SampleSpool,
+                 handle_message: Callable[[dict, float], None]):
+        """初始化连接
+        
+        Args:
+            sock: 已完成握手的 socket
+            decoder: 握手时使用的拆帧器，可能已缓存后续消息的部分数据
+            spool: 样本缓存
+            handle_message: 接收线程中处理服务器消息的回调，参数为消息和到达时间
+        """
+        self.socket = sock
+        self.decoder = decoder
+        self.spool = spool
+        self.handle_message = handle_message
+        self.queue = deque()  # (帧, 实时样本, 补传的 (序号, 样本数))
+        self.queued_bytes = 0
+        self.backfill_pending = False  # 是否有补传帧尚未得到服务器确认
+        self.closing = False
+        self.lost = Event()
+        self.error: Optional[str] = None  # 连接中断的原因
+        self.condition = Condition()
+        self.sender = Thread(target=self._send_loop, daemon=True)
+        self.receiver = Thread(target=self._receive_loop, daemon=True)
+    
+    def start(self):
+        """启动收发线程"""
+        self.sender.start()
+        self.receiver.start()
+    
+    def send(self, frame: bytes, samples: Optional[List[Tuple[float, float, float]]] = None,
+             backfill: Optional[Tuple[int, int]] = None) -> bool:
+        """把一帧放入发送队列
+        
+        Args:
+            frame: 编码后的帧
+            samples: 帧中的实时样本，发送失败时写入缓存
+            backfill: 帧中补传样本在缓存中的 (序号, 样本数)，收到服务器确认后从缓存删除
+        
+        Returns:
+            是否已入队；连接已中断时返回 False，样本直接写入缓存
+        """
+        with self.condition:
+            if not (self.lost.is_set() or self.closing):
+                self.queue.append((frame, samples, backfill))
+                self.queued_bytes += len(frame)
+                if backfill is not None:
+                    self.backfill_pending = True
+                self.condition.notify()
+                return True
+        if samples:
+            self.spool.append(samples)
+        return False
+    
+    def close(self, timeout: float = 1.0):
+        """关闭连接
+        
+        先等待发送线程发出队列中的消息（最多 timeout 秒），然后关闭 socket，
+        仍未发出的样本写入缓存。
+        """
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+        self.sender.join(timeout)
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+        self.sender.join(timeout)
+        self.receiver.join(timeout)
+    
+    def _send_loop(self):
+        """发送线程：依次发出队列中的帧"""
+        while True:
+            with self.condition:
+                while not self.queue and not self.closing:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                item = self.queue.popleft()
+            frame = item[0]
+            try:
+                self.socket.sendall(frame)
+            except OSError as e:
+                self._fail(item, f'发送失败：{e}')
+                return
+            with self.condition:
+                self.queued_bytes -= len(frame)
+
+    def _acknowledge(self, message: dict):
+        """收到补传确认：从缓存删除已被服务器处理的样本，允许发送下一个补传帧"""
+        # 先从缓存删除再允许下一个补传帧，避免重复取出同一段样本
+        self.spool.consume(int(message['sequence']), int(message['count']))
+        with self.condition:
+            self.backfill_pending = False
+    
+    def _fail(self, item: tuple, error: str):
+        """连接中断：置中断标志，未发出的实时样本写入缓存"""
+        with self.condition:
+            self.lost.set()
+            self.error = self.error or error
+            items = [item] + list(self.queue)
+            self.queue.clear()
+            self.queued_bytes = 0
+            self.backfill_pending = False
+        for _, samples, _ in items:
+            if samples:
+                self.spool.append(samples)
+    
+    def _receive_loop(self):
+        """接收线程：解析服务器消息，连接关闭时置中断标志"""
+        error = '服务器已关闭连接'
+        while True:
+            try:
+                data = self.socket.recv(RECV_BUFFER_SIZE)
+            except OSError as e:
+                error = f'接收消息错误：{e}'
+                break
+            if not data:
+                break
+            # 解析消息，一次读取可能包含多条
+            arrived = time.time()
+            try:
+                for message in self.decoder.feed(data):
+                    if message.get('type') == 'backfill_ack':
+                        self._acknowledge(message)
+                    else:
+                        self.handle_message(message, arrived)
+            except Exception as e:
+                # 任何错误都结束接收线程并按连接中断处理，避免连接看似正常却不再接收
+                error = f'接收消息错误：{e}'
+                break
+        if not self.closing:
+            with self.condition:
+                self.error = self.error or error
+                self.lost.set()
+            # 解除发送线程的阻塞，由它把未发出的样本写入缓存
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            with self.condition:
+                self.condition.notify()
+
+def open_connection(host: str, port: int, client_id: str) -> Tuple[socket.socket, FrameDecoder, dict, List[dict]]:
+    """建立连接并完成握手，会阻塞，在后台线程中调用
+
+    Args:
+        host: 服务器主机名
+        port: 服务器端口
+        client_id: 客户端ID
+
+    Returns:
+        (socket, 拆帧器, 连接响应, 与响应一起到达的其他消息)
+
+    Raises:
+        OSError: 无法连接或连接中断
+        ConnectionError: 服务器拒绝连接
+    """
+    sock = socket.create_connection((host, port), timeout=CONNECT_TIMEOUT)
+    try:
+        # 发送连接消息并等待服务器响应
+        sock.sendall(Protocol.create_connect_message(client_id))
+        decoder = FrameDecoder()
+        while True:
+            data = sock.recv(RECV_BUFFER_SIZE)
+            if not data:
+                raise ConnectionError('服务器已关闭连接')
+            messages = decoder.feed(data)
+            if messages:
+                break
+        response = messages[0]
+        if not response.get('success', False):
+            raise ConnectionError(response.get('message', '未知错误'))
+        sock.settimeout(None)
+    except BaseException:
+        sock.close()
+        raise
+    return sock, decoder, response, messages[1:]
+
+class ConnectWorker(QObject):
+    """在后台线程中建立连接，结果通过信号交回界面线程"""
+    
+    # 尝试编号、open_connection 的结果（失败时为 None）、错误信息（成功时为 None）
+    finished = pyqtSignal(int, object, object)
+    
+    def start(self, attempt: int, host: str, port: int, client_id: str):
+        """开始一次连接尝试"""
+        Thread(target=self._run, args=(attempt, host, port, client_id), daemon=True).start()
+    
+    def _run(self, attempt: int, host: str, port: int, client_id: str):
+        try:
+            result = open_connection(host, port, client_id)
+        except Exception as e:
+            self.finished.emit(attempt, None, str(e))
+            return
+        self.finished.emit(attempt, result, None)
 
 class Client:
-    """传感器数据采集客户端"""
+    """传感器数据采集客户端
+    
+    连接成功后持续采样：连接中断时按带随机抖动的指数退避自动重连，期间的样本写入
+    磁盘缓存；发送积压时新样本同样写入缓存。重连后缓存中的样本以压缩的补传帧按原始
+    时间戳重发，每次只在发送队列空闲时放入一帧，不会阻塞实时数据。建立连接和收发
+    都在后台线程中进行，界面线程不会因网络阻塞。
+    """
     
-    def __init__(self):
-        """初始化客户端"""
+    def __init__(self, batch_size: int = 1, flush_interval: int = 1000, sample_interval: int = 1000,
+                 spool_dir: Optional[str] = DEFAULT_SPOOL_DIR, spool_capacity: int = DEFAULT_SPOOL_CAPACITY,
+                 reconnect_max: float = RECONNECT_MAX):
+        """初始化客户端
+        
+        Args:
+            batch_size: 每个数据帧携带的样本数，达到后立即发送
+            flush_interval: 未攒满一批时的最长发送间隔（毫秒）
+            sample_interval: 传感器采样间隔（毫秒）
+            spool_dir: 缓存文件所在目录，每个客户端ID一个文件；None 表示只缓存在内存中
+            spool_capacity: 最多缓存的样本数
+            reconnect_max: 自动重连的最长等待时间（秒）
+        """
+        if not 1 <= batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f'批量大小应在 1~{MAX_BATCH_SIZE} 之间')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_interval = sample_interval
+        self.spool_dir = spool_dir
+        self.spool_capacity = spool_capacity
+        self.reconnect_max = reconnect_max
         self.window = MainWindow()
         self.sensor = SensorSimulator()
-        self.socket = None
+        self.link: Optional[ServerLink] = None  # 当前连接，重连等待期间为 None
+        self.spool: Optional[SampleSpool] = None
+        self.server = None
         self.client_id = None
         self.is_paused = False
+        self.codec = None  # 握手后确定的消息编码器
+        self.batch_supported = False  # 服务器是否支持批量数据
+        self.backfill_supported = False  # 服务器是否接受补传数据
+        self.pending_samples: List[Tuple[float, float, float]] = []  # 待发送的 (时间戳, 温度, 湿度)
+        self.clock: Optional[Tuple[float, float]] = None  # 最近一次心跳往返得到的 (时钟偏差, 往返时间)
+        self.reconnect_attempt = 0
+        self.connect_attempt = 0  # 连接尝试编号，手动断开后过期的结果被丢弃
+        self.connecting = False
+        self.established = False  # 本次会话是否已连接成功过，之后的失败按重连处理
+        self.backlogged = False  # 是否因发送积压改写缓存，只在状态变化时记录日志
         
         # 创建心跳定时器
         self.heartbeat_timer = QTimer()
         self.heartbeat_timer.timeout.connect(self._send_heartbeat)
         
-        # 创建数据上报定时器
+        # 创建数据采样定时器，断线重连期间继续采样
         self.data_timer = QTimer()
         self.data_timer.timeout.connect(self._send_sensor_data)
         
-        # 创建接收线程停止事件
-        self.stop_event = Event()
-        self.receive_thread = None
+        # 创建批量发送定时器
+        self.flush_timer = QTimer()
+        self.flush_timer.timeout.connect(self._flush_samples)
+        
+        # 创建连接检查定时器：发现连接中断、按发送队列的空闲程度补传缓存
+        self.link_timer = QTimer()
+        self.link_timer.timeout.connect(self._check_link)
+        
+        # 创建重连定时器
+        self.reconnect_timer = QTimer()
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self._reconnect)
+        
+        # 后台连接的结果在界面线程中处理
+        self.connector = ConnectWorker()
+        self.connector.finished.connect(self._on_connect_finished)
         
         # 连接信号
         self.window.connect_clicked.connect(self.connect_to_server)
@@ -47,7 +325,7 @@ class Client:
         
         Args:
             address: 服务器地址字符串（格式：host:port）
-            
+        
         Returns:
             主机名和端口号元组
         """
@@ -57,80 +335,187 @@ class Client:
         except ValueError:
             raise ValueError('服务器地址格式错误，应为 host:port')
     
+    def _open_spool(self, client_id: str) -> SampleSpool:
+        """打开客户端ID对应的缓存，上次运行未补传的样本会在连接后补传"""
+        if self.spool is not None and self.client_id == client_id:
+            return self.spool
+        if self.spool is not None:
+            self.spool.close()
+        path = None
+        if self.spool_dir:
+            path = os.path.join(self.spool_dir, quote(client_id, safe='') + '.spool')
+        self.spool = SampleSpool(path, self.spool_capacity)
+        return self.spool
+    
     def connect_to_server(self, server: str, client_id: str):
-        """连接到服务器"""
+        """连接到服务器，连接在后台进行，结果由 _on_connect_finished 处理"""
+        if self.connecting or self.server is not None:
+            return
         try:
-            host, port = self._parse_server_address(server)
-            
-            # 创建socket连接
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((host, port))
-            
-            # 发送连接消息
-            self.socket.send(Protocol.create_connect_message(client_id))
-            
-            # 等待服务器响应
-            response = json.loads(self.socket.recv(1024).decode('utf-8'))
-            if not response.get('success', False):
-                self.window.log_message(f'连接失败：{response.get("message", "未知错误")}')
-                self.socket.close()
-                self.socket = None
-                return
-            
-            self.client_id = client_id
-            
-            # 更新UI状态
-            self.window.set_connected_state(True)
-            self.window.log_message(f'已连接到服务器 {server}')
-            
-            # 启动定时器（在主线程中）
-            self.heartbeat_timer.start(3000)  # 3秒发送一次心跳
-            self.data_timer.start(1000)  # 1秒上报一次数据
-            
-            # 启动接收线程
-            self.stop_event.clear()
-            self.receive_thread = Thread(target=self._receive_messages)
-            self.receive_thread.start()
-            
+            self._parse_server_address(server)
+            self._open_spool(client_id)
         except Exception as e:
-            self.window.log_message(f'连接失败：{str(e)}')
-            self.disconnect_from_server()
+            self.window.log_message(f'连接失败：{str(e)}', logging.ERROR)
+            return
+        self.server = server
+        self.client_id = client_id
+        self.established = False
+        self.pending_samples.clear()
+        self.window.log_message(f'正在连接服务器 {server}')
+        self._start_connect()
+    
+    def _start_connect(self):
+        """在后台线程中发起一次连接尝试"""
+        host, port = self._parse_server_address(self.server)
+        self.connect_attempt += 1
+        self.connecting = True
+        self.connector.start(self.connect_attempt, host, port, self.client_id)
+    
+    def _on_connect_finished(self, attempt: int, result: Optional[tuple], error: Optional[str]):
+        """处理后台连接的结果，在界面线程中执行
+        
+        Args:
+            attempt: 尝试编号
+            result: open_connection 的结果，失败时为 None
+            error: 错误信息，成功时为 None
+        """
+        if attempt != self.connect_attempt or self.server is None:
+            # 手动断开之后才完成的尝试
+            if result is not None:
+                result[0].close()
+            return
+        self.connecting = False
+        if error is not None:
+            if self.established:
+                self.window.log_message(f'重连失败：{error}', logging.WARNING)
+                self._schedule_reconnect()
+            else:
+                self.window.log_message(f'连接失败：{error}', logging.ERROR)
+                self.disconnect_from_server()
+            return
+        
+        self._start_link(*result)
+        spool = self.spool
+        if self.established:
+            self.window.log_message(f'已重新连接到服务器 {self.server}，待补传 {len(spool)} 条样本')
+            return
+        self.established = True
+        
+        # 更新UI状态
+        self.window.set_connected_state(True)
+        self.window.log_message(f'已连接到服务器 {self.server}')
+        if len(spool):
+            self.window.log_message(f'缓存中有 {len(spool)} 条样本待补传')
+        self.window.set_spool_count(len(spool))
+        
+        # 启动定时器（在主线程中），之后直到手动断开都保持运行
+        self.data_timer.start(self.sample_interval)  # 按采样间隔读取数据
+        if self.batch_size > 1:
+            self.flush_timer.start(self.flush_interval)  # 未攒满一批时定期发送
+        self.link_timer.start(LINK_INTERVAL)
+    
+    def _start_link(self, sock: socket.socket, decoder: FrameDecoder, response: dict, extra: List[dict]):
+        """握手完成后按连接响应确定编码方式，启动收发线程和心跳
+        
+        Args:
+            sock: 已完成握手的 socket
+            decoder: 握手时使用的拆帧器
+            response: 连接响应
+            extra: 与响应一起到达的其他消息
+        """
+        self.codec = Protocol.create_codec(
+            response.get('codec', CODEC_JSON), self.client_id, response.get('session'))
+        # 旧版服务器不分配会话句柄，也不支持批量数据和补传
+        self.batch_supported = 'session' in response
+        self.backfill_supported = bool(response.get('backfill'))
+        if len(self.spool) and not self.backfill_supported:
+            self.window.log_message('服务器不支持补传，缓存的样本暂不发送', logging.WARNING)
+        self.clock = None
+        self.backlogged = False
+        self.reconnect_attempt = 0
+        
+        # 启动收发线程
+        self.link = ServerLink(sock, decoder, self.spool, self._handle_message)
+        self.link.start()
+        for message in extra:
+            self._handle_message(message, time.time())
+        self.heartbeat_timer.start(3000)  # 3秒发送一次心跳
+    
+    def _close_link(self, graceful: bool):
+        """关闭当前连接
+        
+        Args:
+            graceful: 是否先发出待发送的样本和断开消息
+        """
+        self.heartbeat_timer.stop()
+        link, self.link = self.link, None
+        if link is None:
+            return
+        if graceful:
+            # 尚未发送的样本随断开消息一起发出
+            samples, self.pending_samples = self.pending_samples, []
+            if samples:
+                link.send(self._encode_samples(samples), samples)
+            link.send(self.codec.disconnect())
+        link.close()
+    
+    def _check_link(self):
+        """连接检查定时器：连接中断时安排重连，连接空闲时补传缓存"""
+        link = self.link
+        if link is not None and link.lost.is_set():
+            self.window.log_message(f'连接中断：{link.error}', logging.ERROR)
+            self._close_link(graceful=False)
+            self._schedule_reconnect()
+        elif link is not None:
+            self._send_backfill(link)
+        if self.spool is not None:
+            self.window.set_spool_count(len(self.spool))
+    
+    def _schedule_reconnect(self):
+        """按带随机抖动的指数退避安排下一次重连"""
+        limit = min(self.reconnect_max, RECONNECT_BASE * 2 ** min(self.reconnect_attempt, 30))
+        delay = random.uniform(0, limit)
+        self.reconnect_attempt += 1
+        self.window.log_message(f'{delay:.1f} 秒后第 {self.reconnect_attempt} 次重连')
+        self.reconnect_timer.start(int(delay * 1000))
+    
+    def _reconnect(self):
+        """重连定时器：在后台发起重连，失败时由 _on_connect_finished 继续退避"""
+        if self.server is not None and not self.connecting:
+            self._start_connect()
+    
+    def _send_backfill(self, link: ServerLink):
+        """发送队列空闲且上一个补传帧已得到确认时，从缓存取出一批样本补传"""
+        if (not self.backfill_supported or self.is_paused or link.backfill_pending
+                or link.queued_bytes > BACKFILL_WATERMARK or not len(self.spool)):
+            return
+        sequence, records = self.spool.peek(MAX_BACKFILL_SIZE)
+        if records:
+            count = len(records) // SAMPLE_DTYPE.itemsize
+            link.send(self.codec.backfill(records, sequence), backfill=(sequence, count))
+            self.window.log_message(f'补传 {count} 条样本', logging.DEBUG)
     
     def disconnect_from_server(self):
-        """断开与服务器的连接"""
+        """断开与服务器的连接，停止采样和自动重连"""
         # 先停止定时器，避免在断开过程中继续发送数据
         self.heartbeat_timer.stop()
         self.data_timer.stop()
+        self.flush_timer.stop()
+        self.link_timer.stop()
+        self.reconnect_timer.stop()
+        self.server = None
+        # 正在进行的连接尝试过期，结果到达时直接关闭
+        self.connect_attempt += 1
+        self.connecting = False
         
-        # 发送断开连接消息
-        if self.socket and self.client_id:
-            try:
-                self.socket.send(Protocol.create_disconnect_message(self.client_id))
-                # 等待一小段时间确保消息发送完成
-                time.sleep(0.1)
-            except:
-                pass
-        
-        # 停止接收线程
-        if self.receive_thread and self.receive_thread.is_alive():
-            self.stop_event.set()
-            # 关闭socket以解除recv阻塞
-            if self.socket:
-                try:
-                    self.socket.shutdown(socket.SHUT_RDWR)
-                    self.socket.close()
-                except:
-                    pass
-            # 等待接收线程结束
-            self.receive_thread.join(timeout=1.0)
-        
-        # 确保socket已关闭
-        if self.socket:
-            try:
-                self.socket.close()
-            except:
-                pass
-            self.socket = None
+        if self.link is not None:
+            self._close_link(graceful=True)
+        if self.spool is not None:
+            # 重连等待期间采集的样本留在缓存中，下次连接时补传
+            samples, self.pending_samples = self.pending_samples, []
+            self.spool.append(samples)
+            self.spool.flush()
+            self.window.set_spool_count(len(self.spool))
         
         # 更新UI状态
         self.window.set_connected_state(False)
@@ -150,53 +535,98 @@ class Client:
     
     def _send_heartbeat(self):
         """发送心跳包"""
-        if self.socket and self.client_id and not self.is_paused:
-            try:
-                self.socket.send(Protocol.create_heartbeat_message(self.client_id))
-                # 不记录心跳包发送日志，避免日志过多
-            except Exception as e:
-                self.window.log_message('发送心跳包失败')
-                self.disconnect_from_server()
+        if self.link is not None and not self.is_paused:
+            # 不记录心跳包发送日志，避免日志过多
+            self.link.send(self.codec.heartbeat(self.clock))
     
     def _send_sensor_data(self):
-        """发送传感器数据"""
-        if self.socket and self.client_id and not self.is_paused:
-            try:
-                # 获取传感器数据
-                data = self.sensor.get_sensor_data()
-                # 更新UI显示
-                self.window.update_sensor_data(data['temperature'], data['humidity'])
-                # 发送数据
-                self.socket.send(Protocol.create_data_message(self.client_id, data))
-                # 记录发送数据
-                self.window.log_message(f'已发送数据：温度 {data["temperature"]:.1f}°C，湿度 {data["humidity"]:.1f}%')
-            except:
-                self.window.log_message('发送数据失败')
-                self.disconnect_from_server()
+        """采集传感器数据，攒满一批后发送"""
+        if self.client_id and not self.is_paused:
+            # 获取传感器数据
+            data = self.sensor.get_sensor_data()
+            # 更新UI显示
+            self.window.update_sensor_data(data['temperature'], data['humidity'])
+            self.pending_samples.append((time.time(), data['temperature'], data['humidity']))
+            if len(self.pending_samples) >= self.batch_size:
+                self._flush_samples()
     
-    def _receive_messages(self):
-        """接收服务器消息的线程函数"""
-        while not self.stop_event.is_set():
-            try:
-                data = self.socket.recv(1024)
-                if not data:
-                    break
-                
-                # 解析消息
-                message = Protocol.unpack(data)
-                self.window.log_message(f'收到服务器消息：{message}')
-                
-            except Exception as e:
-                if not self.stop_event.is_set():
-                    self.window.log_message(f'接收消息错误：{str(e)}')
-                    self.disconnect_from_server()
-                break
+    def _flush_samples(self):
+        """发送所有待发送的样本，断线或发送积压时写入缓存"""
+        if not self.pending_samples:
+            return
+        samples = self.pending_samples
+        self.pending_samples = []
+        link = self.link
+        backlogged = link is not None and link.queued_bytes > SEND_QUEUE_LIMIT
+        if backlogged != self.backlogged:
+            self.backlogged = backlogged
+            self.window.log_message('发送积压，新数据写入缓存' if backlogged else '发送积压已解除',
+                                    logging.WARNING if backlogged else logging.INFO)
+        if link is None or backlogged:
+            self.spool.append(samples)
+            return
+        if not link.send(self._encode_samples(samples), samples):
+            return
+        # 记录发送数据
+        if len(samples) > 1 and self.batch_supported:
+            self.window.log_message(f'已发送 {len(samples)} 条数据', logging.DEBUG)
+        else:
+            for _, temperature, humidity in samples:
+                self.window.log_message(f'已发送数据：温度 {temperature:.1f}°C，湿度 {humidity:.1f}%',
+                                        logging.DEBUG)
+    
+    def _encode_samples(self, samples: List[Tuple[float, float, float]]) -> bytes:
+        """编码样本
+        
+        Args:
+            samples: (时间戳, 温度, 湿度) 元组列表
+        
+        Returns:
+            编码后的字节串，无样本时为空
+        """
+        if len(samples) > 1 and self.batch_supported:
+            return self.codec.data_batch(samples)
+        # 单个样本或旧版服务器逐条编码，合并为一次发送
+        return b''.join(self.codec.data({'temperature': temperature, 'humidity': humidity})
+                        for _, temperature, humidity in samples)
+    
+    def _handle_message(self, message: dict, arrived: float):
+        """处理服务器消息，在接收线程中调用
+        
+        Args:
+            message: 服务器消息
+            arrived: 消息到达时间
+        """
+        if message.get('type') == 'heartbeat_ack':
+            # 结果随下一次心跳上报，服务器据此校正延迟统计
+            self.clock = Protocol.clock_sample(message, arrived)
+            return
+        self.window.log_message(f'收到服务器消息：{message}')
 
 def main():
     """主函数"""
-    app = QApplication(sys.argv)
-    client = Client()
+    parser = argparse.ArgumentParser(description='传感器数据采集客户端')
+    parser.add_argument('--batch-size', type=int, default=1, help='每个数据帧携带的样本数')
+    parser.add_argument('--flush-interval', type=int, default=1000, help='批量发送的最长间隔（毫秒）')
+    parser.add_argument('--sample-interval', type=int, default=1000, help='传感器采样间隔（毫秒）')
+    parser.add_argument('--spool-dir', default=DEFAULT_SPOOL_DIR,
+                        help=f'断线期间样本的缓存目录，每个客户端ID一个文件（默认 {DEFAULT_SPOOL_DIR}）')
+    parser.add_argument('--memory-spool', action='store_true',
+                        help='只在内存中缓存样本，客户端退出后未补传的样本丢失')
+    parser.add_argument('--spool-capacity', type=int, default=DEFAULT_SPOOL_CAPACITY,
+                        help='最多缓存的样本数，写满后丢弃最早的样本')
+    parser.add_argument('--reconnect-max', type=float, default=RECONNECT_MAX,
+                        help='自动重连的最长等待时间（秒）')
+    parser.add_argument('--log-file', help='同时写入的日志文件，按大小轮转')
+    args, qt_args = parser.parse_known_args()
+    
+    app = QApplication(sys.argv[:1] + qt_args)
+    client = Client(args.batch_size, args.flush_interval, args.sample_interval,
+                    None if args.memory_spool else args.spool_dir, args.spool_capacity,
+                    args.reconnect_max)
+    if args.log_file:
+        client.window.log_buffer.add_file_sink(args.log_file)
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
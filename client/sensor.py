@@ -1,39 +1,160 @@
-import random
 import time
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+# 每次采样温度、湿度的最大变化量
+TEMP_STEP = 0.5
+HUMIDITY_STEP = 2.0
+# 与二进制批量样本（BINARY_SAMPLE）布局一致的记录类型：网络字节序的时间戳、温度、湿度
+SAMPLE_DTYPE = np.dtype([('timestamp', '>f8'), ('temperature', '>f4'), ('humidity', '>f4')])
+# 单个传感器采样时一次预取的随机数对数，逐个调用 Generator 的开销远大于取数
+SCALAR_BLOCK = 256
+
+Selection = Union[None, int, slice, np.ndarray, List[int]]
+
+class SensorArraySimulator:
+    """多个传感器的向量化模拟器
+
+    所有传感器的温度、湿度保存在两个 NumPy 数组中，每次采样对整组（或选中的
+    子集）做一次向量化的随机游走、限幅和取整。随机数来自带种子的 Generator，
+    相同种子得到相同的序列，可用于复现测试。
+    """
+
+    def __init__(self, count: int, temp_range: Tuple[float, float] = (15.0, 30.0),
+                 humidity_range: Tuple[float, float] = (30.0, 80.0), seed: Optional[int] = None):
+        """初始化模拟器
+
+        Args:
+            count: 传感器数
+            temp_range: 温度范围（最小值，最大值）
+            humidity_range: 湿度范围（最小值，最大值）
+            seed: 随机数种子，None 表示不固定
+        """
+        self.temp_range = temp_range
+        self.humidity_range = humidity_range
+        self.rng = np.random.default_rng(seed)
+        self.temperature = np.full(count, (temp_range[0] + temp_range[1]) / 2)
+        self.humidity = np.full(count, (humidity_range[0] + humidity_range[1]) / 2)
+        self._steps: List[Tuple[float, float]] = []  # 预取的 (温度变化, 湿度变化)，从末尾取用
+
+    def __len__(self) -> int:
+        return len(self.temperature)
+
+    def step(self, select: Selection = None) -> Tuple[np.ndarray, np.ndarray]:
+        """推进一次采样
+
+        温度每次变化不超过 ±0.5 度，湿度不超过 ±2%，结果限制在范围内并保留一位小数。
+
+        Args:
+            select: 参与采样的传感器（序号、切片或序号数组），None 表示全部
+
+        Returns:
+            选中传感器的 (温度, 湿度)；select 为整数时为两个浮点数
+        """
+        if isinstance(select, (int, np.integer)):
+            return self._step_one(int(select))
+        if select is None:
+            select = slice(None)
+        temperature = self.temperature[select]
+        humidity = self.humidity[select]
+        rng = self.rng
+        temperature = temperature + rng.uniform(-TEMP_STEP, TEMP_STEP, len(temperature))
+        humidity = humidity + rng.uniform(-HUMIDITY_STEP, HUMIDITY_STEP, len(humidity))
+        np.clip(temperature, *self.temp_range, out=temperature)
+        np.clip(humidity, *self.humidity_range, out=humidity)
+        self.temperature[select] = temperature
+        self.humidity[select] = humidity
+        return np.round(temperature, 1), np.round(humidity, 1)
+
+    def _step_one(self, index: int) -> Tuple[float, float]:
+        """单个传感器的采样，标量运算比数组运算快"""
+        if not self._steps:
+            self._steps = (self.rng.uniform(-1, 1, (SCALAR_BLOCK, 2)) * (TEMP_STEP, HUMIDITY_STEP)).tolist()
+        temp_step, humidity_step = self._steps.pop()
+        temperature = float(self.temperature[index]) + temp_step
+        humidity = float(self.humidity[index]) + humidity_step
+        temperature = max(self.temp_range[0], min(self.temp_range[1], temperature))
+        humidity = max(self.humidity_range[0], min(self.humidity_range[1], humidity))
+        self.temperature[index] = temperature
+        self.humidity[index] = humidity
+        return round(temperature, 1), round(humidity, 1)
+
+    def samples(self, timestamp: Optional[float] = None,
+                select: Selection = None) -> List[Tuple[float, float, float]]:
+        """推进一次采样，返回可直接交给编码器的 (时间戳, 温度, 湿度) 元组列表
+
+        Args:
+            timestamp: 样本时间戳，None 表示当前时间
+            select: 参与采样的传感器，None 表示全部
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        temperature, humidity = self.step(select)
+        return [(timestamp, t, h) for t, h in zip(temperature.tolist(), humidity.tolist())]
+
+    def records(self, timestamp: Optional[float] = None, select: Selection = None) -> np.ndarray:
+        """推进一次采样，返回与二进制批量样本布局一致的记录数组
+
+        每条记录的 tobytes() 与 BINARY_SAMPLE.pack(时间戳, 温度, 湿度) 相同。
+
+        Args:
+            timestamp: 样本时间戳，None 表示当前时间
+            select: 参与采样的传感器，None 表示全部
+        """
+        temperature, humidity = self.step(select)
+        records = np.empty(len(temperature), dtype=SAMPLE_DTYPE)
+        records['timestamp'] = time.time() if timestamp is None else timestamp
+        records['temperature'] = temperature
+        records['humidity'] = humidity
+        return records
+
+    def sensor(self, index: int) -> 'SensorSimulator':
+        """返回单个传感器的视图，采样只推进该传感器"""
+        return SensorSimulator.view(self, index)
 
 class SensorSimulator:
-    """传感器模拟器类"""
-    
+    """传感器模拟器类
+
+    单个传感器的接口，内部是 SensorArraySimulator 中的一个元素：独立创建时
+    使用只有一个传感器的模拟器，也可以通过 SensorArraySimulator.sensor() 得到
+    共享数组中某个传感器的视图。
+    """
+
     def __init__(self, temp_range: Tuple[float, float] = (15.0, 30.0),
-                 humidity_range: Tuple[float, float] = (30.0, 80.0)):
+                 humidity_range: Tuple[float, float] = (30.0, 80.0), seed: Optional[int] = None):
         """初始化传感器模拟器
-        
+
         Args:
             temp_range: 温度范围（最小值，最大值）
             humidity_range: 湿度范围（最小值，最大值）
+            seed: 随机数种子，None 表示不固定
         """
-        self.temp_range = temp_range
-        self.humidity_range = humidity_range
-        self._last_temp = (temp_range[0] + temp_range[1]) / 2
-        self._last_humidity = (humidity_range[0] + humidity_range[1]) / 2
-        
+        self._array = SensorArraySimulator(1, temp_range, humidity_range, seed)
+        self._index = 0
+
+    @classmethod
+    def view(cls, array: SensorArraySimulator, index: int) -> 'SensorSimulator':
+        """创建共享模拟器中某个传感器的视图"""
+        simulator = cls.__new__(cls)
+        simulator._array = array
+        simulator._index = index
+        return simulator
+
+    @property
+    def temp_range(self) -> Tuple[float, float]:
+        return self._array.temp_range
+
+    @property
+    def humidity_range(self) -> Tuple[float, float]:
+        return self._array.humidity_range
+
     def get_sensor_data(self) -> Dict[str, float]:
-        # 生成新的温度值，与上一次的值相差不超过0.5度
-        new_temp = self._last_temp + random.uniform(-0.5, 0.5)
-        # 温度在指定范围内
-        new_temp = max(self.temp_range[0], min(self.temp_range[1], new_temp))
-        self._last_temp = new_temp
-        
-        # 生成新的湿度值，与上一次的值相差不超过2%
-        new_humidity = self._last_humidity + random.uniform(-2, 2)
-        # 确保湿度在指定范围内
-        new_humidity = max(self.humidity_range[0], min(self.humidity_range[1], new_humidity))
-        self._last_humidity = new_humidity
-        
+        # 温度与上一次相差不超过0.5度，湿度不超过2%，并限制在指定范围内
+        temperature, humidity = self._array._step_one(self._index)
         return {
-            "temperature": round(new_temp, 1),
-            "humidity": round(new_humidity, 1)
+            "temperature": temperature,
+            "humidity": humidity
         }
 
 if __name__ == "__main__":
@@ -41,4 +162,4 @@ if __name__ == "__main__":
     simulator = SensorSimulator()
     for _ in range(5):
         print(simulator.get_sensor_data())
-        time.sleep(1) 
\ No newline at end of file
+        time.sleep(1)
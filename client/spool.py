@@ -0,0 +1,172 @@
+import os
+import mmap
+import threading
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from .sensor import SAMPLE_DTYPE
+
+# 默认缓存的样本数（1Hz 采样约一天，每个样本16字节）
+DEFAULT_SPOOL_CAPACITY = 86400
+
+SPOOL_MAGIC = b'SPOL'
+SPOOL_VERSION = 1
+HEADER_SIZE = 64
+# 缓存文件头：数据写入之后再更新序号和计数，计数之外的内容视为未写入
+HEADER = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('capacity', '<u8'),
+    ('first', '<u8'),  # 最早一个样本的序号（自创建以来的累计编号）
+    ('count', '<u8'),
+    ('dropped', '<u8'),  # 缓存写满后丢弃的样本数
+])
+
+class SampleSpool:
+    """断线和发送积压期间的样本缓存
+
+    定长记录的环形缓冲区，通过 mmap 映射到文件，客户端重启后仍可补传；不指定文件时
+    使用匿名映射，只在进程内有效（客户端以 --memory-spool 启动时）。记录布局与二进制批量样本（BINARY_SAMPLE）一致，
+    取出的字节可直接压缩发送。写满后覆盖最早的样本并计入 dropped。
+
+    取出和确认分开：peek() 返回最早若干样本及其起始序号，发送成功后以 consume()
+    按序号确认，期间被覆盖的样本不会被重复删除。可在任意线程调用。
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = DEFAULT_SPOOL_CAPACITY):
+        """打开或创建缓存
+
+        Args:
+            path: 缓存文件路径，None 表示只缓存在内存中；文件已存在且有效时沿用其中的容量和数据，
+                无效（文件头不符或长度不足）时重新创建
+            capacity: 最多缓存的样本数
+        """
+        self.path = path
+        if path is not None:
+            existing = self._existing_capacity(path)
+            if existing is None:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._create(path, capacity)
+            else:
+                capacity = existing
+        self.capacity = capacity
+        size = HEADER_SIZE + capacity * SAMPLE_DTYPE.itemsize
+        if path is None:
+            self._map = mmap.mmap(-1, size)
+            self._map[:HEADER_SIZE] = self._initial_header(capacity)
+        else:
+            with open(path, 'r+b') as f:
+                self._map = mmap.mmap(f.fileno(), size)
+        self._header = np.frombuffer(self._map, dtype=HEADER, count=1)
+        self._records = np.frombuffer(self._map, dtype=SAMPLE_DTYPE, count=capacity, offset=HEADER_SIZE)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _existing_capacity(path: str) -> Optional[int]:
+        """返回已有缓存文件的容量，文件不存在或无效时返回 None"""
+        try:
+            size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                data = f.read(HEADER_SIZE)
+        except OSError:
+            return None
+        if len(data) < HEADER_SIZE:
+            return None
+        header = np.frombuffer(data, dtype=HEADER, count=1)[0]
+        capacity = int(header['capacity'])
+        if (header['magic'] != SPOOL_MAGIC or header['version'] != SPOOL_VERSION or capacity <= 0
+                or int(header['count']) > capacity
+                or size < HEADER_SIZE + capacity * SAMPLE_DTYPE.itemsize):
+            return None
+        return capacity
+
+    @staticmethod
+    def _initial_header(capacity: int) -> bytes:
+        header = np.zeros(1, dtype=HEADER)
+        header['magic'] = SPOOL_MAGIC
+        header['version'] = SPOOL_VERSION
+        header['capacity'] = capacity
+        return header.tobytes().ljust(HEADER_SIZE, b'\0')
+
+    @classmethod
+    def _create(cls, path: str, capacity: int):
+        with open(path, 'wb') as f:
+            f.write(cls._initial_header(capacity))
+            f.truncate(HEADER_SIZE + capacity * SAMPLE_DTYPE.itemsize)
+
+    def __len__(self) -> int:
+        return int(self._header['count'][0])
+
+    @property
+    def dropped(self) -> int:
+        """缓存写满后丢弃的样本数"""
+        return int(self._header['dropped'][0])
+
+    def append(self, samples: Sequence[Tuple[float, float, float]]):
+        """追加一批样本，写满时覆盖最早的样本
+
+        Args:
+            samples: (时间戳, 温度, 湿度) 元组序列
+        """
+        if not len(samples):
+            return
+        columns = np.asarray(samples, dtype=np.float64)[-self.capacity:]
+        records = np.empty(len(columns), dtype=SAMPLE_DTYPE)
+        records['timestamp'] = columns[:, 0]
+        records['temperature'] = columns[:, 1]
+        records['humidity'] = columns[:, 2]
+        with self._lock:
+            header = self._header[0]
+            first, count = int(header['first']), int(header['count'])
+            # 每个样本占用一个序号，一次写入超过容量时被截掉的样本也计入
+            end = first + count + len(samples)
+            position = (end - len(records)) % self.capacity
+            head = min(len(records), self.capacity - position)
+            self._records[position:position + head] = records[:head]
+            self._records[:len(records) - head] = records[head:]
+            # 数据写完后再更新文件头
+            remaining = min(self.capacity, count + len(records))
+            header['dropped'] += count + len(samples) - remaining
+            header['first'] = end - remaining
+            header['count'] = remaining
+
+    def peek(self, limit: int) -> Tuple[int, bytes]:
+        """取出最早的至多 limit 个样本，不从缓存中删除
+
+        Returns:
+            (第一个样本的序号, 按 BINARY_SAMPLE 布局连续存放的样本)，缓存为空时字节为空
+        """
+        with self._lock:
+            header = self._header[0]
+            first, count = int(header['first']), min(int(header['count']), limit)
+            position = first % self.capacity
+            head = min(count, self.capacity - position)
+            data = self._records[position:position + head].tobytes()
+            if head < count:
+                data += self._records[:count - head].tobytes()
+            return first, data
+
+    def consume(self, sequence: int, count: int):
+        """确认序号 [sequence, sequence + count) 的样本已发送，从缓存中删除
+
+        确认前已被覆盖的部分忽略；只删除最早的连续部分。
+        """
+        with self._lock:
+            header = self._header[0]
+            first, available = int(header['first']), int(header['count'])
+            end = min(sequence + count, first + available)
+            if sequence <= first < end:
+                header['first'] = end
+                header['count'] = available - (end - first)
+
+    def flush(self):
+        """把缓存写回文件"""
+        if self.path is not None:
+            self._map.flush()
+
+    def close(self):
+        """写回并释放映射"""
+        self.flush()
+        self._header = self._records = None
+        self._map.close()
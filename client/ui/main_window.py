@@ -1,8 +1,14 @@
+import logging
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QLabel, QPushButton, QLineEdit, QTextEdit)
-from PyQt5.QtCore import Qt, pyqtSignal
+                             QLabel, QPushButton, QLineEdit, QPlainTextEdit, QComboBox)
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer
 from PyQt5.QtGui import QIcon
 
+from common.logbuffer import LogBuffer, LOG_LEVELS
+
+# 日志刷新间隔（毫秒）
+LOG_FLUSH_INTERVAL_MS = 100
+
 class MainWindow(QMainWindow):
     """客户端主窗口"""
     
@@ -13,9 +19,15 @@ class MainWindow(QMainWindow):
     
     def __init__(self):
         super().__init__()
+        # 日志缓冲区可在任意线程写入，由定时器批量显示
+        self.log_buffer = LogBuffer()
         self.init_ui()
         self.is_paused = False
         
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self._flush_logs)
+        self.log_timer.start(LOG_FLUSH_INTERVAL_MS)
+        
     def init_ui(self):
         """初始化UI"""
         self.setWindowTitle('传感器数据采集客户端')
@@ -70,8 +82,23 @@ class MainWindow(QMainWindow):
         layout.addLayout(data_layout)
         
         # 创建日志显示部分
-        self.log_text = QTextEdit()
+        log_control_layout = QHBoxLayout()
+        log_control_layout.addWidget(QLabel('日志级别:'))
+        self.log_level_combo = QComboBox()
+        for name, level in LOG_LEVELS:
+            self.log_level_combo.addItem(name, level)
+        self.log_level_combo.setCurrentIndex(self.log_level_combo.findData(logging.INFO))
+        self.log_level_combo.currentIndexChanged.connect(self._on_log_level_changed)
+        log_control_layout.addWidget(self.log_level_combo)
+        log_control_layout.addStretch()
+        # 断线或发送积压期间缓存、等待补传的样本数
+        self.spool_label = QLabel('待补传: 0')
+        log_control_layout.addWidget(self.spool_label)
+        layout.addLayout(log_control_layout)
+        
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(self.log_buffer.capacity)
         layout.addWidget(self.log_text)
         
     def _on_connect_clicked(self):
@@ -114,10 +141,32 @@ class MainWindow(QMainWindow):
         self.temp_label.setText(f'温度: {temperature:.1f}°C')
         self.humidity_label.setText(f'湿度: {humidity:.1f}%')
     
-    def log_message(self, message: str):
-        """添加日志消息
+    def set_spool_count(self, count: int):
+        """更新待补传的样本数
+        
+        Args:
+            count: 缓存中的样本数
+        """
+        self.spool_label.setText(f'待补传: {count}')
+    
+    def log_message(self, message: str, level: int = logging.INFO):
+        """添加日志消息，可在任意线程调用
         
         Args:
             message: 日志消息
+            level: 日志级别（logging 模块的级别）
         """
-        self.log_text.append(message) 
\ No newline at end of file
+        self.log_buffer.log(message, level)
+    
+    def _flush_logs(self):
+        """把新日志一次性追加到界面"""
+        min_level = self.log_level_combo.currentData()
+        lines = [record.format() for record in self.log_buffer.drain() if record.level >= min_level]
+        if lines:
+            self.log_text.appendPlainText('\n'.join(lines))
+    
+    def _on_log_level_changed(self):
+        """日志级别变化时按缓冲区内容重新显示"""
+        self._flush_logs()
+        records = self.log_buffer.records(self.log_level_combo.currentData())
+        self.log_text.setPlainText('\n'.join(record.format() for record in records)) 
\ No newline at end of file
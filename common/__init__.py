@@ -1,5 +1,5 @@
 """传感器数据采集系统公共包"""
 
-from .protocol import Protocol, MessageType
+from .protocol import Protocol, MessageType, FrameDecoder, JsonCodec, BinaryCodec
 
-__all__ = ['Protocol', 'MessageType'] 
\ No newline at end of file
+__all__ = ['Protocol', 'MessageType', 'FrameDecoder', 'JsonCodec', 'BinaryCodec']
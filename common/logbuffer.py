@@ -0,0 +1,159 @@
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from logging.handlers import RotatingFileHandler
+from typing import Callable, List, NamedTuple, Optional
+
+# 环形缓冲区默认保留的日志条数
+DEFAULT_LOG_CAPACITY = 2000
+# 相同日志的去重窗口（秒），窗口内重复的日志只记录一次
+DEFAULT_SUPPRESS_WINDOW = 10.0
+# 日志文件轮转参数
+DEFAULT_LOG_FILE_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_FILE_BACKUPS = 5
+
+# 界面上可选的日志级别
+LOG_LEVELS = (
+    ('调试', logging.DEBUG),
+    ('信息', logging.INFO),
+    ('警告', logging.WARNING),
+    ('错误', logging.ERROR),
+)
+_LEVEL_NAMES = {level: name for name, level in LOG_LEVELS}
+
+class LogRecord(NamedTuple):
+    """一条日志"""
+    timestamp: float
+    level: int
+    message: str
+
+    def format(self) -> str:
+        """格式化为一行文本"""
+        text = f"[{time.strftime('%H:%M:%S', time.localtime(self.timestamp))}] {self.message}"
+        if self.level >= logging.WARNING:
+            text = f'{text} [{_LEVEL_NAMES.get(self.level, logging.getLevelName(self.level))}]'
+        return text
+
+class LogBuffer:
+    """有界的日志缓冲区
+
+    可在任意线程写入。日志保存在固定大小的环形缓冲区中，新日志另外暂存，
+    由界面每帧调用 drain() 一次性取出显示，因此内存和界面开销都与日志频率无关。
+    去重窗口内相同级别、相同内容的日志只保留第一条，窗口结束后补记重复次数。
+    同时跟踪的不同日志最多 capacity 条，超出时提前结束最早的去重窗口。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_LOG_CAPACITY,
+                 suppress_window: float = DEFAULT_SUPPRESS_WINDOW,
+                 clock: Callable[[], float] = time.time):
+        """初始化日志缓冲区
+
+        Args:
+            capacity: 保留的日志条数
+            suppress_window: 去重窗口（秒），0 表示不去重
+            clock: 时钟函数，返回秒
+        """
+        self.capacity = capacity
+        self.suppress_window = suppress_window
+        self.clock = clock
+        self.dropped = 0  # 未来得及显示就被挤出的日志数
+        self.suppressed = 0  # 被去重的日志数
+        self._records = deque(maxlen=capacity)
+        self._pending = deque(maxlen=capacity)
+        self._recent = OrderedDict()  # (级别, 内容) -> [窗口开始时间, 重复次数]
+        self._file_handler: Optional[RotatingFileHandler] = None
+        self._lock = threading.Lock()
+
+    def add_file_sink(self, path: str, max_bytes: int = DEFAULT_LOG_FILE_BYTES,
+                      backup_count: int = DEFAULT_LOG_FILE_BACKUPS):
+        """同时写入按大小轮转的日志文件
+
+        Args:
+            path: 日志文件路径
+            max_bytes: 单个文件的最大字节数
+            backup_count: 保留的历史文件数
+        """
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                      encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        with self._lock:
+            if self._file_handler:
+                self._file_handler.close()
+            self._file_handler = handler
+
+    def close(self):
+        """关闭日志文件"""
+        with self._lock:
+            if self._file_handler:
+                self._file_handler.close()
+                self._file_handler = None
+
+    def log(self, message: str, level: int = logging.INFO) -> bool:
+        """写入一条日志
+
+        Args:
+            message: 日志内容
+            level: 日志级别（logging 模块的级别）
+
+        Returns:
+            是否被记录，去重窗口内的重复日志返回 False
+        """
+        now = self.clock()
+        key = (level, message)
+        with self._lock:
+            self._expire(now)
+            if self.suppress_window > 0:
+                entry = self._recent.get(key)
+                if entry is not None:
+                    entry[1] += 1
+                    self.suppressed += 1
+                    return False
+                if len(self._recent) >= self.capacity:
+                    # 不同日志过多时提前结束最早的窗口，去重表的大小不随日志种类增长
+                    self._close_window(now, *self._recent.popitem(last=False))
+                self._recent[key] = [now, 0]
+            self._append(LogRecord(now, level, message))
+        return True
+
+    def drain(self) -> List[LogRecord]:
+        """取出上次调用以来的新日志"""
+        with self._lock:
+            self._expire(self.clock())
+            records = list(self._pending)
+            self._pending.clear()
+        return records
+
+    def records(self, min_level: int = logging.NOTSET) -> List[LogRecord]:
+        """返回缓冲区中不低于指定级别的日志"""
+        with self._lock:
+            return [record for record in self._records if record.level >= min_level]
+
+    def _append(self, record: LogRecord):
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._records.append(record)
+        self._pending.append(record)
+        if self._file_handler:
+            self._file_handler.emit(logging.makeLogRecord({
+                'msg': record.format(), 'levelno': record.level,
+                'levelname': logging.getLevelName(record.level)}))
+
+    def _expire(self, now: float):
+        """结束已过期的去重窗口，有重复时补记一条"""
+        recent = self._recent
+        while recent:
+            key, (started, count) = next(iter(recent.items()))
+            if now - started < self.suppress_window:
+                break
+            del recent[key]
+            self._close_window(now, key, [started, count])
+
+    def _close_window(self, now: float, key: tuple, entry: list):
+        """结束一个去重窗口，有重复时补记一条"""
+        started, count = entry
+        if count:
+            level, message = key
+            # 提前结束的窗口按实际经过的时间记录
+            duration = round(min(now - started, self.suppress_window), 1)
+            self._append(LogRecord(now, level, f'{message}（{duration:g}秒内重复 {count} 次）'))
@@ -1,6 +1,46 @@
 import json
 import time
+import zlib
+import base64
+import struct
 from enum import Enum, auto
+from typing import Dict, List, Optional, Tuple
+
+# 帧头：4字节大端无符号整数，表示后续消息体长度
+FRAME_HEADER = struct.Struct('!I')
+# 单帧最大长度，超过视为非法数据
+MAX_FRAME_SIZE = 1024 * 1024
+# 套接字读取缓冲区大小，一次读取可包含多帧
+RECV_BUFFER_SIZE = 64 * 1024
+
+# 编码方式名称，在 connect/connect_response 握手中协商
+CODEC_JSON = 'json'
+CODEC_BINARY = 'binary'
+# 服务器支持的编码方式
+SUPPORTED_CODECS = (CODEC_BINARY, CODEC_JSON)
+
+# 二进制消息体首字节标识（JSON 消息体总以 '{' 开头，二者不会混淆）
+BINARY_MAGIC = 0xB5
+# 二进制记录布局：标识、消息类型、会话句柄、时间戳（秒，浮点）[、温度、湿度]
+BINARY_CONTROL = struct.Struct('!BBId')
+# 带时钟同步结果的心跳：在控制记录后附加时钟偏差和往返时间（秒，浮点）
+BINARY_HEARTBEAT = struct.Struct('!BBIddd')
+BINARY_DATA = struct.Struct('!BBIdff')
+# 批量数据：标识、消息类型、会话句柄、样本数，其后为 count 个定长样本
+BINARY_BATCH_HEADER = struct.Struct('!BBIH')
+BINARY_SAMPLE = struct.Struct('!dff')
+# 单个批量数据帧最多携带的样本数
+MAX_BATCH_SIZE = 4096
+# 网关多路数据沿用批量数据的帧头（样本数字段为分组数），每组为组头和 count 个定长样本
+BINARY_GROUP_HEADER = struct.Struct('!HH')  # 传感器句柄、样本数
+# 单个网关会话最多注册的传感器数（传感器句柄为16位）
+MAX_GATEWAY_SENSORS = 0xFFFF
+# 补传数据：标识、消息类型、会话句柄、缓存序号、样本数，其后为 zlib 压缩的 count 个定长样本
+BINARY_BACKFILL_HEADER = struct.Struct('!BBIQI')
+# 单个补传帧最多携带的样本数（未压缩256KiB）
+MAX_BACKFILL_SIZE = 16384
+# 补传样本的压缩级别：16384个模拟读数在级别1时压缩到约35%，级别6只再小4%，耗时却是5倍
+BACKFILL_COMPRESS_LEVEL = 1
 
 class MessageType(Enum):
     """消息类型枚举"""
@@ -8,61 +48,583 @@ class MessageType(Enum):
     DISCONNECT = auto()   # 客户端断开
     HEARTBEAT = auto()    # 心跳包
     DATA = auto()         # 数据上报
+    DATA_BATCH = auto()   # 批量数据上报
+    DATA_MULTI = auto()   # 网关多个传感器的数据上报
+    REGISTER = auto()     # 网关注册传感器
+    UNREGISTER = auto()   # 网关注销传感器
+    BACKFILL = auto()     # 断线期间缓存样本的补传
+
+# 二进制解码时使用的整数类型值，避免每条消息构造枚举
+_DATA_TYPE = MessageType.DATA.value
+_DATA_BATCH_TYPE = MessageType.DATA_BATCH.value
+_DATA_MULTI_TYPE = MessageType.DATA_MULTI.value
+_BACKFILL_TYPE = MessageType.BACKFILL.value
+_HEARTBEAT_TYPE = MessageType.HEARTBEAT.value
+_CONTROL_TYPES = {
+    MessageType.HEARTBEAT.value: 'heartbeat',
+    MessageType.DISCONNECT.value: 'disconnect',
+}
+
+class FrameDecoder:
+    """增量帧解码器
+
+    接收任意切分的字节块，按长度前缀拆出完整的消息帧。
+    TCP 可能把多条消息合并到一次读取中，也可能把一条消息拆到两次读取中，
+    未完整的部分会保留在缓冲区中等待后续数据。
+    """
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE):
+        """初始化解码器
+
+        Args:
+            max_frame_size: 单帧最大长度
+        """
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[dict]:
+        """输入字节块并取出其中所有完整消息
+
+        Args:
+            data: 接收到的字节块
+
+        Returns:
+            解析后的消息字典列表（可能为空）
+        """
+        buffer = self._buffer
+        buffer.extend(data)
+        messages = []
+        offset = 0
+        header_size = FRAME_HEADER.size
+        while len(buffer) - offset >= header_size:
+            (length,) = FRAME_HEADER.unpack_from(buffer, offset)
+            if length > self.max_frame_size:
+                raise ValueError(f'消息帧长度超出限制：{length}')
+            end = offset + header_size + length
+            if len(buffer) < end:
+                break
+            messages.append(Protocol.unpack(bytes(buffer[offset + header_size:end])))
+            offset = end
+        # 一次性丢弃已消费的数据，避免逐帧移动缓冲区
+        if offset:
+            del buffer[:offset]
+        return messages
+
+    def pending(self) -> int:
+        """返回缓冲区中尚未组成完整帧的字节数"""
+        return len(self._buffer)
+
+class JsonCodec:
+    """JSON 编码器，兼容旧版客户端，每条消息携带完整的客户端ID"""
+
+    name = CODEC_JSON
+
+    def __init__(self, client_id: str):
+        """初始化编码器
+
+        Args:
+            client_id: 客户端ID
+        """
+        self.client_id = client_id
+
+    def heartbeat(self, clock: Optional[Tuple[float, float]] = None) -> bytes:
+        """编码心跳消息
+
+        Args:
+            clock: 最近一次心跳往返得到的 (时钟偏差, 往返时间)，没有时为 None
+        """
+        return Protocol.create_heartbeat_message(self.client_id, clock)
+
+    def data(self, sensor_data: dict) -> bytes:
+        """编码数据上报消息"""
+        return Protocol.create_data_message(self.client_id, sensor_data)
+
+    def data_batch(self, samples) -> bytes:
+        """编码批量数据上报消息
+
+        Args:
+            samples: (时间戳, 温度, 湿度) 元组序列
+        """
+        return Protocol.create_data_batch_message(self.client_id, samples)
+
+    def data_multi(self, groups) -> bytes:
+        """编码网关多个传感器的数据上报消息
+
+        Args:
+            groups: (传感器ID, 传感器句柄, 样本序列) 序列，JSON 以传感器ID标识
+        """
+        return Protocol.create_data_multi_message(
+            self.client_id, {sensor_id: samples for sensor_id, _, samples in groups})
+
+    def backfill(self, records: bytes, sequence: int) -> bytes:
+        """编码补传消息
+
+        Args:
+            records: 按 BINARY_SAMPLE 布局连续存放的样本，最多 MAX_BACKFILL_SIZE 个
+            sequence: 第一个样本在客户端缓存中的序号，服务器确认时原样返回
+        """
+        return Protocol.create_backfill_message(self.client_id, records, sequence)
+
+    def disconnect(self) -> bytes:
+        """编码断开连接消息"""
+        return Protocol.create_disconnect_message(self.client_id)
+
+class BinaryCodec:
+    """定长二进制编码器
+
+    以整数消息类型和连接时分配的会话句柄代替类型名和客户端ID字符串，
+    一条数据记录仅22字节，服务器端用 struct 直接解析。
+    """
+
+    name = CODEC_BINARY
+
+    def __init__(self, session: int):
+        """初始化编码器
+
+        Args:
+            session: 服务器在 connect_response 中分配的会话句柄
+        """
+        self.session = session
+
+    def heartbeat(self, clock: Optional[Tuple[float, float]] = None) -> bytes:
+        """编码心跳消息
+
+        Args:
+            clock: 最近一次心跳往返得到的 (时钟偏差, 往返时间)，没有时为 None
+        """
+        if clock is None:
+            return Protocol.frame(BINARY_CONTROL.pack(
+                BINARY_MAGIC, MessageType.HEARTBEAT.value, self.session, time.time()))
+        return Protocol.frame(BINARY_HEARTBEAT.pack(
+            BINARY_MAGIC, MessageType.HEARTBEAT.value, self.session, time.time(), *clock))
+
+    def data(self, sensor_data: dict) -> bytes:
+        """编码数据上报消息"""
+        return Protocol.frame(BINARY_DATA.pack(
+            BINARY_MAGIC, MessageType.DATA.value, self.session, time.time(),
+            sensor_data['temperature'], sensor_data['humidity']))
+
+    def data_batch(self, samples) -> bytes:
+        """编码批量数据上报消息
+
+        Args:
+            samples: (时间戳, 温度, 湿度) 元组序列，最多 MAX_BATCH_SIZE 个
+        """
+        if len(samples) > MAX_BATCH_SIZE:
+            raise ValueError(f'批量样本数超出限制：{len(samples)}')
+        pack = BINARY_SAMPLE.pack
+        body = b''.join(pack(*sample) for sample in samples)
+        return Protocol.frame(BINARY_BATCH_HEADER.pack(
+            BINARY_MAGIC, MessageType.DATA_BATCH.value, self.session, len(samples)) + body)
+
+    def data_multi(self, groups) -> bytes:
+        """编码网关多个传感器的数据上报消息
+
+        Args:
+            groups: (传感器ID, 传感器句柄, 样本序列) 序列，二进制以注册时分配的句柄标识，
+                每组最多 MAX_BATCH_SIZE 个样本
+        """
+        if len(groups) > MAX_GATEWAY_SENSORS:
+            raise ValueError(f'分组数超出限制：{len(groups)}')
+        pack = BINARY_SAMPLE.pack
+        parts = []
+        for _, handle, samples in groups:
+            if len(samples) > MAX_BATCH_SIZE:
+                raise ValueError(f'批量样本数超出限制：{len(samples)}')
+            parts.append(BINARY_GROUP_HEADER.pack(handle, len(samples)))
+            parts.extend(pack(*sample) for sample in samples)
+        header = BINARY_BATCH_HEADER.pack(BINARY_MAGIC, MessageType.DATA_MULTI.value, self.session,
+                                          len(groups))
+        return Protocol.frame(header + b''.join(parts))
+
+    def backfill(self, records: bytes, sequence: int) -> bytes:
+        """编码补传消息
+
+        Args:
+            records: 按 BINARY_SAMPLE 布局连续存放的样本，最多 MAX_BACKFILL_SIZE 个
+            sequence: 第一个样本在客户端缓存中的序号，服务器确认时原样返回
+        """
+        count = Protocol.backfill_count(records)
+        return Protocol.frame(BINARY_BACKFILL_HEADER.pack(
+            BINARY_MAGIC, MessageType.BACKFILL.value, self.session, sequence, count)
+            + zlib.compress(records, BACKFILL_COMPRESS_LEVEL))
+
+    def disconnect(self) -> bytes:
+        """编码断开连接消息"""
+        return Protocol.frame(BINARY_CONTROL.pack(
+            BINARY_MAGIC, MessageType.DISCONNECT.value, self.session, time.time()))
+
+    @staticmethod
+    def decode(payload: bytes) -> dict:
+        """解析二进制消息体
+
+        Args:
+            payload: 单帧消息体（不含长度前缀）
+
+        Returns:
+            与 JSON 消息结构一致的字典，以 session 字段代替 client_id
+        """
+        type_value = payload[1]
+        if type_value == _DATA_TYPE:
+            _, _, session, timestamp, temperature, humidity = BINARY_DATA.unpack(payload)
+            return {
+                "type": "data",
+                "session": session,
+                "timestamp": timestamp,
+                "data": {"temperature": temperature, "humidity": humidity}
+            }
+        if type_value == _DATA_BATCH_TYPE:
+            _, _, session, count = BINARY_BATCH_HEADER.unpack_from(payload)
+            body = memoryview(payload)[BINARY_BATCH_HEADER.size:]
+            if len(body) != count * BINARY_SAMPLE.size:
+                raise ValueError('批量数据长度与样本数不符')
+            return {
+                "type": "data_batch",
+                "session": session,
+                "samples": list(BINARY_SAMPLE.iter_unpack(body))
+            }
+        if type_value == _DATA_MULTI_TYPE:
+            _, _, session, count = BINARY_BATCH_HEADER.unpack_from(payload)
+            offset = BINARY_BATCH_HEADER.size
+            groups = []
+            for _ in range(count):
+                handle, samples = BINARY_GROUP_HEADER.unpack_from(payload, offset)
+                offset += BINARY_GROUP_HEADER.size
+                end = offset + samples * BINARY_SAMPLE.size
+                if end > len(payload):
+                    raise ValueError('多路数据长度与样本数不符')
+                groups.append((handle, list(BINARY_SAMPLE.iter_unpack(payload[offset:end]))))
+                offset = end
+            if offset != len(payload):
+                raise ValueError('多路数据长度与样本数不符')
+            return {"type": "data_multi", "session": session, "groups": groups}
+        if type_value == _BACKFILL_TYPE:
+            _, _, session, sequence, count = BINARY_BACKFILL_HEADER.unpack_from(payload)
+            return {"type": "backfill", "session": session, "sequence": sequence,
+                    "samples": Protocol.unpack_backfill(payload[BINARY_BACKFILL_HEADER.size:], count)}
+        if type_value == _HEARTBEAT_TYPE and len(payload) == BINARY_HEARTBEAT.size:
+            _, _, session, timestamp, offset, rtt = BINARY_HEARTBEAT.unpack(payload)
+            return {"type": "heartbeat", "session": session, "timestamp": timestamp,
+                    "clock_offset": offset, "rtt": rtt}
+        if type_value in _CONTROL_TYPES:
+            _, _, session, timestamp = BINARY_CONTROL.unpack(payload)
+            return {"type": _CONTROL_TYPES[type_value], "session": session, "timestamp": timestamp}
+        raise ValueError(f'不支持的二进制消息类型：{type_value}')
 
 class Protocol:
     """通信协议类"""
-    
+
+    @staticmethod
+    def frame(payload: bytes) -> bytes:
+        """为消息体添加长度前缀
+
+        Args:
+            payload: 消息体字节串
+
+        Returns:
+            带帧头的字节串
+        """
+        return FRAME_HEADER.pack(len(payload)) + payload
+
     @staticmethod
-    def pack(msg_type: MessageType, client_id: str, data: dict = None) -> bytes:
+    def pack(msg_type: MessageType, client_id: str, data: dict = None, **fields) -> bytes:
         """打包消息
-    
+
         Args:
             msg_type: 消息类型
             client_id: 客户端ID
             data: 数据内容（可选）
-            
+            fields: 附加字段（可选）
+
         Returns:
-            打包后的字节串
+            打包后的字节串（含长度前缀）
         """
+        # 浮点秒，保留微秒精度，用于计算传输延迟
         message = {
             "type": msg_type.name.lower(),
             "client_id": client_id,
-            "timestamp": int(time.time())
+            "timestamp": time.time()
         }
-        
+
         if data:
             message["data"] = data
-            
-        return json.dumps(message).encode('utf-8')
-    
+        message.update(fields)
+
+        return Protocol.pack_message(message)
+
+    @staticmethod
+    def pack_message(message: dict) -> bytes:
+        """将任意消息字典打包为一帧
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            打包后的字节串（含长度前缀）
+        """
+        return Protocol.frame(json.dumps(message).encode('utf-8'))
+
     @staticmethod
     def unpack(data: bytes) -> dict:
         """解包消息
-        
+
         Args:
-            data: 接收到的字节串
-            
+            data: 单帧消息体（不含长度前缀）
+
         Returns:
             解析后的消息字典
         """
+        if data and data[0] == BINARY_MAGIC:
+            return BinaryCodec.decode(data)
         return json.loads(data.decode('utf-8'))
-    
+
+    @staticmethod
+    def backfill_count(records: bytes) -> int:
+        """检查补传样本的长度并返回样本数
+
+        Raises:
+            ValueError: 长度不是整数个样本或超出 MAX_BACKFILL_SIZE
+        """
+        count, remainder = divmod(len(records), BINARY_SAMPLE.size)
+        if remainder or not 0 < count <= MAX_BACKFILL_SIZE:
+            raise ValueError(f'补传样本数超出限制：{len(records) / BINARY_SAMPLE.size}')
+        return count
+
+    @staticmethod
+    def unpack_backfill(compressed: bytes, count: int) -> List[Tuple[float, float, float]]:
+        """解压补传样本，解压长度以声明的样本数为上限，不会被异常数据放大
+
+        Args:
+            compressed: zlib 压缩的定长样本
+            count: 声明的样本数
+
+        Returns:
+            (时间戳, 温度, 湿度) 元组列表
+
+        Raises:
+            ValueError: 样本数超出限制或解压后的长度与样本数不符
+        """
+        if not 0 < count <= MAX_BACKFILL_SIZE:
+            raise ValueError(f'补传样本数超出限制：{count}')
+        size = count * BINARY_SAMPLE.size
+        decompressor = zlib.decompressobj()
+        try:
+            records = decompressor.decompress(compressed, size)
+        except zlib.error as e:
+            raise ValueError(f'补传数据解压失败：{e}')
+        if len(records) != size or decompressor.unconsumed_tail:
+            raise ValueError('补传数据长度与样本数不符')
+        return list(BINARY_SAMPLE.iter_unpack(records))
+
+    @staticmethod
+    def backfill_samples(message: dict) -> List[Tuple[float, float, float]]:
+        """取出补传消息中的样本，二进制消息在解码时已解压，JSON 消息在此解压"""
+        if 'samples' in message:
+            return message['samples']
+        try:
+            compressed = base64.b64decode(message['records'], validate=True)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f'补传数据格式错误：{e}')
+        return Protocol.unpack_backfill(compressed, message['count'])
+
+    @staticmethod
+    def negotiate_codec(codecs) -> str:
+        """按客户端给出的优先顺序选择双方都支持的编码方式
+
+        Args:
+            codecs: 客户端支持的编码方式列表，旧版客户端不提供
+
+        Returns:
+            协商得到的编码方式名称，默认为JSON
+        """
+        for codec in codecs or ():
+            if codec in SUPPORTED_CODECS:
+                return codec
+        return CODEC_JSON
+
+    @staticmethod
+    def create_codec(codec: str, client_id: str, session: int = None):
+        """按协商结果创建消息编码器
+
+        Args:
+            codec: 编码方式名称
+            client_id: 客户端ID
+            session: 会话句柄（二进制编码需要）
+
+        Returns:
+            JsonCodec 或 BinaryCodec 实例
+        """
+        if codec == CODEC_BINARY and session is not None:
+            return BinaryCodec(session)
+        return JsonCodec(client_id)
+
+    @staticmethod
+    def create_connect_message(client_id: str, codecs=SUPPORTED_CODECS,
+                               sensors: Optional[List[str]] = None) -> bytes:
+        """创建连接消息
+
+        Args:
+            client_id: 客户端ID，网关模式下为网关ID
+            codecs: 客户端支持的编码方式（按优先顺序）
+            sensors: 不为 None 时以网关模式连接，并同时注册这些传感器
+        """
+        if sensors is None:
+            return Protocol.pack(MessageType.CONNECT, client_id, codecs=list(codecs), clock_sync=True)
+        return Protocol.pack(MessageType.CONNECT, client_id, codecs=list(codecs), clock_sync=True,
+                             gateway=True, sensors=list(sensors))
+
+    @staticmethod
+    def create_connect_response(success: bool, message: str,
+                                codec: str = None, session: int = None, backfill: bool = False) -> bytes:
+        """创建连接响应消息
+
+        Args:
+            success: 是否接受连接
+            message: 提示信息
+            codec: 协商得到的编码方式（可选）
+            session: 分配的会话句柄（可选）
+            backfill: 服务器是否接受补传消息
+        """
+        response = {
+            "type": "connect_response",
+            "success": success,
+            "message": message
+        }
+        if codec:
+            response["codec"] = codec
+        if session is not None:
+            response["session"] = session
+        if backfill:
+            response["backfill"] = True
+        return Protocol.pack_message(response)
+
     @staticmethod
-    def create_connect_message(client_id: str) -> bytes:
-        """创建连接消息"""
-        return Protocol.pack(MessageType.CONNECT, client_id)
-    
+    def create_register_message(gateway_id: str, sensors: List[str]) -> bytes:
+        """创建网关注册传感器消息
+
+        Args:
+            gateway_id: 网关ID
+            sensors: 传感器ID列表
+        """
+        return Protocol.pack(MessageType.REGISTER, gateway_id, sensors=list(sensors))
+
+    @staticmethod
+    def create_unregister_message(gateway_id: str, sensors: List[str]) -> bytes:
+        """创建网关注销传感器消息，传感器记为下线
+
+        Args:
+            gateway_id: 网关ID
+            sensors: 传感器ID列表
+        """
+        return Protocol.pack(MessageType.UNREGISTER, gateway_id, sensors=list(sensors))
+
+    @staticmethod
+    def create_register_response(sensors: Dict[str, int], rejected: Dict[str, str]) -> bytes:
+        """创建注册响应消息
+
+        Args:
+            sensors: 注册成功的传感器ID到传感器句柄的映射
+            rejected: 被拒绝的传感器ID到原因的映射
+        """
+        return Protocol.pack_message({"type": "register_response", "sensors": sensors, "rejected": rejected})
+
     @staticmethod
     def create_disconnect_message(client_id: str) -> bytes:
         """创建断开连接消息"""
         return Protocol.pack(MessageType.DISCONNECT, client_id)
-    
+
+    @staticmethod
+    def create_heartbeat_message(client_id: str, clock: Optional[Tuple[float, float]] = None,
+                                 sensors: Optional[List[str]] = None) -> bytes:
+        """创建心跳消息
+
+        Args:
+            client_id: 客户端ID
+            clock: 最近一次心跳往返得到的 (时钟偏差, 往返时间)，没有时为 None
+            sensors: 网关心跳只为这些传感器续期，None 表示全部已注册的传感器
+        """
+        fields = {}
+        if clock is not None:
+            fields.update(clock_offset=clock[0], rtt=clock[1])
+        if sensors is not None:
+            fields['sensors'] = list(sensors)
+        return Protocol.pack(MessageType.HEARTBEAT, client_id, **fields)
+
+    @staticmethod
+    def create_heartbeat_ack(timestamp: float, received: float) -> bytes:
+        """创建心跳应答，供客户端计算时钟偏差
+
+        Args:
+            timestamp: 心跳消息中客户端的发送时间
+            received: 服务器收到心跳的时间
+        """
+        return Protocol.pack_message({"type": "heartbeat_ack", "timestamp": timestamp,
+                                      "received": received, "sent": time.time()})
+
     @staticmethod
-    def create_heartbeat_message(client_id: str) -> bytes:
-        """创建心跳消息"""
-        return Protocol.pack(MessageType.HEARTBEAT, client_id)
-    
+    def create_backfill_ack(sequence: int, count: int) -> bytes:
+        """创建补传确认，服务器处理完一个补传帧后回复，客户端收到后才从缓存删除这些样本
+
+        Args:
+            sequence: 补传帧中第一个样本的缓存序号
+            count: 补传帧的样本数
+        """
+        return Protocol.pack_message({"type": "backfill_ack", "sequence": sequence, "count": count})
+
+    @staticmethod
+    def clock_sample(ack: dict, arrived: float) -> Tuple[float, float]:
+        """根据心跳应答计算时钟偏差和往返时间（与 NTP 的算法相同）
+
+        Args:
+            ack: 心跳应答消息
+            arrived: 客户端收到应答的时间
+
+        Returns:
+            (客户端时钟减服务器时钟, 扣除服务器处理时间后的往返时间)，单位秒
+        """
+        sent, received, replied = ack['timestamp'], ack['received'], ack['sent']
+        offset = ((sent - received) + (arrived - replied)) / 2
+        rtt = (arrived - sent) - (replied - received)
+        return offset, rtt
+
     @staticmethod
     def create_data_message(client_id: str, sensor_data: dict) -> bytes:
         """创建数据上报消息"""
-        return Protocol.pack(MessageType.DATA, client_id, sensor_data) 
\ No newline at end of file
+        return Protocol.pack(MessageType.DATA, client_id, sensor_data)
+
+    @staticmethod
+    def create_data_batch_message(client_id: str, samples) -> bytes:
+        """创建批量数据上报消息
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 元组序列
+        """
+        return Protocol.pack(MessageType.DATA_BATCH, client_id,
+                             samples=[list(sample) for sample in samples])
+
+    @staticmethod
+    def create_data_multi_message(gateway_id: str, groups: Dict[str, object]) -> bytes:
+        """创建网关多个传感器的数据上报消息
+
+        Args:
+            gateway_id: 网关ID
+            groups: 传感器ID到 (时间戳, 温度, 湿度) 元组序列的映射
+        """
+        return Protocol.pack(MessageType.DATA_MULTI, gateway_id,
+                             samples={sensor_id: [list(sample) for sample in samples]
+                                      for sensor_id, samples in groups.items()})
+
+    @staticmethod
+    def create_backfill_message(client_id: str, records: bytes, sequence: int) -> bytes:
+        """创建补传消息，样本保留原始时间戳，压缩后以 base64 放入 JSON
+
+        Args:
+            client_id: 客户端ID
+            records: 按 BINARY_SAMPLE 布局连续存放的样本
+            sequence: 第一个样本在客户端缓存中的序号
+        """
+        count = Protocol.backfill_count(records)
+        data = base64.b64encode(zlib.compress(records, BACKFILL_COMPRESS_LEVEL)).decode('ascii')
+        return Protocol.pack(MessageType.BACKFILL, client_id, sequence=sequence, count=count,
+                             encoding='zlib', records=data)
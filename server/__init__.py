@@ -1,5 +1,5 @@
 """传感器数据采集服务器包"""
 
-from .server import main
+from .cli import main
 
-__all__ = ['main'] 
\ No newline at end of file
+__all__ = ['main']
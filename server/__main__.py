@@ -0,0 +1,5 @@
+"""支持 python -m server 启动服务器"""
+
+from .cli import main
+
+main()
@@ -0,0 +1,469 @@
+import json
+import math
+import logging
+import fnmatch
+import threading
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+# 样本元组中各通道的位置
+CHANNEL_INDEX = {'temperature': 1, 'humidity': 2}
+CHANNEL_NAMES = {'temperature': '温度', 'humidity': '湿度'}
+
+logger = logging.getLogger('server.alerts')
+
+class AlertEvent(NamedTuple):
+    """告警或恢复事件"""
+    timestamp: float
+    client_id: str
+    rule: str  # 规则名称
+    channel: str
+    value: float
+    active: bool  # True 为告警，False 为恢复
+
+    @property
+    def message(self) -> str:
+        """事件描述"""
+        state = '告警' if self.active else '恢复'
+        return f'{self.rule} {state}（{CHANNEL_NAMES.get(self.channel, self.channel)} {self.value:.1f}）'
+
+    def to_dict(self) -> Dict:
+        return {'timestamp': self.timestamp, 'client_id': self.client_id, 'rule': self.rule,
+                'channel': self.channel, 'value': self.value, 'active': self.active}
+
+class AlertRule:
+    """告警规则基类
+
+    规则本身无状态，每个客户端的状态由 new_state() 创建。子类实现单个样本和整批样本
+    两种判定，返回触发条件和恢复条件；告警状态的切换（含滞回）由 AlertEngine 统一处理。
+    两种判定对同一序列的结果必须一致。
+    """
+
+    kind = ''
+
+    def __init__(self, name: str, channel: str, clients: str = '*'):
+        """初始化规则
+
+        Args:
+            name: 规则名称
+            channel: 通道（temperature 或 humidity）
+            clients: 适用的客户端ID通配符
+        """
+        if channel not in CHANNEL_INDEX:
+            raise ValueError(f'未知的通道：{channel}')
+        self.name = name
+        self.channel = channel
+        self.clients = clients
+
+    def matches(self, client_id: str) -> bool:
+        """规则是否适用于客户端"""
+        return fnmatch.fnmatchcase(client_id, self.clients)
+
+    def new_state(self) -> list:
+        """创建一个客户端的规则状态"""
+        return []
+
+    def check(self, state: list, timestamp: float, value: float) -> Tuple[bool, bool]:
+        """判定单个样本
+
+        Returns:
+            (是否满足触发条件, 是否满足恢复条件)
+        """
+        raise NotImplementedError
+
+    def check_array(self, state: list, timestamps: np.ndarray,
+                    values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """判定一批样本，返回逐样本的触发条件和恢复条件"""
+        raise NotImplementedError
+
+class ThresholdRule(AlertRule):
+    """静态阈值：高于 above 或低于 below 时告警，回到阈值内 hysteresis 以上时恢复"""
+
+    kind = 'threshold'
+
+    def __init__(self, name: str, channel: str, above: float = None, below: float = None,
+                 hysteresis: float = 0.0, clients: str = '*'):
+        super().__init__(name, channel, clients)
+        if above is None and below is None:
+            raise ValueError('阈值规则至少需要 above 或 below')
+        self.above = math.inf if above is None else above
+        self.below = -math.inf if below is None else below
+        self.hysteresis = hysteresis
+
+    def check(self, state, timestamp, value):
+        return (value > self.above or value < self.below,
+                self.below + self.hysteresis <= value <= self.above - self.hysteresis)
+
+    def check_array(self, state, timestamps, values):
+        return ((values > self.above) | (values < self.below),
+                (values >= self.below + self.hysteresis) & (values <= self.above - self.hysteresis))
+
+class RateOfChangeRule(AlertRule):
+    """变化率：相邻样本的变化速度超过 max_rate（每秒）时告警"""
+
+    kind = 'rate'
+
+    def __init__(self, name: str, channel: str, max_rate: float, clients: str = '*'):
+        super().__init__(name, channel, clients)
+        self.max_rate = max_rate
+
+    def new_state(self):
+        return [None, None]  # 上一个样本的时间戳和值
+
+    def check(self, state, timestamp, value):
+        last_time, last_value = state
+        state[0], state[1] = timestamp, value
+        if last_time is None or timestamp <= last_time:
+            return False, True
+        exceeded = abs(value - last_value) / (timestamp - last_time) > self.max_rate
+        return exceeded, not exceeded
+
+    def check_array(self, state, timestamps, values):
+        last_time, last_value = state
+        state[0], state[1] = float(timestamps[-1]), float(values[-1])
+        if last_time is None:
+            last_time, last_value = timestamps[0], values[0]
+        dt = np.diff(timestamps, prepend=last_time)
+        dv = np.abs(np.diff(values, prepend=last_value))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            exceeded = (dt > 0) & (dv > self.max_rate * dt)
+        return exceeded, ~exceeded
+
+class FlatlineRule(AlertRule):
+    """平线：数值持续 duration 秒变化不超过 tolerance 时告警（传感器可能卡死）"""
+
+    kind = 'flatline'
+
+    def __init__(self, name: str, channel: str, duration: float, tolerance: float = 0.0,
+                 clients: str = '*'):
+        super().__init__(name, channel, clients)
+        self.duration = duration
+        self.tolerance = tolerance
+
+    def new_state(self):
+        return [None, None]  # 上一个样本的值、最近一次变化的时间
+
+    def check(self, state, timestamp, value):
+        last_value, changed_at = state
+        if last_value is None or abs(value - last_value) > self.tolerance:
+            changed_at = state[1] = timestamp
+        state[0] = value
+        flat = timestamp - changed_at >= self.duration
+        return flat, not flat
+
+    def check_array(self, state, timestamps, values):
+        last_value, changed_at = state
+        previous = np.empty_like(values)
+        previous[1:] = values[:-1]
+        previous[0] = values[0] if last_value is None else last_value
+        changed = np.abs(values - previous) > self.tolerance
+        if last_value is None:
+            changed[0] = True
+        # 每个样本之前最近一次变化的时间
+        change_times = np.where(changed, timestamps, -np.inf)
+        if changed_at is not None:
+            change_times[0] = max(change_times[0], changed_at)
+        change_times = np.maximum.accumulate(change_times)
+        state[0], state[1] = float(values[-1]), float(change_times[-1])
+        flat = timestamps - change_times >= self.duration
+        return flat, ~flat
+
+class ZScoreRule(AlertRule):
+    """Z 分数：偏离指数加权滚动基线超过 threshold 个标准差时告警
+
+    基线为指数加权均值和方差，预热 warmup 个样本后才开始判定。
+    整批判定时把基线的递推展开为累加和，结果与逐样本判定一致。
+    """
+
+    kind = 'zscore'
+
+    def __init__(self, name: str, channel: str, threshold: float = 3.0, alpha: float = 0.05,
+                 warmup: int = 30, clients: str = '*'):
+        super().__init__(name, channel, clients)
+        self.threshold = threshold
+        self.alpha = alpha
+        self.warmup = warmup
+
+    def new_state(self):
+        return [0, 0.0, 0.0]  # 样本数、加权均值、加权方差
+
+    def check(self, state, timestamp, value):
+        count, mean, variance = state
+        if count == 0:
+            state[:] = [1, value, 0.0]
+            return False, True
+        deviation = value - mean
+        outlier = count >= self.warmup and deviation * deviation > self.threshold ** 2 * variance > 0
+        # 指数加权均值和方差的增量更新
+        increment = self.alpha * deviation
+        state[:] = [count + 1, mean + increment, (1 - self.alpha) * (variance + deviation * increment)]
+        return outlier, not outlier
+
+    def check_array(self, state, timestamps, values):
+        count, mean, variance = state
+        if count == 0:
+            # 第一个样本只用于初始化基线
+            self.check(state, timestamps[0], values[0])
+            triggered, cleared = self.check_array(state, timestamps[1:], values[1:]) \
+                if len(values) > 1 else (np.zeros(0, dtype=bool), np.zeros(0, dtype=bool))
+            return np.concatenate(([False], triggered)), np.concatenate(([True], cleared))
+        # 与逐样本更新等价的向量计算：先求出每个样本之前的基线，再判定
+        decay = 1 - self.alpha
+        means = _linear_scan(mean, self.alpha * values, decay)
+        previous_means = np.concatenate(([mean], means[:-1]))
+        deviation = values - previous_means
+        variances = _linear_scan(variance, decay * self.alpha * deviation * deviation, decay)
+        previous_variances = np.concatenate(([variance], variances[:-1]))
+        counts = count + np.arange(len(values))
+        outlier = ((counts >= self.warmup) & (previous_variances > 0)
+                   & (deviation * deviation > self.threshold ** 2 * previous_variances))
+        state[:] = [count + len(values), float(means[-1]), float(variances[-1])]
+        return outlier, ~outlier
+
+def _linear_scan(initial: float, inputs: np.ndarray, decay: float) -> np.ndarray:
+    """向量化计算 y[i] = decay × y[i-1] + inputs[i]，y[-1] = initial
+
+    按 decay 的幂展开为累加和；分段计算，避免 decay 的负幂溢出。
+    """
+    if decay <= 0:
+        return inputs.astype(np.float64)
+    result = np.empty(len(inputs))
+    chunk = max(1, int(18 / -math.log10(decay))) if decay < 1 else len(inputs) or 1
+    previous = initial
+    for start in range(0, len(inputs), chunk):
+        part = inputs[start:start + chunk]
+        powers = decay ** np.arange(len(part))
+        values = powers * (previous * decay + np.cumsum(part / powers))
+        result[start:start + len(part)] = values
+        previous = values[-1]
+    return result
+
+RULE_TYPES = {rule.kind: rule for rule in (ThresholdRule, RateOfChangeRule, FlatlineRule, ZScoreRule)}
+
+def load_rules(path: str) -> List[AlertRule]:
+    """从 JSON 文件加载规则
+
+    文件内容为规则对象列表，例如
+    [{"type": "threshold", "name": "高温", "channel": "temperature", "above": 35}]
+
+    Args:
+        path: 规则文件路径
+
+    Returns:
+        规则列表
+
+    Raises:
+        ValueError: 规则类型或参数错误
+    """
+    with open(path, encoding='utf-8') as f:
+        specs = json.load(f)
+    rules = []
+    for spec in specs:
+        spec = dict(spec)
+        kind = spec.pop('type', None)
+        if kind not in RULE_TYPES:
+            raise ValueError(f'未知的规则类型：{kind}')
+        spec.setdefault('name', f'{kind}:{spec.get("channel")}')
+        try:
+            rules.append(RULE_TYPES[kind](**spec))
+        except TypeError as e:
+            raise ValueError(f'规则参数错误：{spec}（{e}）')
+    return rules
+
+class AlertSink:
+    """告警事件输出接口"""
+
+    def emit(self, event: AlertEvent):
+        """输出一个事件"""
+
+    def close(self):
+        """释放资源"""
+
+class LoggingSink(AlertSink):
+    """把告警事件写入 logging"""
+
+    def emit(self, event: AlertEvent):
+        level = logging.WARNING if event.active else logging.INFO
+        logger.log(level, f'客户端 {event.client_id} {event.message}')
+
+class JsonLinesSink(AlertSink):
+    """把告警事件逐行追加到 JSON 文件，文件在第一次写入时打开，关闭后可再次写入"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self._lock = threading.Lock()
+
+    def emit(self, event: AlertEvent):
+        line = json.dumps(event.to_dict(), ensure_ascii=False)
+        with self._lock:
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        with self._lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+class _Binding:
+    """一条规则在一个客户端上的编译结果"""
+    __slots__ = ('rule', 'state', 'active')
+
+    def __init__(self, rule: AlertRule):
+        self.rule = rule
+        self.state = rule.new_state()
+        self.active = False
+
+    def evaluate(self, client_id: str, timestamp: float, value: float, events: List[AlertEvent]):
+        """判定单个样本，状态切换时追加事件"""
+        triggered, cleared = self.rule.check(self.state, timestamp, value)
+        if triggered != self.active and (triggered or cleared):
+            self.active = triggered
+            events.append(AlertEvent(timestamp, client_id, self.rule.name, self.rule.channel,
+                                     value, triggered))
+
+    def evaluate_array(self, client_id: str, timestamps: np.ndarray, values: np.ndarray,
+                       events: List[AlertEvent]):
+        """判定一批样本，为每个状态切换点追加事件"""
+        triggered, cleared = self.rule.check_array(self.state, timestamps, values)
+        if not triggered.any() and not self.active:
+            return
+        active = _latch(triggered[:, None], cleared[:, None], np.array([self.active]))[:, 0]
+        previous = np.concatenate(([self.active], active[:-1]))
+        self.active = bool(active[-1])
+        rule = self.rule
+        events.extend(AlertEvent(float(timestamps[i]), client_id, rule.name, rule.channel,
+                                 float(values[i]), bool(active[i]))
+                      for i in np.flatnonzero(active != previous))
+
+class _ThresholdGroup:
+    """同一通道的全部阈值规则在一个客户端上的编译结果
+
+    阈值规则没有逐样本状态，合并为按规则排列的数组后，一个样本对全部规则只需
+    一次向量比较，一批样本则是一次 样本数 × 规则数 的二维比较。
+    """
+    __slots__ = ('rules', 'above', 'below', 'clear_above', 'clear_below', 'active')
+
+    def __init__(self, rules: Sequence[ThresholdRule]):
+        self.rules = list(rules)
+        self.above = np.array([rule.above for rule in rules])
+        self.below = np.array([rule.below for rule in rules])
+        self.clear_above = self.above - [rule.hysteresis for rule in rules]
+        self.clear_below = self.below + [rule.hysteresis for rule in rules]
+        self.active = np.zeros(len(rules), dtype=bool)
+
+    def evaluate(self, client_id: str, timestamp: float, value: float, events: List[AlertEvent]):
+        triggered = (value > self.above) | (value < self.below)
+        if not triggered.any() and not self.active.any():
+            return
+        cleared = (value >= self.clear_below) & (value <= self.clear_above)
+        active = triggered | (self.active & ~cleared)
+        self._emit(client_id, np.flatnonzero(active != self.active), timestamp, value, active, events)
+        self.active = active
+
+    def evaluate_array(self, client_id: str, timestamps: np.ndarray, values: np.ndarray,
+                       events: List[AlertEvent]):
+        column = values[:, None]
+        triggered = (column > self.above) | (column < self.below)
+        if not triggered.any() and not self.active.any():
+            return
+        cleared = (column >= self.clear_below) & (column <= self.clear_above)
+        active = _latch(triggered, cleared, self.active)
+        previous = np.vstack((self.active, active[:-1]))
+        for i, rule_index in zip(*np.nonzero(active != previous)):
+            rule = self.rules[rule_index]
+            events.append(AlertEvent(float(timestamps[i]), client_id, rule.name, rule.channel,
+                                     float(values[i]), bool(active[i, rule_index])))
+        self.active = active[-1].copy()
+
+    def _emit(self, client_id, indexes, timestamp, value, active, events):
+        for rule_index in indexes:
+            rule = self.rules[rule_index]
+            events.append(AlertEvent(timestamp, client_id, rule.name, rule.channel, value,
+                                     bool(active[rule_index])))
+
+def _latch(triggered: np.ndarray, cleared: np.ndarray, initial: np.ndarray) -> np.ndarray:
+    """由逐样本的触发/恢复条件（样本数 × 规则数）求出每个样本之后的告警状态
+
+    告警状态保持到下一次触发或恢复：取每个样本之前最近一次触发或恢复的位置。
+    """
+    positions = np.arange(len(triggered))[:, None]
+    last = np.maximum.accumulate(np.where(triggered | cleared, positions, -1), axis=0)
+    decided = np.take_along_axis(triggered, np.maximum(last, 0), axis=0)
+    return np.where(last >= 0, decided, initial)
+
+class AlertEngine:
+    """在接入路径上运行的告警引擎
+
+    客户端第一次上报数据时，把适用的规则按通道编译为该客户端的规则状态列表，
+    之后每个样本对每条规则的判定都是 O(1)，同一通道的阈值规则合并为一次向量比较。
+    整批数据到达时每条规则对整列样本做一次向量判定，再用向量运算求出告警状态的
+    切换点，只为切换点生成事件。
+    """
+
+    def __init__(self, rules: Sequence[AlertRule] = ()):
+        """初始化告警引擎
+
+        Args:
+            rules: 告警规则
+        """
+        self.rules = list(rules)
+        self._bindings: Dict[str, List[Tuple[int, list]]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def evaluate(self, client_id: str, samples: Sequence[Tuple[float, float, float]]) -> List[AlertEvent]:
+        """判定客户端的一批样本
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 元组序列，按时间排列
+
+        Returns:
+            告警和恢复事件
+        """
+        if not self.rules or not len(samples):
+            return []
+        channels = self._bindings.get(client_id)
+        if channels is None:
+            channels = self._bindings[client_id] = self._compile(client_id)
+        events = []
+        if len(samples) == 1:
+            sample = samples[0]
+            timestamp = sample[0]
+            for index, bindings in channels:
+                value = sample[index]
+                for binding in bindings:
+                    binding.evaluate(client_id, timestamp, value, events)
+            return events
+
+        columns = np.asarray(samples, dtype=np.float64)
+        timestamps = columns[:, 0]
+        for index, bindings in channels:
+            values = columns[:, index]
+            for binding in bindings:
+                binding.evaluate_array(client_id, timestamps, values, events)
+        events.sort(key=lambda event: event.timestamp)
+        return events
+
+    def remove(self, client_id: str):
+        """丢弃客户端的规则状态"""
+        self._bindings.pop(client_id, None)
+
+    def _compile(self, client_id: str) -> List[Tuple[int, list]]:
+        """为客户端编译适用的规则，按通道分组"""
+        channels = []
+        for channel, index in CHANNEL_INDEX.items():
+            rules = [rule for rule in self.rules if rule.channel == channel and rule.matches(client_id)]
+            thresholds = [rule for rule in rules if type(rule) is ThresholdRule]
+            bindings = [_Binding(rule) for rule in rules if type(rule) is not ThresholdRule]
+            if thresholds:
+                bindings.insert(0, _ThresholdGroup(thresholds))
+            if bindings:
+                channels.append((index, bindings))
+        return channels
@@ -0,0 +1,82 @@
+import sys
+import logging
+import argparse
+from logging.handlers import RotatingFileHandler
+
+from common.logbuffer import DEFAULT_LOG_FILE_BYTES, DEFAULT_LOG_FILE_BACKUPS
+from .engine import DEFAULT_BACKLOG
+from .store import DEFAULT_CAPACITY
+from .stats import DEFAULT_WINDOWS
+from .retention import DEFAULT_RAW_RETENTION, DEFAULT_TIERS
+from .latency import DEFAULT_OFFSET_WINDOW
+from .alerts import JsonLinesSink, load_rules
+from .core import (DEFAULT_HEARTBEAT_TIMEOUT_MS, DEFAULT_HEARTBEAT_RETRY_MS,
+                   DEFAULT_MAX_MISSED_HEARTBEATS)
+
+def main():
+    """服务器命令行入口
+
+    默认启动图形界面；指定 --headless 时不加载 PyQt5，以守护进程方式运行。
+    """
+    parser = argparse.ArgumentParser(description='传感器数据采集服务器')
+    parser.add_argument('--headless', action='store_true', help='不启动图形界面，仅运行数据采集服务')
+    parser.add_argument('--listen', help='监听地址（host:port），无界面模式默认 0.0.0.0:5000')
+    parser.add_argument('--backlog', type=int, default=DEFAULT_BACKLOG, help='监听队列长度')
+    parser.add_argument('--heartbeat-timeout-ms', type=int, default=DEFAULT_HEARTBEAT_TIMEOUT_MS,
+                        help='多久未收到心跳或数据视为错过一次心跳（毫秒）')
+    parser.add_argument('--heartbeat-retry-ms', type=int, default=DEFAULT_HEARTBEAT_RETRY_MS,
+                        help='错过心跳后再次检查的间隔（毫秒）')
+    parser.add_argument('--max-missed-heartbeats', type=int, default=DEFAULT_MAX_MISSED_HEARTBEATS,
+                        help='连续错过多少次心跳后标记为离线')
+    parser.add_argument('--history-capacity', type=int, default=DEFAULT_CAPACITY,
+                        help='每个客户端在内存中保留的样本数')
+    parser.add_argument('--stats-windows', default=','.join(str(w) for w in DEFAULT_WINDOWS),
+                        help='滚动统计窗口（秒），以逗号分隔')
+    parser.add_argument('--http-listen', help='HTTP 查询服务的监听地址（host:port），不指定时不启动')
+    parser.add_argument('--subscribe-listen', help='实时订阅服务的监听地址（host:port），不指定时不启动')
+    parser.add_argument('--data-dir', help='样本持久化目录，不指定时历史只保存在内存中')
+    parser.add_argument('--raw-retention', type=float, default=DEFAULT_RAW_RETENTION,
+                        help='原始样本保留时长（秒），内存和持久化目录中过期的样本会被删除')
+    parser.add_argument('--rollup-retention',
+                        default=','.join(f'{resolution}:{retention}' for resolution, retention in DEFAULT_TIERS),
+                        help='汇总层级，格式为 分辨率:保留时长（秒），以逗号分隔')
+    parser.add_argument('--clock-offset-window', type=int, default=DEFAULT_OFFSET_WINDOW,
+                        help='估计客户端时钟偏差时保留的心跳往返数，0 表示不校正')
+    parser.add_argument('--alert-rules', help='告警规则文件（JSON）')
+    parser.add_argument('--alert-log', help='告警事件输出文件（每行一个 JSON）')
+    parser.add_argument('--log-level', default='INFO', help='无界面模式的日志级别')
+    parser.add_argument('--log-file', help='同时写入的日志文件，按大小轮转')
+    args, qt_args = parser.parse_known_args()
+    core_options = {
+        'backlog': args.backlog,
+        'heartbeat_timeout_ms': args.heartbeat_timeout_ms,
+        'heartbeat_retry_ms': args.heartbeat_retry_ms,
+        'max_missed_heartbeats': args.max_missed_heartbeats,
+        'history_capacity': args.history_capacity,
+        'stats_windows': tuple(float(w) for w in args.stats_windows.split(',')),
+        'data_dir': args.data_dir,
+        'http_listen': args.http_listen,
+        'subscribe_listen': args.subscribe_listen,
+        'clock_offset_window': args.clock_offset_window,
+        'raw_retention': args.raw_retention,
+        'rollup_tiers': tuple(tuple(float(v) for v in tier.split(':'))
+                              for tier in args.rollup_retention.split(',')),
+    }
+    if args.alert_rules:
+        core_options['alert_rules'] = load_rules(args.alert_rules)
+    if args.alert_log:
+        core_options['alert_sinks'] = [JsonLinesSink(args.alert_log)]
+
+    if args.headless:
+        handlers = [logging.StreamHandler()]
+        if args.log_file:
+            handlers.append(RotatingFileHandler(args.log_file, maxBytes=DEFAULT_LOG_FILE_BYTES,
+                                                backupCount=DEFAULT_LOG_FILE_BACKUPS, encoding='utf-8'))
+        logging.basicConfig(level=args.log_level.upper(), handlers=handlers,
+                            format='%(asctime)s %(levelname)s %(message)s')
+        # 延迟导入，无界面模式不加载 PyQt5 和 pyqtgraph
+        from .daemon import run_headless
+        sys.exit(run_headless(args.listen or '0.0.0.0:5000', **core_options))
+
+    from .server import main as gui_main
+    gui_main(args.listen, qt_args, args.log_file, **core_options)
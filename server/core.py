@@ -0,0 +1,917 @@
+import os
+import time
+import bisect
+import logging
+import itertools
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .engine import IngestEngine, IngestHandler, ClientConnection, DEFAULT_BACKLOG
+from .heartbeat import DeadlineScheduler
+from .store import SampleStore, DEFAULT_CAPACITY
+from .stats import StatsEngine, WindowStats, DEFAULT_WINDOWS
+from .fleet import FleetAggregates, FleetSummary
+from .persist import SegmentStore, DEFAULT_SEGMENT_CAPACITY
+from .retention import RetentionManager, DEFAULT_RAW_RETENTION, DEFAULT_TIERS
+from .query import QueryService, QueryServer
+from .pubsub import PubSubHub
+from .metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .latency import LatencyTracker, DEFAULT_OFFSET_WINDOW
+from .alerts import AlertEngine, AlertEvent, AlertRule, AlertSink
+from common.protocol import Protocol, CODEC_JSON, MAX_GATEWAY_SENSORS
+
+# 心跳超时默认值（毫秒）：心跳间隔3秒+1秒容差
+DEFAULT_HEARTBEAT_TIMEOUT_MS = 4000
+# 首次超时后再次检查的间隔（毫秒）
+DEFAULT_HEARTBEAT_RETRY_MS = 3000
+# 连续错过多少次心跳后标记为离线
+DEFAULT_MAX_MISSED_HEARTBEATS = 3
+# 持久化目录中保存汇总记录的文件
+ROLLUP_FILE = 'rollups.npz'
+# 按类型计数的客户端消息
+MESSAGE_TYPES = ('connect', 'disconnect', 'heartbeat', 'data', 'data_batch', 'data_multi', 'register',
+                 'unregister', 'backfill')
+
+class ClientInfo:
+    """客户端信息类"""
+    def __init__(self, connection: ClientConnection, address: Tuple[str, int]):
+        self.connection = connection
+        self.address = address
+        self.id = None
+        self.last_heartbeat = time.time()
+        self.temperature = None
+        self.humidity = None
+        self.status = "在线"
+        self.missed_heartbeats = 0  # 错过的心跳次数
+        self.session = None  # 会话句柄，二进制消息以此代替客户端ID
+        self.codec = CODEC_JSON  # 协商得到的编码方式
+        self.clock_sync = False  # 客户端是否根据心跳应答上报时钟偏差
+        self.gateway: Optional['ClientInfo'] = None  # 经网关接入的传感器所属的网关连接
+        self.handle: Optional[int] = None  # 传感器在网关会话中的句柄
+        self.sensors: Optional[GatewaySensors] = None  # 网关连接上注册的传感器，普通连接为 None
+
+class GatewaySensors:
+    """网关会话中注册的传感器
+
+    传感器句柄是会话内的小整数，二进制多路数据以句柄代替传感器ID；
+    注销后的句柄放回空闲列表，供之后注册的传感器复用。
+    """
+
+    def __init__(self):
+        self.by_id: Dict[str, ClientInfo] = {}
+        self.by_handle: List[Optional[ClientInfo]] = []
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, sensor_id: str) -> Optional[ClientInfo]:
+        return self.by_id.get(sensor_id)
+
+    def lookup(self, handle: int) -> Optional[ClientInfo]:
+        """按句柄查找传感器，句柄无效时返回 None"""
+        if 0 <= handle < len(self.by_handle):
+            return self.by_handle[handle]
+        return None
+
+    def add(self, sensor: ClientInfo) -> Optional[int]:
+        """注册传感器并分配句柄，超出上限时返回 None"""
+        if self._free:
+            handle = self._free.pop()
+            self.by_handle[handle] = sensor
+        elif len(self.by_handle) < MAX_GATEWAY_SENSORS:
+            handle = len(self.by_handle)
+            self.by_handle.append(sensor)
+        else:
+            return None
+        sensor.handle = handle
+        self.by_id[sensor.id] = sensor
+        return handle
+
+    def remove(self, sensor_id: str) -> Optional[ClientInfo]:
+        """注销传感器并回收句柄"""
+        sensor = self.by_id.pop(sensor_id, None)
+        if sensor is not None:
+            self.by_handle[sensor.handle] = None
+            self._free.append(sensor.handle)
+        return sensor
+
+class ServerListener:
+    """服务器事件监听接口
+
+    服务器核心不依赖任何界面，状态变化通过监听器通知给界面或日志等消费者。
+    回调可能在接入引擎的事件循环线程中执行，子类按需覆盖。
+    """
+
+    def on_server_state(self, running: bool):
+        """服务器启动或停止"""
+
+    def on_log(self, message: str, level: int):
+        """日志消息，level 为 logging 模块的级别"""
+
+    def on_status(self, client_id: str, status: str):
+        """客户端上下线等状态记录"""
+
+    def on_client_connected(self, client_id: str):
+        """客户端已连接"""
+
+    def on_client_disconnected(self, client_id: str):
+        """客户端主动断开连接"""
+
+    def on_client_offline(self, client_id: str):
+        """客户端被标记为离线"""
+
+    def on_client_status(self, client_id: str, status: str):
+        """客户端在线状态变化（在线/离线）"""
+
+    def on_data(self, client_id: str, samples: List):
+        """收到客户端数据
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 样本列表
+        """
+
+    def on_backfill(self, client_id: str, count: int):
+        """收到客户端补传的历史数据，已按时间戳写入存储
+
+        Args:
+            client_id: 客户端ID
+            count: 补传的样本数
+        """
+
+    def on_alert(self, event: AlertEvent):
+        """告警规则触发或恢复"""
+
+class ServerCore(IngestHandler):
+    """服务器核心
+
+    负责数据接入、心跳检测和客户端状态管理，不依赖 PyQt5，
+    图形界面和无界面守护进程都通过 ServerListener 使用它。
+    """
+
+    def __init__(self, backlog: int = DEFAULT_BACKLOG,
+                 heartbeat_timeout_ms: int = DEFAULT_HEARTBEAT_TIMEOUT_MS,
+                 heartbeat_retry_ms: int = DEFAULT_HEARTBEAT_RETRY_MS,
+                 max_missed_heartbeats: int = DEFAULT_MAX_MISSED_HEARTBEATS,
+                 history_capacity: int = DEFAULT_CAPACITY,
+                 stats_windows: Tuple[float, ...] = DEFAULT_WINDOWS,
+                 alert_rules: Sequence[AlertRule] = (),
+                 alert_sinks: Sequence[AlertSink] = (),
+                 data_dir: Optional[str] = None,
+                 segment_capacity: int = DEFAULT_SEGMENT_CAPACITY,
+                 raw_retention: float = DEFAULT_RAW_RETENTION,
+                 rollup_tiers: Sequence[Tuple[float, float]] = DEFAULT_TIERS,
+                 http_listen: Optional[str] = None,
+                 subscribe_listen: Optional[str] = None,
+                 clock_offset_window: int = DEFAULT_OFFSET_WINDOW):
+        """初始化服务器核心
+
+        Args:
+            backlog: 监听队列长度
+            heartbeat_timeout_ms: 距上次心跳或数据多久未收到消息视为错过一次心跳（毫秒）
+            heartbeat_retry_ms: 错过心跳后再次检查的间隔（毫秒）
+            max_missed_heartbeats: 连续错过多少次心跳后标记为离线
+            history_capacity: 每个客户端在内存中保留的样本数
+            stats_windows: 滚动统计的窗口（秒）
+            alert_rules: 接入时判定的告警规则
+            alert_sinks: 告警事件的输出
+            data_dir: 样本持久化目录，None 表示只保存在内存中
+            segment_capacity: 每个段文件容纳的样本数
+            raw_retention: 原始样本保留时长（秒）
+            rollup_tiers: 汇总层级 (分辨率, 保留时长)，单位秒
+            http_listen: HTTP 查询服务的监听地址（host:port），None 表示不启动
+            subscribe_listen: 实时订阅服务的监听地址（host:port），None 表示不启动
+            clock_offset_window: 估计客户端时钟偏差时保留的心跳往返数，0 表示不校正
+        """
+        self.backlog = backlog
+        self.heartbeat_timeout = heartbeat_timeout_ms / 1000
+        self.heartbeat_retry = heartbeat_retry_ms / 1000
+        self.max_missed_heartbeats = max_missed_heartbeats
+        self.engine = None
+        self.clients: Dict[str, ClientInfo] = {}  # client_id -> ClientInfo
+        self.gateways: Dict[str, ClientInfo] = {}  # gateway_id -> 网关连接的 ClientInfo
+        self.session_counter = itertools.count(1)  # 会话句柄分配器
+        self.listeners: List[ServerListener] = []
+        # 所有客户端的历史样本，界面和其他消费者都从这里读取
+        self.store = SampleStore(history_capacity)
+        # 每个客户端的滚动统计，数据到达时增量更新
+        self.stats = StatsEngine(stats_windows)
+        # 所有客户端最新数值的列式汇总
+        self.fleet = FleetAggregates()
+        # 告警规则引擎，事件写入状态记录并交给各个输出
+        self.alerts = AlertEngine(alert_rules)
+        self.alert_sinks: List[AlertSink] = list(alert_sinks)
+        # 样本持久化，启动时映射已有的段文件并恢复最近的历史
+        self.persist = SegmentStore(data_dir, segment_capacity) if data_dir else None
+        self.rollup_path = os.path.join(data_dir, ROLLUP_FILE) if data_dir else None
+        # 原始样本保留和分层汇总
+        self.retention = RetentionManager(self.store, raw_retention, rollup_tiers, self.persist)
+        if self.persist is not None:
+            self._restore_history()
+        # 历史数据查询，随服务器启动和停止
+        self.http_listen = http_listen
+        self.query = QueryService(self.store, self.retention, self.persist)
+        self.query_server: Optional[QueryServer] = None
+        # 实时数据订阅分发，随服务器启动和停止
+        self.subscribe_listen = subscribe_listen
+        self.pubsub = PubSubHub(backlog)
+        # 运行指标，热路径上的计数和直方图按线程分别累加，不加锁
+        self.metrics = MetricsRegistry('sensor_')
+        self._register_metrics()
+        # 各阶段延迟和客户端时钟偏差
+        self.latency = LatencyTracker(self.metrics, clock_offset_window)
+        # 在线客户端的存活期限，只在有客户端到期时才唤醒检查
+        self.liveness = DeadlineScheduler()
+        self.heartbeat_handle = None
+        self.heartbeat_armed_at = None
+
+    def _register_metrics(self):
+        """注册服务器核心的指标，瞬时值在读取时从各组件取得"""
+        metrics = self.metrics
+        self.message_counters: Dict[str, object] = {}  # 消息类型 -> 计数器
+        self.handler_time = metrics.histogram('message_handler_seconds', '单条消息的处理耗时（秒）')
+        self.ingest_time = metrics.histogram('ingest_seconds', '一批样本写入存储、统计、告警和分发的耗时（秒）')
+        self.samples_counter = metrics.counter('samples_ingested_total', '接入的样本数')
+        self.decode_errors = metrics.counter('decode_errors_total', '无法解码的数据帧数')
+        self.handler_errors = metrics.counter('handler_errors_total', '处理失败的消息数')
+        self.heartbeat_misses = metrics.counter('heartbeat_misses_total', '错过心跳的次数')
+        self.alerts_counter = metrics.counter('alerts_total', '告警和恢复事件数')
+        self.backfill_counter = metrics.counter('backfill_samples_total', '客户端补传的样本数')
+        self.late_counter = metrics.counter('backfill_late_samples_total', '早于已有数据、按时间合并的补传样本数')
+        metrics.gauge('clients_online', '在线客户端数',
+                      func=lambda: sum(1 for client in list(self.clients.values()) if client.status == "在线"))
+        metrics.gauge('clients_known', '已知客户端数（含离线）', func=lambda: len(self.clients))
+        metrics.gauge('gateways', '已连接的网关数', func=lambda: len(self.gateways))
+        metrics.gauge('gateway_sensors', '经网关接入的传感器数',
+                      func=lambda: sum(len(gateway.sensors) for gateway in list(self.gateways.values())))
+        metrics.gauge('connections', '当前TCP连接数',
+                      func=lambda: len(self.engine.connections) if self.engine else 0)
+        metrics.gauge('pubsub_subscribers', '实时订阅者数', func=lambda: len(self.pubsub.subscribers))
+        metrics.gauge('pubsub_queued_frames', '订阅者队列中待发送的消息数',
+                      func=lambda: sum(len(subscriber) for subscriber in self.pubsub.subscribers))
+        metrics.gauge('pubsub_dropped_frames', '当前订阅者累计被丢弃或合并的消息数',
+                      func=lambda: sum(subscriber.dropped for subscriber in self.pubsub.subscribers))
+
+    def add_listener(self, listener: ServerListener):
+        """注册事件监听器"""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: ServerListener):
+        """注销事件监听器"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _notify(self, event: str, *args):
+        """向所有监听器分发事件"""
+        for listener in self.listeners:
+            getattr(listener, event)(*args)
+
+    def log_message(self, message: str, level: int = logging.INFO):
+        """记录日志
+
+        Args:
+            message: 日志内容
+            level: 日志级别（logging 模块的级别）
+        """
+        self._notify('on_log', message, level)
+
+    @staticmethod
+    def parse_address(address: str) -> Tuple[str, int]:
+        """解析服务器地址
+
+        Args:
+            address: 服务器地址字符串（格式：host:port）
+
+        Returns:
+            主机名和端口号元组
+        """
+        try:
+            host, port = address.split(':')
+            return host.strip(), int(port.strip())
+        except ValueError:
+            raise ValueError('服务器地址格式错误，应为 host:port')
+
+    @property
+    def running(self) -> bool:
+        """服务器是否正在运行"""
+        return self.engine is not None
+
+    def start(self, address: str) -> bool:
+        """启动服务器
+
+        Args:
+            address: 监听地址（格式：host:port）
+
+        Returns:
+            是否启动成功
+        """
+        try:
+            host, port = self.parse_address(address)
+
+            if self.http_listen:
+                self.query_server = QueryServer(self.query, self.metrics)
+                self.query_server.add_route('/metrics', lambda params: [self.metrics.render().encode('utf-8')],
+                                            METRICS_CONTENT_TYPE)
+                self.query_server.add_route('/latency', lambda params: self.latency.lines())
+                self.query_server.start(*self.parse_address(self.http_listen))
+                self.log_message(f'查询服务已启动，监听地址：{self.http_listen}')
+
+            if self.subscribe_listen:
+                self.pubsub.start(*self.parse_address(self.subscribe_listen))
+                self.log_message(f'订阅服务已启动，监听地址：{self.subscribe_listen}')
+
+            # 启动接入引擎（单个事件循环线程处理所有连接）
+            self.engine = IngestEngine(self, self.backlog)
+            self.engine.start(host, port)
+
+            self._notify('on_server_state', True)
+            self.log_message(f'服务器已启动，监听地址：{address}')
+            return True
+
+        except Exception as e:
+            self.engine = None
+            self.log_message(f'启动服务器失败：{str(e)}', logging.ERROR)
+            self.stop()
+            return False
+
+    def stop(self):
+        """停止服务器"""
+        # 停止接入引擎，关闭所有连接
+        if self.engine:
+            if self.heartbeat_handle:
+                self.engine.call_in_loop(self.heartbeat_handle.cancel)
+                self.heartbeat_handle = None
+            self.engine.stop()
+            self.engine = None
+
+        if self.query_server:
+            self.query_server.stop()
+            self.query_server = None
+        self.pubsub.stop()
+
+        # 断开所有客户端连接
+        for client_id in list(self.clients.keys()):
+            self._remove_client(client_id)
+
+        for sink in self.alert_sinks:
+            sink.close()
+        if self.persist is not None:
+            self.persist.flush()
+            self.retention.save(self.rollup_path)
+
+        self._notify('on_server_state', False)
+        self.log_message('服务器已停止')
+
+    def client_list(self) -> List[Dict]:
+        """返回所有客户端的状态摘要
+
+        Returns:
+            客户端列表，每个客户端是一个字典，包含id、status、temperature、humidity字段，
+            经网关接入的客户端另有gateway字段
+        """
+        clients = []
+        for client_id, client in list(self.clients.items()):
+            client_info = {
+                'id': client_id,
+                'status': client.status
+            }
+            if client.temperature is not None:
+                client_info['temperature'] = client.temperature
+            if client.humidity is not None:
+                client_info['humidity'] = client.humidity
+            if client.gateway is not None:
+                client_info['gateway'] = client.gateway.id
+            clients.append(client_info)
+        return clients
+
+    def connection_made(self, connection: ClientConnection) -> ClientInfo:
+        """新连接建立，创建客户端信息对象"""
+        return ClientInfo(connection, connection.address)
+
+    def connection_lost(self, client: ClientInfo):
+        """连接关闭"""
+        if client.sensors is not None:
+            if self.gateways.get(client.id) is client:
+                self._remove_gateway(client)
+        # 同名客户端已被新连接替换时，不影响新连接的状态
+        elif client.id and self.clients.get(client.id) is client:
+            self._remove_client(client.id)
+
+    def decode_failed(self, client: ClientInfo, error: Exception):
+        """收到无法解码的数据"""
+        self.decode_errors.inc()
+        self.log_message(f'消息解码错误：{str(error)}', logging.ERROR)
+
+    def log_error(self, message: str):
+        """记录接入引擎错误"""
+        self.handler_errors.inc()
+        self.log_message(message, logging.ERROR)
+
+    def message_received(self, client: ClientInfo, message: dict) -> bool:
+        """处理单条客户端消息，并记录消息计数和处理耗时
+
+        Args:
+            client: 客户端信息对象
+            message: 解析后的消息字典
+
+        Returns:
+            是否继续保持连接
+        """
+        started = time.perf_counter()
+        msg_type = message.get('type')
+        counter = self.message_counters.get(msg_type)
+        if counter is None:
+            # 未知类型归入 other，避免标签数量随异常数据增长
+            known = msg_type in MESSAGE_TYPES
+            counter = self.metrics.counter('messages_received_total', '收到的消息数',
+                                           {'type': msg_type if known else 'other'})
+            if known:
+                self.message_counters[msg_type] = counter
+        counter.inc()
+        try:
+            return self._handle_message(client, message)
+        finally:
+            self.handler_time.observe(time.perf_counter() - started)
+
+    def _handle_message(self, client: ClientInfo, message: dict) -> bool:
+        """按消息类型分发"""
+        if 'session' in message:
+            # 二进制消息以会话句柄代替客户端ID
+            if client.id is None or message['session'] != client.session:
+                raise ValueError(f'无效的会话句柄：{message["session"]}')
+            client_id = client.id
+        else:
+            client_id = message['client_id']
+
+        # 处理不同类型的消息
+        if message['type'] == 'connect' and message.get('gateway'):
+            return self._handle_gateway_connect(client, client_id, message)
+        if client.sensors is not None:
+            return self._handle_gateway_message(client, message)
+        if message['type'] == 'connect':
+            # 检查是否存在同名在线客户端
+            if client_id in self.clients and self.clients[client_id].status == "在线":
+                # 发送拒绝连接消息
+                client.connection.send(Protocol.create_connect_response(False, "已存在同名客户端在线"))
+                return False
+            self._handle_connect(client, client_id)
+            # 协商编码方式并分配会话句柄，旧版客户端不提供 codecs 字段时使用JSON
+            client.codec = Protocol.negotiate_codec(message.get('codecs'))
+            client.clock_sync = bool(message.get('clock_sync'))
+            self.latency.set_clock_source(client_id, None)
+            if client.clock_sync:
+                self.latency.expect_clock(client_id)
+            client.session = next(self.session_counter)
+            # 发送接受连接消息
+            client.connection.send(Protocol.create_connect_response(
+                True, "连接成功", client.codec, client.session, backfill=True))
+        elif message['type'] == 'disconnect':
+            self._handle_disconnect(client_id)
+            return False
+        elif message['type'] == 'heartbeat':
+            self._handle_heartbeat(client_id, message)
+        elif message['type'] == 'data':
+            self._handle_data(client_id, message['data'], message.get('timestamp'))
+        elif message['type'] == 'data_batch':
+            self._handle_data_batch(client_id, message['samples'])
+        elif message['type'] == 'backfill':
+            samples = Protocol.backfill_samples(message)
+            self._handle_backfill(client_id, samples)
+            # 处理完成后确认，客户端收到确认才从缓存删除这些样本
+            client.connection.send(Protocol.create_backfill_ack(message.get('sequence', 0), len(samples)))
+        return True
+
+    def _handle_connect(self, client: ClientInfo, client_id: str):
+        """处理客户端连接消息"""
+        if client_id in self.clients:
+            old_client = self.clients[client_id]
+            if old_client.gateway is not None:
+                # 离线传感器改由其他网关或直接连接接入，从原网关会话中注销
+                old_client.gateway.sensors.remove(client_id)
+            if old_client.status == "离线":
+                # 如果是离线客户端重新连接
+                if old_client.gateway is None:
+                    old_client.connection.close()
+                self._notify('on_status', client_id, "重新上线")
+            else:
+                # 如果是新连接替换旧连接
+                self._remove_client(client_id)
+                self._notify('on_status', client_id, "重新连接")
+        else:
+            self._notify('on_status', client_id, "上线")
+
+        # 添加新客户端
+        client.id = client_id
+        self._set_status(client, "在线")
+        self.clients[client_id] = client
+        self._touch(client)
+        self.log_message(f'客户端 {client_id} 已连接')
+
+        # 通知监听器添加新客户端
+        self._notify('on_client_connected', client_id)
+
+    def _handle_disconnect(self, client_id: str):
+        """处理客户端断开连接消息"""
+        if client_id in self.clients:
+            self._remove_client(client_id, send_offline_record=True)
+            self.log_message(f'客户端 {client_id} 已断开连接')
+            self._notify('on_client_disconnected', client_id)
+
+    def _handle_heartbeat(self, client_id: str, message: Dict):
+        """处理心跳消息，记录客户端上报的时钟偏差并回复心跳应答"""
+        if client_id in self.clients:
+            client = self.clients[client_id]
+            self._handle_clock(client, message)
+            self._keep_alive(client)
+
+    def _handle_clock(self, client: ClientInfo, message: Dict):
+        """记录心跳中上报的时钟偏差并回复心跳应答"""
+        if 'clock_offset' in message:
+            self.latency.add_clock_sample(client.id, message['clock_offset'], message['rtt'])
+        if client.clock_sync and 'timestamp' in message:
+            client.connection.send(Protocol.create_heartbeat_ack(
+                message['timestamp'], client.connection.received_at))
+
+    def _keep_alive(self, client: ClientInfo):
+        """收到心跳，离线的客户端重新上线并顺延存活期限"""
+        client.last_heartbeat = time.time()
+        if client.status == "离线":
+            self._set_status(client, "在线")
+            self._notify('on_status', client.id, "重新上线")
+        self._touch(client)
+
+    def _handle_gateway_connect(self, gateway: ClientInfo, gateway_id: str, message: dict) -> bool:
+        """处理网关连接消息，一个连接之后可以注册多个传感器"""
+        if gateway.id is not None:
+            raise ValueError('连接已完成握手')
+        if gateway_id in self.gateways:
+            gateway.connection.send(Protocol.create_connect_response(False, "已存在同名网关在线"))
+            return False
+        if gateway_id in self.clients and self.clients[gateway_id].status == "在线":
+            gateway.connection.send(Protocol.create_connect_response(False, "已存在同名客户端在线"))
+            return False
+        gateway.id = gateway_id
+        gateway.sensors = GatewaySensors()
+        gateway.codec = Protocol.negotiate_codec(message.get('codecs'))
+        gateway.clock_sync = bool(message.get('clock_sync'))
+        if gateway.clock_sync:
+            self.latency.expect_clock(gateway_id)
+        gateway.session = next(self.session_counter)
+        self.gateways[gateway_id] = gateway
+        gateway.connection.send(Protocol.create_connect_response(
+            True, "连接成功", gateway.codec, gateway.session))
+        self.log_message(f'网关 {gateway_id} 已连接')
+        if message.get('sensors'):
+            self._register_sensors(gateway, message['sensors'])
+        return True
+
+    def _handle_gateway_message(self, gateway: ClientInfo, message: dict) -> bool:
+        """处理网关连接上的消息"""
+        msg_type = message['type']
+        if msg_type == 'data_multi':
+            self._handle_data_multi(gateway, message)
+        elif msg_type == 'heartbeat':
+            # 一次心跳为所有（或列出的）传感器续期
+            self._handle_clock(gateway, message)
+            alive = message.get('sensors')
+            sensors = gateway.sensors.by_id
+            for sensor in (list(sensors.values()) if alive is None
+                           else [sensors[i] for i in alive if i in sensors]):
+                if self.clients.get(sensor.id) is sensor:
+                    self._keep_alive(sensor)
+        elif msg_type == 'register':
+            self._register_sensors(gateway, message['sensors'])
+        elif msg_type == 'unregister':
+            for sensor_id in message['sensors']:
+                self._unregister_sensor(gateway, sensor_id, send_offline_record=True)
+        elif msg_type == 'disconnect':
+            self._remove_gateway(gateway, send_offline_record=True)
+            self.log_message(f'网关 {gateway.id} 已断开连接')
+            return False
+        elif msg_type == 'connect':
+            raise ValueError('连接已完成握手')
+        return True
+
+    def _register_sensors(self, gateway: ClientInfo, sensor_ids: List[str]):
+        """在网关会话中注册传感器，回复分配的句柄和被拒绝的原因"""
+        handles: Dict[str, int] = {}
+        rejected: Dict[str, str] = {}
+        for sensor_id in sensor_ids:
+            sensor = gateway.sensors.get(sensor_id)
+            if sensor is not None:
+                # 重复注册返回原句柄
+                handles[sensor_id] = sensor.handle
+                continue
+            existing = self.clients.get(sensor_id)
+            if existing is not None and existing.status == "在线":
+                rejected[sensor_id] = "已存在同名客户端在线"
+                continue
+            if sensor_id in self.gateways:
+                rejected[sensor_id] = "已存在同名网关在线"
+                continue
+            sensor = ClientInfo(gateway.connection, gateway.address)
+            sensor.id = sensor_id
+            sensor.gateway = gateway
+            sensor.codec = gateway.codec
+            handle = gateway.sensors.add(sensor)
+            if handle is None:
+                rejected[sensor_id] = "超出网关传感器数上限"
+                continue
+            self._handle_connect(sensor, sensor_id)
+            # 传感器的时间戳由网关打上，使用网关的时钟偏差
+            self.latency.set_clock_source(sensor_id, gateway.id)
+            handles[sensor_id] = handle
+        if rejected:
+            self.log_message(f'网关 {gateway.id} 有 {len(rejected)} 个传感器注册被拒绝', logging.WARNING)
+        gateway.connection.send(Protocol.create_register_response(handles, rejected))
+
+    def _unregister_sensor(self, gateway: ClientInfo, sensor_id: str, send_offline_record: bool = False):
+        """从网关会话中注销传感器，传感器记为离线"""
+        sensor = gateway.sensors.remove(sensor_id)
+        if sensor is None or self.clients.get(sensor_id) is not sensor:
+            return
+        self._remove_client(sensor_id, send_offline_record)
+        if send_offline_record:
+            self.log_message(f'客户端 {sensor_id} 已断开连接')
+            self._notify('on_client_disconnected', sensor_id)
+
+    def _remove_gateway(self, gateway: ClientInfo, send_offline_record: bool = False):
+        """移除网关及其注册的全部传感器"""
+        for sensor_id in list(gateway.sensors.by_id):
+            self._unregister_sensor(gateway, sensor_id, send_offline_record)
+        if self.gateways.get(gateway.id) is gateway:
+            del self.gateways[gateway.id]
+            gateway.connection.close()
+
+    def _handle_data_multi(self, gateway: ClientInfo, message: dict):
+        """处理网关多个传感器的数据，每个传感器的样本作为一批写入
+
+        二进制消息按句柄分组，JSON 消息按传感器ID分组；未注册（例如刚注销）的传感器被忽略。
+        """
+        sensors = gateway.sensors
+        if 'groups' in message:
+            groups = ((sensors.lookup(handle), samples) for handle, samples in message['groups'])
+        else:
+            groups = ((sensors.get(sensor_id), samples) for sensor_id, samples in message['samples'].items())
+        for sensor, samples in groups:
+            if sensor is not None:
+                self._handle_data_batch(sensor.id, samples)
+
+    def _handle_data(self, client_id: str, data: Dict, timestamp: Optional[float] = None):
+        """处理数据消息
+
+        Args:
+            client_id: 客户端ID
+            data: 温度、湿度数据
+            timestamp: 客户端读取数据的时间，旧版客户端只精确到秒（整数），此时使用收到的时间
+        """
+        if client_id in self.clients:
+            client = self.clients[client_id]
+            client.temperature = data['temperature']
+            client.humidity = data['humidity']
+            if client.status == "在线":
+                self._touch(client)
+            if not isinstance(timestamp, float):
+                timestamp = time.time()
+            self._ingest(client_id, [(timestamp, data['temperature'], data['humidity'])])
+
+    def _handle_data_batch(self, client_id: str, samples: List):
+        """处理批量数据消息
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 样本列表
+        """
+        if client_id in self.clients and samples:
+            client = self.clients[client_id]
+            _, client.temperature, client.humidity = samples[-1]
+            if client.status == "在线":
+                self._touch(client)
+            # 整批写入存储并通知，只触发一次更新
+            self._ingest(client_id, samples)
+
+    def _handle_backfill(self, client_id: str, samples: List):
+        """处理补传数据：客户端断线或发送积压期间缓存的样本，保留原始时间戳
+
+        晚于已有数据的部分按正常顺序写入；早于已有数据的部分按时间合并进内存历史、
+        持久化存储、汇总和滚动统计，不参与告警、实时订阅和延迟统计。与已存储样本
+        时间戳相同的样本视为重发，直接跳过。
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 样本列表
+        """
+        if client_id not in self.clients or not samples:
+            return
+        self.backfill_counter.inc(len(samples))
+        samples = sorted(samples)
+        latest = self.store.series(client_id).latest()
+        late = []
+        if latest is not None:
+            split = bisect.bisect_right([sample[0] for sample in samples], latest[0])
+            late, samples = samples[:split], samples[split:]
+            # 超过原始样本保留时长的补传样本直接丢弃
+            cutoff = latest[0] - self.retention.raw_retention
+            late = late[bisect.bisect_left([sample[0] for sample in late], cutoff):]
+        if late:
+            columns = np.asarray(late, dtype=np.float64)
+            columns = columns[~self._stored(client_id, columns[:, 0])]
+            late = columns.tolist()
+        if late:
+            self.late_counter.inc(len(late))
+            timestamps, temperature, humidity = columns[:, 0], columns[:, 1], columns[:, 2]
+            if self.persist is not None:
+                self.persist.merge(client_id, timestamps, temperature, humidity)
+            self.store.series(client_id).merge(timestamps, temperature, humidity)
+            self.retention.merge(client_id, timestamps, temperature, humidity)
+            self.stats.update(client_id, late)
+        if samples:
+            self._ingest(client_id, samples, live=False)
+        self._notify('on_backfill', client_id, len(late) + len(samples))
+
+    def _stored(self, client_id: str, timestamps: np.ndarray) -> np.ndarray:
+        """返回有序时间戳中已经存储过的样本的掩码
+
+        确认丢失后客户端会重发同一补传帧，已有相同时间戳的样本不再合并。启用持久化时
+        按持久化存储（包括晚到段）判断，可以发现早于内存历史的重发；否则按内存历史判断。
+        """
+        stop = np.nextafter(timestamps[-1], np.inf)
+        segments = self.persist.get(client_id) if self.persist is not None else None
+        if segments is not None:
+            parts = segments.views(timestamps[0], stop)
+        else:
+            parts = [self.store.series(client_id).view_by_time(timestamps[0], stop)]
+        stored = np.zeros(len(timestamps), dtype=bool)
+        for part in parts:
+            stored |= np.isin(timestamps, part.timestamps)
+        return stored
+
+    def _restore_history(self):
+        """从持久化存储恢复每个客户端最近的样本和汇总，客户端记为离线"""
+        covered = {}
+        if os.path.exists(self.rollup_path):
+            covered = self.retention.load(self.rollup_path)
+        for client_id in self.persist.client_ids():
+            segments = self.persist.get(client_id)
+            # 汇总文件保存之后写入的样本（例如进程异常退出时）重新汇总
+            start = np.nextafter(covered.get(client_id, -np.inf), np.inf)
+            for part in segments.views(start):
+                for rollup in self.retention.rollups(client_id):
+                    rollup.add_array(part.timestamps, part.temperature, part.humidity, part.first_index)
+            view = segments.tail(self.store.capacity)
+            if len(view):
+                series = self.store.series(client_id)
+                # 序号接续持久化存储中的序号，与汇总记录一致
+                series.total = view.first_index
+                series.extend_arrays(view.timestamps, view.temperature, view.humidity)
+                # 晚到段中落在恢复范围内的补传样本合并进内存历史
+                for part in segments.late_views(float(view.timestamps[0])):
+                    series.merge(part.timestamps, part.temperature, part.humidity)
+                self.retention.evict(client_id, float(view.timestamps[-1]))
+                self.fleet.update(client_id, float(view.timestamps[-1]), float(view.temperature[-1]),
+                                  float(view.humidity[-1]))
+                self.fleet.set_online(client_id, False)
+
+    def _ingest(self, client_id: str, samples: List, live: bool = True):
+        """把一批样本写入存储和统计，然后通知监听器
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 样本列表
+            live: 是否为实时数据，补传数据不分发给订阅者、不通知 on_data，也不计入延迟
+        """
+        started = time.perf_counter()
+        if self.persist is not None:
+            self.persist.append(client_id, samples)
+        self.store.append(client_id, samples)
+        stored_at = time.time()
+        self.retention.update(client_id, samples, self.store.get(client_id).total - len(samples))
+        self.stats.update(client_id, samples)
+        self.fleet.update(client_id, *samples[-1])
+        if self.alerts:
+            for event in self.alerts.evaluate(client_id, samples):
+                self.alerts_counter.inc()
+                self._notify('on_status', client_id, event.message)
+                self._notify('on_alert', event)
+                for sink in self.alert_sinks:
+                    sink.emit(event)
+        if live and self.pubsub.subscribers:
+            try:
+                self.pubsub.publish(client_id, samples)
+            except Exception as e:
+                # 订阅侧的任何错误都不能影响传感器连接
+                self.log_message(f'分发实时数据失败：{str(e)}', logging.ERROR)
+        if live:
+            self._notify('on_data', client_id, samples)
+        self.samples_counter.inc(len(samples))
+        self.ingest_time.observe(time.perf_counter() - started)
+        client = self.clients.get(client_id)
+        if live and client is not None and client.connection.received_at:
+            self._record_latency(client, samples[-1][0], stored_at)
+
+    def _record_latency(self, client: ClientInfo, sampled: float, stored_at: float):
+        """记录一批样本从传感器读数到写入存储各阶段的延迟
+
+        Args:
+            client: 客户端信息对象
+            sampled: 批中最新样本的客户端时间戳
+            stored_at: 写入存储的时间
+        """
+        latency = self.latency
+        connection = client.connection
+        sampled = latency.to_server_time(client.id, sampled)
+        if sampled is not None:
+            latency.record(client.id, 'transport', connection.received_at - sampled)
+        latency.record(client.id, 'decode', connection.decoded_at - connection.received_at)
+        latency.record(client.id, 'store', stored_at - connection.decoded_at)
+
+    def add_alert_sink(self, sink: AlertSink):
+        """注册告警事件输出"""
+        self.alert_sinks.append(sink)
+
+    def client_stats(self, client_id: str,
+                     window: float = DEFAULT_WINDOWS[0]) -> Optional[Dict[str, WindowStats]]:
+        """返回客户端在一个统计窗口内各通道的统计
+
+        Args:
+            client_id: 客户端ID
+            window: 统计窗口（秒）
+
+        Returns:
+            通道名（temperature/humidity）到统计结果的字典，没有数据时返回 None
+        """
+        return self.stats.summary(client_id, window)
+
+    def fleet_summary(self, threshold: float = float('inf')) -> FleetSummary:
+        """返回所有在线客户端最新数值的汇总
+
+        Args:
+            threshold: 温度阈值，统计超过阈值的客户端数
+        """
+        return self.fleet.summary(threshold)
+
+    def _set_status(self, client: ClientInfo, status: str):
+        """更新客户端在线状态并通知监听器"""
+        client.status = status
+        self.fleet.set_online(client.id, status == "在线")
+        self._notify('on_client_status', client.id, status)
+
+    def _touch(self, client: ClientInfo):
+        """收到心跳或数据，顺延客户端的存活期限"""
+        client.missed_heartbeats = 0
+        self.liveness.schedule(client.id, self.heartbeat_timeout)
+        self._arm_heartbeat_timer()
+
+    def _arm_heartbeat_timer(self):
+        """在最近的存活期限处安排一次检查"""
+        deadline = self.liveness.next_deadline()
+        if deadline is None or not self.engine:
+            return
+        if self.heartbeat_handle and self.heartbeat_armed_at <= deadline:
+            return
+        if self.heartbeat_handle:
+            self.heartbeat_handle.cancel()
+        loop = self.engine.loop
+        self.heartbeat_handle = loop.call_later(max(0.0, deadline - loop.time()), self._check_heartbeats)
+        self.heartbeat_armed_at = deadline
+
+    def _check_heartbeats(self):
+        """处理到期的客户端，只访问确实超时的客户端"""
+        self.heartbeat_handle = None
+        for client_id in self.liveness.expire():
+            client = self.clients.get(client_id)
+            if client is None or client.status != "在线":
+                continue
+            client.missed_heartbeats += 1
+            self.heartbeat_misses.inc()
+            self.log_message(f'客户端 {client_id} 未响应心跳 {client.missed_heartbeats} 次', logging.WARNING)
+            if client.missed_heartbeats >= self.max_missed_heartbeats:
+                self._set_status(client, "离线")
+                self._notify('on_status', client_id, "离线")
+                self.log_message(f'客户端 {client_id} 心跳超时', logging.WARNING)
+            else:
+                self.liveness.schedule(client_id, self.heartbeat_retry)
+        self._arm_heartbeat_timer()
+
+    def _remove_client(self, client_id: str, send_offline_record: bool = False):
+        """移除客户端
+
+        Args:
+            client_id: 客户端ID
+            send_offline_record: 是否发送离线记录
+        """
+        if client_id in self.clients:
+            # 经网关接入的传感器共用网关的连接，不关闭
+            if self.clients[client_id].gateway is None:
+                try:
+                    self.clients[client_id].connection.close()
+                except:
+                    pass
+            if send_offline_record:
+                self._notify('on_status', client_id, "下线")
+            # 不删除客户端数据，只更新状态
+            self._set_status(self.clients[client_id], "离线")
+            self.liveness.remove(client_id)
+            self._notify('on_client_offline', client_id)
@@ -0,0 +1,49 @@
+import signal
+import logging
+import threading
+from typing import List
+
+from .core import ServerCore, ServerListener
+
+logger = logging.getLogger('server')
+
+class LoggingListener(ServerListener):
+    """把服务器事件写入日志的监听器，供无界面模式使用"""
+
+    def on_log(self, message: str, level: int):
+        logger.log(level, message)
+
+    def on_status(self, client_id: str, status: str):
+        logger.info(f'客户端 {client_id} {status}')
+
+    def on_data(self, client_id: str, samples: List):
+        # 每批数据都会调用，参数延迟到确实输出时才格式化
+        logger.debug('客户端 %s 上报 %d 条数据', client_id, len(samples))
+
+    def on_backfill(self, client_id: str, count: int):
+        logger.info(f'客户端 {client_id} 补传 {count} 条数据')
+
+def run_headless(listen: str, **core_options) -> int:
+    """以无界面守护进程方式运行服务器，直到收到 SIGINT/SIGTERM
+
+    Args:
+        listen: 监听地址（格式：host:port）
+        core_options: 传给 ServerCore 的参数
+
+    Returns:
+        进程退出码
+    """
+    core = ServerCore(**core_options)
+    core.add_listener(LoggingListener())
+    if not core.start(listen):
+        return 1
+
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop_event.set())
+    # 带超时等待，保证主线程能及时处理信号
+    while not stop_event.wait(1.0):
+        pass
+
+    core.stop()
+    return 0
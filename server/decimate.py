@@ -0,0 +1,191 @@
+import math
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .store import SampleSeries
+
+# 每个缓存分块包含的桶数
+TILE_BUCKETS = 512
+# 每个序列最多缓存的分块数
+DEFAULT_MAX_TILES = 256
+
+def minmax_decimate(values: np.ndarray, first_index: int, bucket: int) -> Tuple[np.ndarray, np.ndarray]:
+    """最小/最大值降采样
+
+    每 bucket 个样本为一桶，每桶按出现顺序输出最小值和最大值两个点，
+    末尾不足一桶的样本单独成桶。尖峰不会因降采样而丢失。
+
+    Args:
+        values: 样本值
+        first_index: 第一个样本的绝对序号
+        bucket: 每桶样本数
+
+    Returns:
+        (x, y)，x 为样本的绝对序号
+    """
+    count = len(values)
+    if count == 0 or bucket <= 1:
+        return np.arange(first_index, first_index + count, dtype=np.float64), values
+    full = count - count % bucket
+    xs, ys = [], []
+    if full:
+        blocks = values[:full].reshape(-1, bucket)
+        rows = np.arange(len(blocks))
+        i_min = blocks.argmin(axis=1)
+        i_max = blocks.argmax(axis=1)
+        first = np.minimum(i_min, i_max)
+        second = np.maximum(i_min, i_max)
+        starts = first_index + rows * bucket
+        x = np.empty(2 * len(blocks), dtype=np.float64)
+        y = np.empty(2 * len(blocks), dtype=values.dtype)
+        x[0::2] = starts + first
+        x[1::2] = starts + second
+        y[0::2] = blocks[rows, first]
+        y[1::2] = blocks[rows, second]
+        xs.append(x)
+        ys.append(y)
+    if full < count:
+        x, y = minmax_decimate(values[full:], first_index + full, count - full)
+        xs.append(x)
+        ys.append(y)
+    if len(xs) == 1:
+        return xs[0], ys[0]
+    return np.concatenate(xs), np.concatenate(ys)
+
+class _Tile:
+    """一个分块中已降采样的完整桶，覆盖绝对序号 [start, end)"""
+    __slots__ = ('start', 'end', 'x', 'y')
+
+    def __init__(self, start: int, end: int, x: np.ndarray, y: np.ndarray):
+        self.start = start
+        self.end = end
+        self.x = x
+        self.y = y
+
+class SeriesDecimator:
+    """按视图范围降采样单个样本序列
+
+    只处理可见范围内的样本，输出约为像素宽度两倍的点数。缩小查看时桶宽取2的幂，
+    样本按桶宽对齐划分为固定大小的分块，完整桶的降采样结果按分块缓存；
+    样本写入后不会被修改，因此缓存只需在新样本到达时向后追加，
+    每次重绘只需计算分块边界上不足一桶的样本，代价与历史长度无关。
+    补传合并会改变已有样本的绝对序号，序列的 generation 变化时清空缓存。
+    """
+
+    def __init__(self, series: SampleSeries, max_tiles: int = DEFAULT_MAX_TILES):
+        """初始化降采样器
+
+        Args:
+            series: 样本序列
+            max_tiles: 最多缓存的分块数，超出后淘汰最久未使用的分块
+        """
+        self.series = series
+        self.max_tiles = max_tiles
+        self._tiles: Dict[Tuple[str, int, int], _Tile] = OrderedDict()
+        self._generation = series.generation
+
+    def points(self, column: str, first: int, last: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回绝对序号 [first, last) 范围内用于绘制的点
+
+        Args:
+            column: 列名（temperature 或 humidity）
+            first: 起始序号
+            last: 结束序号（不含）
+            width: 绘图区域的像素宽度
+
+        Returns:
+            (x, y)，样本数不超过像素宽度两倍时返回原始样本
+        """
+        width = max(1, width)
+        if self._generation != self.series.generation:
+            self._generation = self.series.generation
+            self.clear()
+        view = self.series.view_by_index(first, last)
+        count = len(view)
+        if count <= 2 * width:
+            x = np.arange(view.first_index, view.first_index + count, dtype=np.float64)
+            return x, getattr(view, column)
+
+        # 桶宽取2的幂，使桶数落在 [width/2, width]，点数约为像素宽度的1~2倍
+        level = math.ceil(math.log2(count / width))
+        bucket = 1 << level
+        span = bucket * TILE_BUCKETS
+        start, stop = view.first_index, view.first_index + count
+        xs, ys = [], []
+        for tile_index in range(start // span, (stop - 1) // span + 1):
+            x, y = self._tile_points(column, level, tile_index, start, stop)
+            if len(x):
+                xs.append(x)
+                ys.append(y)
+        if not xs:
+            return np.empty(0, dtype=np.float64), getattr(view, column)[:0]
+        return np.concatenate(xs), np.concatenate(ys)
+
+    def clear(self):
+        """清空缓存"""
+        self._tiles.clear()
+
+    def _tile_points(self, column: str, level: int, tile_index: int,
+                     start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回一个分块在 [start, stop) 范围内的点"""
+        bucket = 1 << level
+        span = bucket * TILE_BUCKETS
+        tile_start = tile_index * span
+        tile_end = tile_start + span
+        retained_first = self.series.total - len(self.series)
+        available_end = min(tile_end, self.series.total)
+        # 分块内完整保留的桶范围
+        begin = max(tile_start, -(-retained_first // bucket) * bucket)
+        end = max(begin, available_end - (available_end - tile_start) % bucket)
+
+        tile = self._cached_tile(column, level, tile_index, begin, end)
+        parts = []
+        if max(tile_start, retained_first) < begin:
+            # 最早一桶部分样本已被淘汰，现算
+            parts.append(self._decimate(column, max(tile_start, retained_first), begin, bucket))
+        if tile is not None:
+            # 缓存中可能还有已被淘汰的桶，跳过
+            skip = np.searchsorted(tile.x, begin) if tile.start < begin else 0
+            parts.append((tile.x[skip:], tile.y[skip:]))
+        if end < available_end:
+            # 最新一桶尚未写满，现算
+            parts.append(self._decimate(column, end, available_end, bucket))
+        if not parts:
+            return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float32)
+        x = np.concatenate([p[0] for p in parts]) if len(parts) > 1 else parts[0][0]
+        y = np.concatenate([p[1] for p in parts]) if len(parts) > 1 else parts[0][1]
+        if tile_start < start or tile_end > stop:
+            mask = (x >= start) & (x < stop)
+            x, y = x[mask], y[mask]
+        return x, y
+
+    def _cached_tile(self, column: str, level: int, tile_index: int,
+                     begin: int, end: int) -> Optional[_Tile]:
+        """返回覆盖 [begin, end) 完整桶的缓存分块，必要时补算新增的桶"""
+        if end <= begin:
+            return None
+        bucket = 1 << level
+        key = (column, level, tile_index)
+        tile = self._tiles.get(key)
+        if tile is None or tile.start > begin or tile.end < begin:
+            x, y = self._decimate(column, begin, end, bucket)
+            tile = self._tiles[key] = _Tile(begin, end, x, y)
+            self._evict()
+        elif tile.end < end:
+            # 新样本补齐了更多的桶，只计算新增部分
+            x, y = self._decimate(column, tile.end, end, bucket)
+            tile.x = np.concatenate((tile.x, x))
+            tile.y = np.concatenate((tile.y, y))
+            tile.end = end
+        self._tiles.move_to_end(key)
+        return tile
+
+    def _decimate(self, column: str, begin: int, end: int, bucket: int) -> Tuple[np.ndarray, np.ndarray]:
+        view = self.series.view_by_index(begin, end)
+        return minmax_decimate(getattr(view, column), view.first_index, bucket)
+
+    def _evict(self):
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
@@ -0,0 +1,227 @@
+import time
+import asyncio
+import threading
+from typing import Optional, Set, Tuple
+
+from common.protocol import FrameDecoder
+
+# 默认监听队列长度，大量传感器同时上线时避免连接被拒绝
+DEFAULT_BACKLOG = 1024
+
+class IngestHandler:
+    """接入引擎回调接口
+
+    所有回调都在事件循环线程中执行，子类按需覆盖。
+    """
+
+    def connection_made(self, connection: 'ClientConnection') -> object:
+        """新连接建立
+
+        Args:
+            connection: 连接对象
+
+        Returns:
+            与该连接关联的状态对象，之后的回调原样传回
+        """
+        return connection
+
+    def message_received(self, state: object, message: dict) -> bool:
+        """收到一条完整消息
+
+        Args:
+            state: connection_made 返回的状态对象
+            message: 解析后的消息字典
+
+        Returns:
+            是否继续保持连接
+        """
+        return True
+
+    def connection_lost(self, state: object):
+        """连接已关闭
+
+        Args:
+            state: connection_made 返回的状态对象
+        """
+
+    def connection_resumed(self, state: object):
+        """连接的发送缓冲区已降到低水位，可以继续写入
+
+        Args:
+            state: connection_made 返回的状态对象
+        """
+
+    def decode_failed(self, state: object, error: Exception):
+        """收到无法解码的数据，连接随后被关闭
+
+        Args:
+            state: connection_made 返回的状态对象
+            error: 解码异常
+        """
+        self.log_error(f'消息解码错误：{str(error)}')
+
+    def log_error(self, message: str):
+        """记录引擎内部错误
+
+        Args:
+            message: 错误信息
+        """
+
+class ClientConnection(asyncio.Protocol):
+    """单个客户端连接
+
+    基于 asyncio.Protocol 实现，不为每个连接创建线程或任务，
+    收到的数据直接在事件循环中拆帧并分发。
+    """
+
+    def __init__(self, engine: 'IngestEngine'):
+        self.engine = engine
+        self.transport = None
+        self.address = None
+        self.state = None
+        self.decoder = FrameDecoder()
+        self.paused = False  # 发送缓冲区超过高水位，暂停写入
+        self.received_at = 0.0  # 最近一次读取到数据的时间（time.time()）
+        self.decoded_at = 0.0  # 最近一次读取的数据拆帧解码完成的时间
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.address = transport.get_extra_info('peername')
+        self.engine.connections.add(self)
+        self.state = self.engine.handler.connection_made(self)
+
+    def data_received(self, data: bytes):
+        handler = self.engine.handler
+        self.received_at = time.time()
+        try:
+            messages = self.decoder.feed(data)
+            self.decoded_at = time.time()
+        except Exception as e:
+            handler.decode_failed(self.state, e)
+            self.transport.close()
+            return
+        try:
+            # 一次读取可能包含多条消息，逐条处理
+            for message in messages:
+                if not handler.message_received(self.state, message):
+                    self.transport.close()
+                    return
+        except Exception as e:
+            handler.log_error(f'处理客户端消息错误：{str(e)}')
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        self.engine.connections.discard(self)
+        self.engine.handler.connection_lost(self.state)
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.engine.handler.connection_resumed(self.state)
+
+    def send(self, data: bytes):
+        """发送数据，可在任意线程调用
+
+        Args:
+            data: 已打包的字节串
+        """
+        self.engine.call_in_loop(self._write, data)
+
+    def close(self):
+        """关闭连接，可在任意线程调用"""
+        self.engine.call_in_loop(self.transport.close)
+
+    def _write(self, data: bytes):
+        if not self.transport.is_closing():
+            self.transport.write(data)
+
+class IngestEngine:
+    """基于 asyncio 的数据接入引擎
+
+    在单个后台线程中运行事件循环，负责监听端口、接受连接和拆帧，
+    消息通过 IngestHandler 回调交给上层处理。
+    """
+
+    def __init__(self, handler: IngestHandler, backlog: int = DEFAULT_BACKLOG):
+        """初始化接入引擎
+
+        Args:
+            handler: 回调处理对象
+            backlog: 监听队列长度
+        """
+        self.handler = handler
+        self.backlog = backlog
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.connections: Set[ClientConnection] = set()
+
+    def start(self, host: str, port: int):
+        """启动事件循环线程并开始监听
+
+        Args:
+            host: 监听地址
+            port: 监听端口
+
+        Raises:
+            OSError: 端口绑定失败
+        """
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name='ingest-engine', daemon=True)
+        self.thread.start()
+        try:
+            # 等待监听建立，绑定失败时在调用线程抛出异常
+            future = asyncio.run_coroutine_threadsafe(self._listen(host, port), self.loop)
+            future.result()
+        except Exception:
+            self.stop()
+            raise
+
+    def stop(self):
+        """停止监听、关闭所有连接并结束事件循环线程"""
+        if not self.loop:
+            return
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        self.thread = None
+
+    def address(self) -> Tuple[str, int]:
+        """返回实际监听的地址"""
+        return self.server.sockets[0].getsockname()[:2]
+
+    def call_in_loop(self, callback, *args):
+        """在事件循环线程中执行回调，已在该线程中时直接调用
+
+        Args:
+            callback: 回调函数
+            args: 回调参数
+        """
+        if threading.current_thread() is self.thread:
+            callback(*args)
+        elif self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _listen(self, host: str, port: int):
+        self.server = await self.loop.create_server(
+            lambda: ClientConnection(self), host, port, backlog=self.backlog)
+
+    async def _shutdown(self):
+        if self.server:
+            self.server.close()
+        for connection in list(self.connections):
+            connection.transport.close()
+        # 让 connection_lost 回调执行完毕
+        await asyncio.sleep(0)
+        if self.server:
+            await self.server.wait_closed()
+            self.server = None
@@ -0,0 +1,50 @@
+import time
+from collections import deque
+from typing import List, Tuple
+
+class IngestQueue:
+    """多生产者单消费者事件队列
+
+    基于 collections.deque 实现：append 和 popleft 在 CPython 中是原子操作，
+    网络线程入队时无需加锁；界面线程每帧批量取出全部事件统一处理。
+    """
+
+    def __init__(self):
+        self._items = deque()
+        self.peak_depth = 0  # 取出前观察到的最大积压量
+        self.last_drain_count = 0  # 上一次取出的事件数
+        self.last_drain_time = 0.0  # 上一次取出并处理所用时间（秒）
+
+    def put(self, event: Tuple):
+        """入队一个事件，可在任意线程调用
+
+        Args:
+            event: 事件元组，第一个元素为事件名
+        """
+        self._items.append(event)
+
+    def depth(self) -> int:
+        """当前积压的事件数"""
+        return len(self._items)
+
+    def drain(self) -> List[Tuple]:
+        """取出当前积压的所有事件，只能由消费者线程调用
+
+        Returns:
+            按入队顺序排列的事件列表
+        """
+        count = len(self._items)
+        self.peak_depth = max(self.peak_depth, count)
+        popleft = self._items.popleft
+        # 只取调用时已有的事件，处理期间新入队的留到下一帧
+        return [popleft() for _ in range(count)]
+
+    def record_drain(self, count: int, started: float):
+        """记录一次批量处理的统计信息
+
+        Args:
+            count: 处理的事件数
+            started: 开始处理时的 time.perf_counter() 值
+        """
+        self.last_drain_count = count
+        self.last_drain_time = time.perf_counter() - started
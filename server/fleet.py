@@ -0,0 +1,128 @@
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+# 数组初始容量，不够时按倍数扩容
+INITIAL_CAPACITY = 1024
+# 温度分布直方图的分箱数
+HISTOGRAM_BINS = 20
+
+class FleetSummary(NamedTuple):
+    """全部客户端的汇总"""
+    total: int  # 出现过的客户端数
+    online: int  # 在线客户端数
+    reporting: int  # 在线且有数据的客户端数
+    temperature_mean: float
+    temperature_min: float
+    temperature_max: float
+    temperature_max_client: Optional[str]
+    humidity_mean: float
+    humidity_max: float
+    humidity_max_client: Optional[str]
+    above_threshold: int  # 温度超过阈值的在线客户端数
+    histogram: np.ndarray  # 在线客户端的温度分布
+    histogram_edges: np.ndarray
+
+class FleetAggregates:
+    """全网最新数值的列式汇总
+
+    每个客户端分配一个稠密句柄，最新温度、湿度和在线状态保存在按句柄索引的连续
+    NumPy 数组中。写入为 O(1)，跨客户端的均值、最大值、直方图等汇总都是对整列的
+    一次向量运算，不需要遍历客户端字典。
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        """初始化汇总
+
+        Args:
+            capacity: 初始容量
+        """
+        self._handles: Dict[str, int] = {}  # client_id -> 句柄
+        self._ids: List[str] = []
+        self.temperature = np.full(capacity, np.nan)
+        self.humidity = np.full(capacity, np.nan)
+        self.updated_at = np.zeros(capacity)
+        self.online = np.zeros(capacity, dtype=bool)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def handle(self, client_id: str) -> int:
+        """返回客户端的句柄，不存在时分配"""
+        handle = self._handles.get(client_id)
+        if handle is None:
+            with self._lock:
+                handle = self._handles.get(client_id)
+                if handle is None:
+                    handle = len(self._ids)
+                    if handle == len(self.temperature):
+                        self._grow()
+                    self._ids.append(client_id)
+                    self._handles[client_id] = handle
+        return handle
+
+    def update(self, client_id: str, timestamp: float, temperature: float, humidity: float):
+        """记录客户端的最新数值"""
+        handle = self.handle(client_id)
+        self.temperature[handle] = temperature
+        self.humidity[handle] = humidity
+        self.updated_at[handle] = timestamp
+
+    def set_online(self, client_id: str, online: bool):
+        """记录客户端的在线状态"""
+        handle = self.handle(client_id)
+        self.online[handle] = online
+
+    def summary(self, threshold: float = np.inf, bins: int = HISTOGRAM_BINS) -> FleetSummary:
+        """计算在线客户端的汇总
+
+        Args:
+            threshold: 温度阈值，统计超过阈值的客户端数
+            bins: 温度直方图的分箱数
+
+        Returns:
+            汇总结果，没有在线客户端时数值为 NaN
+        """
+        with self._lock:
+            count = len(self._ids)
+            online = self.online[:count]
+            temperature = self.temperature[:count]
+            humidity = self.humidity[:count]
+            ids = self._ids
+        reporting = online & ~np.isnan(temperature)
+        temperature = temperature[reporting]
+        humidity = humidity[reporting]
+        handles = np.flatnonzero(reporting)
+        if len(handles) == 0:
+            nan = np.nan
+            return FleetSummary(count, int(online.sum()), 0, nan, nan, nan, None, nan, nan, None, 0,
+                                np.zeros(bins, dtype=np.int64), np.linspace(0, 1, bins + 1))
+        hottest = int(temperature.argmax())
+        most_humid = int(humidity.argmax())
+        histogram, edges = np.histogram(temperature, bins=bins)
+        return FleetSummary(
+            total=count,
+            online=int(online.sum()),
+            reporting=len(handles),
+            temperature_mean=float(temperature.mean()),
+            temperature_min=float(temperature.min()),
+            temperature_max=float(temperature[hottest]),
+            temperature_max_client=ids[handles[hottest]],
+            humidity_mean=float(humidity.mean()),
+            humidity_max=float(humidity[most_humid]),
+            humidity_max_client=ids[handles[most_humid]],
+            above_threshold=int(np.count_nonzero(temperature > threshold)),
+            histogram=histogram,
+            histogram_edges=edges)
+
+    def _grow(self):
+        """容量翻倍，旧数组复制到新数组"""
+        size = len(self.temperature) * 2
+        for name, fill in (('temperature', np.nan), ('humidity', np.nan), ('updated_at', 0.0),
+                           ('online', False)):
+            old = getattr(self, name)
+            new = np.full(size, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
@@ -0,0 +1,91 @@
+import time
+import heapq
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+class DeadlineScheduler:
+    """基于最小堆的存活期限调度器
+
+    每个对象在堆中最多只有一个有效条目。期限延后（收到心跳）时只更新字典中的值，
+    代价为 O(1)；条目到达堆顶时若发现期限已被延后，再按新期限重新入堆。
+    因此周期检查只需查看堆顶，不需要遍历所有对象。
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        """初始化调度器
+
+        Args:
+            clock: 单调时钟函数，返回秒
+        """
+        self.clock = clock
+        self._deadlines: Dict[Hashable, Tuple[float, int]] = {}  # key -> (期限, 代号)
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def schedule(self, key: Hashable, delay: float):
+        """设置对象的期限为当前时间之后 delay 秒
+
+        Args:
+            key: 对象标识
+            delay: 距期限的秒数
+        """
+        deadline = self.clock() + delay
+        current = self._deadlines.get(key)
+        if current is not None and deadline >= current[0]:
+            # 期限延后：堆中旧条目到期时再重新入堆
+            self._deadlines[key] = (deadline, current[1])
+            return
+        # 新对象或期限提前：使用新代号入堆，旧条目自动失效
+        self._generation += 1
+        self._deadlines[key] = (deadline, self._generation)
+        heapq.heappush(self._heap, (deadline, self._generation, key))
+
+    def remove(self, key: Hashable):
+        """取消对象的期限，堆中条目在到达堆顶时丢弃"""
+        self._deadlines.pop(key, None)
+
+    def next_deadline(self) -> Optional[float]:
+        """返回最近的期限（可能早于实际期限），没有对象时返回 None"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def expire(self, now: float = None) -> List[Hashable]:
+        """取出所有已到期的对象，到期对象会从调度器中移除
+
+        Args:
+            now: 当前时间，默认读取时钟
+
+        Returns:
+            到期对象标识列表
+        """
+        if now is None:
+            now = self.clock()
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, generation, key = heapq.heappop(heap)
+            current = self._deadlines.get(key)
+            if current is None or current[1] != generation:
+                continue
+            if current[0] > now:
+                # 期限已被延后，按新期限重新入堆
+                heapq.heappush(heap, (current[0], generation, key))
+                continue
+            del self._deadlines[key]
+            expired.append(key)
+        return expired
+
+    def _discard_stale(self):
+        """丢弃堆顶已失效的条目"""
+        heap = self._heap
+        while heap:
+            _, generation, key = heap[0]
+            current = self._deadlines.get(key)
+            if current is not None and current[1] == generation:
+                return
+            heapq.heappop(heap)
@@ -0,0 +1,182 @@
+import json
+import bisect
+import threading
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .metrics import MetricsRegistry, bucket_quantile
+
+# 延迟的各个阶段：
+# transport  传感器读数到服务器收到（按时钟偏差校正）
+# decode     收到到拆帧解码完成
+# store      解码完成到写入存储
+# render     写入存储到界面取出显示
+# end_to_end 传感器读数到界面显示
+STAGES = ('transport', 'decode', 'store', 'render', 'end_to_end')
+# 延迟直方图的分桶上界（秒）
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 估计时钟偏差时保留的最近心跳往返数，0 表示不校正
+DEFAULT_OFFSET_WINDOW = 8
+# 数组初始容量，不够时按倍数扩容
+INITIAL_CAPACITY = 1024
+
+class LatencyTracker:
+    """按客户端和阶段统计延迟
+
+    每个客户端分配一个稠密句柄，各阶段的分桶计数保存在 [句柄, 阶段, 桶] 的三维
+    NumPy 数组中，记录一次为 O(log 桶数)；全网分布是对句柄轴的一次求和，同时写入
+    指标注册表供 Prometheus 抓取。接入线程和界面线程都会写入，计数和扩容在同一把锁下
+    进行，扩容时不会丢失另一个线程的计数。
+
+    时钟偏差由客户端根据心跳往返计算并在下一次心跳中上报，服务器保留最近若干次
+    往返，取往返时间最短的一次作为估计（排队延迟最小，误差最小）。
+    """
+
+    def __init__(self, metrics: Optional[MetricsRegistry] = None,
+                 offset_window: int = DEFAULT_OFFSET_WINDOW, capacity: int = INITIAL_CAPACITY):
+        """初始化延迟统计
+
+        Args:
+            metrics: 指标注册表，不为 None 时同时记录全网各阶段的延迟直方图
+            offset_window: 估计时钟偏差时保留的往返数，0 表示不校正
+            capacity: 初始容量
+        """
+        self.offset_window = offset_window
+        self.bounds = LATENCY_BUCKETS
+        self._handles: Dict[str, int] = {}  # client_id -> 句柄
+        self._ids: List[str] = []
+        self.counts = np.zeros((capacity, len(STAGES), len(self.bounds) + 1), dtype=np.int64)
+        self._stage_index = {stage: i for i, stage in enumerate(STAGES)}
+        self._histograms = [metrics.histogram('latency_seconds', '各阶段的延迟（秒）', {'stage': stage},
+                                              self.bounds) if metrics is not None else None
+                            for stage in STAGES]
+        self._clock_samples: Dict[str, deque] = {}  # client_id -> (往返时间, 偏差)
+        self._offsets: Dict[str, Tuple[float, float]] = {}  # client_id -> (偏差, 往返时间)
+        self._awaiting = set()  # 支持时钟同步但尚未上报偏差的客户端
+        self._clock_sources: Dict[str, str] = {}  # client_id -> 共用其时钟的客户端（例如所属网关）
+        self._lock = threading.Lock()
+
+    def handle(self, client_id: str) -> int:
+        """返回客户端的句柄，不存在时分配"""
+        handle = self._handles.get(client_id)
+        if handle is None:
+            with self._lock:
+                handle = self._handles.get(client_id)
+                if handle is None:
+                    handle = len(self._ids)
+                    if handle == len(self.counts):
+                        self._grow()
+                    self._ids.append(client_id)
+                    self._handles[client_id] = handle
+        return handle
+
+    def record(self, client_id: str, stage: str, seconds: float):
+        """记录一次延迟
+
+        Args:
+            client_id: 客户端ID
+            stage: 阶段，见 STAGES
+            seconds: 延迟（秒），时钟校正残差导致的负值计入第一个桶
+        """
+        index = self._stage_index[stage]
+        bucket = bisect.bisect_left(self.bounds, seconds)
+        # 先取句柄：分配句柄可能扩容并替换 self.counts
+        handle = self.handle(client_id)
+        with self._lock:
+            self.counts[handle, index, bucket] += 1
+        histogram = self._histograms[index]
+        if histogram is not None:
+            histogram.observe(seconds)
+
+    def expect_clock(self, client_id: str):
+        """客户端支持时钟同步，在首次上报偏差之前不换算它的时间戳"""
+        if self.offset_window > 0 and client_id not in self._offsets:
+            self._awaiting.add(client_id)
+
+    def set_clock_source(self, client_id: str, source_id: Optional[str]):
+        """客户端的时间戳由另一个客户端（例如所属网关）的时钟产生，共用它的偏差估计
+
+        Args:
+            client_id: 客户端ID
+            source_id: 提供时钟的客户端ID，None 表示使用自己的估计
+        """
+        if source_id is None:
+            self._clock_sources.pop(client_id, None)
+        else:
+            self._clock_sources[client_id] = source_id
+
+    def add_clock_sample(self, client_id: str, offset: float, rtt: float):
+        """记录客户端上报的一次心跳往返
+
+        Args:
+            client_id: 客户端ID
+            offset: 客户端时钟减服务器时钟（秒）
+            rtt: 扣除服务器处理时间后的往返时间（秒）
+        """
+        if self.offset_window <= 0:
+            return
+        samples = self._clock_samples.get(client_id)
+        if samples is None:
+            samples = self._clock_samples[client_id] = deque(maxlen=self.offset_window)
+        samples.append((rtt, offset))
+        best_rtt, best_offset = min(samples)
+        self._offsets[client_id] = (best_offset, best_rtt)
+        self._awaiting.discard(client_id)
+
+    def offset(self, client_id: str) -> float:
+        """返回客户端时钟相对服务器的偏差估计（秒），没有估计时为0"""
+        estimate = self._offsets.get(self._clock_sources.get(client_id, client_id))
+        return estimate[0] if estimate is not None else 0.0
+
+    def rtt(self, client_id: str) -> Optional[float]:
+        """返回估计偏差所用的往返时间（秒），没有估计时为 None"""
+        estimate = self._offsets.get(self._clock_sources.get(client_id, client_id))
+        return estimate[1] if estimate is not None else None
+
+    def to_server_time(self, client_id: str, timestamp: float) -> Optional[float]:
+        """把客户端时间戳换算为服务器时钟，正在等待首次时钟同步时返回 None"""
+        if self._clock_sources.get(client_id, client_id) in self._awaiting:
+            return None
+        return timestamp - self.offset(client_id)
+
+    def quantile(self, client_id: str, stage: str, q: float) -> float:
+        """返回客户端某阶段延迟的分位数估计（秒），没有记录时为 nan"""
+        handle = self._handles.get(client_id)
+        if handle is None:
+            return np.nan
+        return bucket_quantile(self.bounds, self.counts[handle, self._stage_index[stage]].tolist(), q)
+
+    def fleet_counts(self, stage: str) -> np.ndarray:
+        """返回全部客户端某阶段的分桶计数"""
+        return self.counts[:len(self._ids), self._stage_index[stage]].sum(axis=0)
+
+    def summary(self, client_id: str) -> Dict[str, object]:
+        """返回客户端的时钟偏差和各阶段延迟的分位数（毫秒）"""
+        handle = self._handles.get(client_id)
+        rtt = self.rtt(client_id)
+        result = {'client_id': client_id, 'clock_offset_ms': self.offset(client_id) * 1000,
+                  'rtt_ms': rtt * 1000 if rtt is not None else None}
+        for stage in STAGES:
+            counts = self.counts[handle, self._stage_index[stage]].tolist() if handle is not None else []
+            total = sum(counts)
+            result[stage] = {'count': total} if not total else {
+                'count': total,
+                'p50_ms': bucket_quantile(self.bounds, counts, 0.5) * 1000,
+                'p99_ms': bucket_quantile(self.bounds, counts, 0.99) * 1000,
+            }
+        return result
+
+    def lines(self) -> Iterator[bytes]:
+        """逐行产生每个客户端的延迟摘要（NDJSON）"""
+        for client_id in list(self._ids):
+            yield (json.dumps(self.summary(client_id), ensure_ascii=False) + '\n').encode('utf-8')
+
+    def _grow(self):
+        """容量翻倍，旧数组复制到新数组，调用时持有锁"""
+        old = self.counts
+        new = np.zeros((len(old) * 2,) + old.shape[1:], dtype=old.dtype)
+        new[:len(old)] = old
+        self.counts = new
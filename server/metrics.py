@@ -0,0 +1,283 @@
+import math
+import bisect
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 耗时直方图的默认分桶上界（秒），覆盖 50 微秒到 5 秒
+DEFAULT_LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def bucket_quantile(bounds: Sequence[float], counts: Sequence[float], q: float) -> float:
+    """按分桶计数估计分位数，桶内线性插值（与 Prometheus 的 histogram_quantile 一致）
+
+    Args:
+        bounds: 各桶上界，不含 +Inf
+        counts: 各桶计数（非累计），比 bounds 多一个 +Inf 桶
+        q: 分位数（0~1）
+
+    Returns:
+        估计值，没有样本时返回 nan；落在 +Inf 桶时返回最大的有限上界
+    """
+    total = sum(counts)
+    if total == 0:
+        return math.nan
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            if i == len(bounds):
+                return bounds[-1]
+            lower = bounds[i - 1] if i > 0 else 0.0
+            return lower + (bounds[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return bounds[-1]
+
+class _ThreadCells:
+    """每个线程独立的计数单元
+
+    热路径上每个线程只写自己的单元，不加锁也不会丢失更新；读取时把所有单元相加。
+    新建单元和读取时把已结束线程的单元并入基础值，为每个请求创建线程的服务器
+    即使长期无人读取，单元数也不超过存活的线程数。
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._cells: List[Tuple[threading.Thread, list]] = []
+        self._retired = [0] * size  # 已结束线程的累计值
+        self._lock = threading.Lock()
+
+    def cell(self) -> list:
+        """返回当前线程的单元，首次调用时创建"""
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0] * self.size
+            with self._lock:
+                self._prune()
+                self._cells.append((threading.current_thread(), cell))
+            return cell
+
+    def totals(self) -> list:
+        """返回所有线程单元的逐项之和"""
+        with self._lock:
+            self._prune()
+            totals = list(self._retired)
+            for _, cell in self._cells:
+                totals = [a + b for a, b in zip(totals, cell)]
+        return totals
+
+    def _prune(self):
+        """把已结束线程的单元并入基础值，调用时持有锁"""
+        alive = []
+        for thread, cell in self._cells:
+            if thread.is_alive():
+                alive.append((thread, cell))
+            else:
+                self._retired = [a + b for a, b in zip(self._retired, cell)]
+        self._cells = alive
+
+class Metric:
+    """指标基类"""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        """产生 (指标名后缀, 标签, 值)"""
+        raise NotImplementedError
+
+class Counter(Metric):
+    """单调递增计数器
+
+    inc() 只写当前线程的计数单元，不加锁；也可以用回调在读取时取值，
+    适合已经由其他对象维护的计数。
+    """
+
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Labels = (), func: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self.func = func
+        self._cells = _ThreadCells(1)
+        self._local = self._cells._local
+
+    def inc(self, amount: float = 1):
+        """增加计数，可在任意线程调用"""
+        try:
+            self._local.cell[0] += amount
+        except AttributeError:
+            self._cells.cell()[0] += amount
+
+    @property
+    def value(self) -> float:
+        if self.func is not None:
+            return self.func()
+        return self._cells.totals()[0]
+
+    def samples(self):
+        yield '', self.labels, self.value
+
+class Gauge(Metric):
+    """可增可减的瞬时值，set() 是单次赋值，也可以用回调在读取时取值"""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, labels: Labels = (), func: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self.func = func
+        self._value = 0
+
+    def set(self, value: float):
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        if self.func is not None:
+            return self.func()
+        return self._value
+
+    def samples(self):
+        yield '', self.labels, self.value
+
+class Histogram(Metric):
+    """固定分桶直方图
+
+    observe() 用二分查找定位桶并写入当前线程的计数单元，不加锁。
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Labels = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.bounds = tuple(sorted(buckets))
+        # 每个桶一个计数，最后两项为 +Inf 桶和观测值之和
+        self._cells = _ThreadCells(len(self.bounds) + 2)
+        self._local = self._cells._local
+
+    def observe(self, value: float):
+        """记录一个观测值，可在任意线程调用"""
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._cells.cell()
+        cell[bisect.bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """返回各桶计数（非累计，含 +Inf 桶）和观测值之和"""
+        totals = self._cells.totals()
+        return totals[:-1], totals[-1]
+
+    @property
+    def count(self) -> int:
+        return sum(self.snapshot()[0])
+
+    def quantile(self, q: float) -> float:
+        """按启动以来的全部观测估计分位数"""
+        return bucket_quantile(self.bounds, self.snapshot()[0], q)
+
+    def samples(self):
+        counts, total = self.snapshot()
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), counts):
+            cumulative += count
+            yield '_bucket', self.labels + (('le', _format_value(bound)),), cumulative
+        yield '_sum', self.labels, total
+        yield '_count', self.labels, cumulative
+
+class MetricsRegistry:
+    """指标注册表
+
+    同名同标签的指标只创建一次，重复注册返回已有对象。render() 输出
+    Prometheus 文本格式，同名指标的不同标签共用一组 HELP/TYPE 行。
+    """
+
+    def __init__(self, prefix: str = ''):
+        """初始化注册表
+
+        Args:
+            prefix: 所有指标名的前缀
+        """
+        self.prefix = prefix
+        self._metrics: Dict[Tuple[str, Labels], Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Optional[Dict[str, str]] = None,
+                func: Optional[Callable[[], float]] = None) -> Counter:
+        """注册计数器，func 不为 None 时读取时调用它取值"""
+        return self._register(Counter, name, help, labels, func=func)
+
+    def gauge(self, name: str, help: str, labels: Optional[Dict[str, str]] = None,
+              func: Optional[Callable[[], float]] = None) -> Gauge:
+        """注册瞬时值，func 不为 None 时读取时调用它取值"""
+        return self._register(Gauge, name, help, labels, func=func)
+
+    def histogram(self, name: str, help: str, labels: Optional[Dict[str, str]] = None,
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        """注册直方图"""
+        return self._register(Histogram, name, help, labels, buckets=buckets)
+
+    def _register(self, cls, name: str, help: str, labels: Optional[Dict[str, str]], **options) -> Metric:
+        name = self.prefix + name
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls(name, help, key[1], **options)
+        if not isinstance(metric, cls):
+            raise ValueError(f'指标 {name} 已注册为 {metric.type}')
+        return metric
+
+    def get(self, name: str, labels: Optional[Dict[str, str]] = None) -> Optional[Metric]:
+        """按名称（不含前缀）和标签查找指标"""
+        return self._metrics.get((self.prefix + name, tuple(sorted((labels or {}).items()))))
+
+    def family(self, name: str) -> List[Metric]:
+        """返回同名（不含前缀）的所有标签组合"""
+        name = self.prefix + name
+        return [metric for (metric_name, _), metric in list(self._metrics.items()) if metric_name == name]
+
+    def total(self, name: str) -> float:
+        """同名计数器或瞬时值在所有标签上的总和"""
+        return sum(metric.value for metric in self.family(name))
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式"""
+        families: Dict[str, List[Metric]] = {}
+        for (name, _), metric in sorted(list(self._metrics.items())):
+            families.setdefault(name, []).append(metric)
+        lines = []
+        for name, metrics in families.items():
+            lines.append(f'# HELP {name} {metrics[0].help}')
+            lines.append(f'# TYPE {name} {metrics[0].type}')
+            for metric in metrics:
+                for suffix, labels, value in metric.samples():
+                    lines.append(f'{name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value))
@@ -0,0 +1,561 @@
+import os
+import mmap
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from .store import SeriesView
+
+# 每个段文件容纳的样本数（每个样本16字节，约1MiB）
+DEFAULT_SEGMENT_CAPACITY = 65536
+# 同时保持映射的已写满段数，超出后释放最久未访问的映射
+DEFAULT_MAX_MAPPED = 1024
+
+SEGMENT_SUFFIX = '.seg'
+# 补传样本早于已写入的数据，单独写入以此为前缀的段文件，不参与序号编排
+LATE_PREFIX = 'late-'
+# 未写满的晚到段超过该数目时合并为按段容量切分的有序段，晚到段的文件数不随补传次数增长
+LATE_MERGE_FANIN = 4
+SEGMENT_MAGIC = b'SSEG'
+SEGMENT_VERSION = 1
+HEADER_SIZE = 64
+# 段文件头：计数在数据写入之后更新，计数之外的内容视为未写入
+HEADER = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('capacity', '<u8'),
+    ('count', '<u8'),
+    ('first_index', '<u8'),  # 第一个样本在客户端全部样本中的序号
+    ('first_timestamp', '<f8'),
+    ('last_timestamp', '<f8'),
+])
+# 数据区按列存放：时间戳、温度、湿度，与 SeriesView 的类型一致
+COLUMNS = (('timestamps', np.dtype('<f8')), ('temperature', np.dtype('<f4')),
+           ('humidity', np.dtype('<f4')))
+RECORD_SIZE = sum(dtype.itemsize for _, dtype in COLUMNS)
+
+class SegmentInfo(NamedTuple):
+    """段文件的索引信息，来自文件头"""
+    capacity: int
+    count: int
+    first_index: int
+    first_timestamp: float
+    last_timestamp: float
+
+def read_segment_info(path: str) -> SegmentInfo:
+    """只读取段文件头
+
+    Raises:
+        ValueError: 文件不是段文件
+    """
+    with open(path, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f'段文件头不完整：{path}')
+    header = np.frombuffer(data, dtype=HEADER, count=1)[0]
+    if header['magic'] != SEGMENT_MAGIC or header['version'] != SEGMENT_VERSION:
+        raise ValueError(f'不是段文件：{path}')
+    return SegmentInfo(int(header['capacity']), int(header['count']), int(header['first_index']),
+                       float(header['first_timestamp']), float(header['last_timestamp']))
+
+class Segment:
+    """一个定长记录的只追加段文件
+
+    文件由64字节的文件头和按列存放的定长数据区组成，创建时即分配到完整大小，
+    通过 mmap 写入和读取。读取返回映射上的零复制 NumPy 视图；已写入的记录不会
+    再被修改，因此视图在之后的写入中保持不变。
+    """
+
+    def __init__(self, path: str, info: SegmentInfo):
+        self.path = path
+        self.capacity = info.capacity
+        self.count = info.count
+        self.first_index = info.first_index
+        self.first_timestamp = info.first_timestamp
+        self.last_timestamp = info.last_timestamp
+        self._map: Optional[mmap.mmap] = None
+        self._writable = False
+        self._count = None  # 文件头中计数字段的视图
+        self._bounds = None  # 文件头中首末时间戳字段的视图
+        self._columns: Tuple[np.ndarray, ...] = ()
+
+    @classmethod
+    def create(cls, path: str, capacity: int, first_index: int) -> 'Segment':
+        """创建新的段文件"""
+        header = np.zeros(1, dtype=HEADER)
+        header['magic'] = SEGMENT_MAGIC
+        header['version'] = SEGMENT_VERSION
+        header['capacity'] = capacity
+        header['first_index'] = first_index
+        header['first_timestamp'] = np.nan
+        header['last_timestamp'] = np.nan
+        with open(path, 'wb') as f:
+            f.write(header.tobytes().ljust(HEADER_SIZE, b'\0'))
+            f.truncate(HEADER_SIZE + capacity * RECORD_SIZE)
+        return cls(path, read_segment_info(path))
+
+    @property
+    def info(self) -> SegmentInfo:
+        return SegmentInfo(self.capacity, self.count, self.first_index, self.first_timestamp,
+                           self.last_timestamp)
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def mapped(self) -> bool:
+        return self._map is not None
+
+    def map(self, writable: bool = False):
+        """映射文件，已按所需模式映射时不做任何事"""
+        if self._map is not None:
+            if not writable or self._writable:
+                return
+            self.unmap()
+        with open(self.path, 'r+b' if writable else 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        self._count = np.frombuffer(mapping, '<u8', 1, HEADER.fields['count'][1])
+        self._bounds = np.frombuffer(mapping, '<f8', 2, HEADER.fields['first_timestamp'][1])
+        offset = HEADER_SIZE
+        columns = []
+        for _, dtype in COLUMNS:
+            columns.append(np.frombuffer(mapping, dtype, self.capacity, offset))
+            offset += self.capacity * dtype.itemsize
+        self._map = mapping
+        self._writable = writable
+        self._columns = tuple(columns)
+
+    def unmap(self):
+        """释放映射，已返回的视图仍然有效，映射在视图全部释放后解除"""
+        if self._map is not None:
+            self.flush()
+            self._map = None
+            self._count = self._bounds = None
+            self._columns = ()
+
+    def append(self, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray) -> int:
+        """写入尽可能多的样本，返回写入的样本数"""
+        self.map(writable=True)
+        count = self.count
+        written = min(len(timestamps), self.capacity - count)
+        if written <= 0:
+            return 0
+        end = count + written
+        for column, values in zip(self._columns, (timestamps, temperature, humidity)):
+            column[count:end] = values[:written]
+        self._commit(end, timestamps[0], timestamps[written - 1])
+        return written
+
+    def append_one(self, timestamp: float, temperature: float, humidity: float):
+        """写入一个样本，调用前需确认段未写满"""
+        self.map(writable=True)
+        count = self.count
+        timestamps, temperatures, humidities = self._columns
+        timestamps[count] = timestamp
+        temperatures[count] = temperature
+        humidities[count] = humidity
+        self._commit(count + 1, timestamp, timestamp)
+
+    def _commit(self, end: int, first_timestamp: float, last_timestamp: float):
+        """数据写完后再更新文件头中的时间范围和计数"""
+        if self.count == 0:
+            self.first_timestamp = self._bounds[0] = first_timestamp
+        self.last_timestamp = self._bounds[1] = last_timestamp
+        self.count = self._count[0] = end
+
+    def view(self, start: int = 0, stop: Optional[int] = None) -> SeriesView:
+        """返回段内 [start, stop) 范围的零复制视图"""
+        self.map()
+        start, stop, _ = slice(start, stop).indices(self.count)
+        stop = max(start, stop)
+        timestamps, temperature, humidity = self._columns
+        return SeriesView(timestamps[start:stop], temperature[start:stop], humidity[start:stop],
+                          self.first_index + start)
+
+    def search(self, timestamp: float) -> int:
+        """返回段内第一个时间戳不小于 timestamp 的位置"""
+        self.map()
+        return int(np.searchsorted(self._columns[0][:self.count], timestamp))
+
+    def flush(self):
+        """把映射中的修改写回文件"""
+        if self._map is not None and self._writable:
+            self._map.flush()
+
+class _MapCache:
+    """已写满段的映射 LRU，限制同时打开的映射数"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._segments: 'OrderedDict[int, Segment]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, segment: Segment):
+        with self._lock:
+            key = id(segment)
+            if key in self._segments:
+                self._segments.move_to_end(key)
+                return
+            segment.map()
+            self._segments[key] = segment
+            while len(self._segments) > self.limit:
+                _, evicted = self._segments.popitem(last=False)
+                evicted.unmap()
+
+    def discard(self, segment: Segment):
+        with self._lock:
+            self._segments.pop(id(segment), None)
+
+class SegmentSeries:
+    """单个客户端的段文件序列
+
+    段文件以第一个样本的序号命名，最后一个段为写入段，写满后新建下一个段。按时间查询时
+    先用文件头中的时间范围挑出相关的段，再在段内二分查找。
+    早于已有数据的补传样本写成晚到段，查询时逐段插入相同时间范围的样本。每批补传
+    先写成一个小段，小段积累到一定数目后合并，晚到段的总数约为晚到样本数 / 段容量。
+    晚到段只以复制的形式返回给调用方，合并时可以直接删除旧文件。
+    """
+
+    def __init__(self, directory: str, capacity: int, cache: _MapCache):
+        self.directory = directory
+        self.capacity = capacity
+        self._cache = cache
+        self.segments: List[Segment] = []
+        self.late: List[Segment] = []  # 晚到段，按写入顺序
+        self._late_sequence = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """读取目录中已有段文件的文件头，不映射数据"""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        for name in names:
+            path = os.path.join(self.directory, name)
+            segment = Segment(path, read_segment_info(path))
+            if name.startswith(LATE_PREFIX):
+                self.late.append(segment)
+                self._late_sequence = int(name[len(LATE_PREFIX):-len(SEGMENT_SUFFIX)]) + 1
+            else:
+                self.segments.append(segment)
+
+    def __len__(self) -> int:
+        return self.total - self.first_index
+
+    @property
+    def total(self) -> int:
+        """累计写入的样本数"""
+        if not self.segments:
+            return 0
+        segment = self.segments[-1]
+        return segment.first_index + segment.count
+
+    @property
+    def first_index(self) -> int:
+        return self.segments[0].first_index if self.segments else 0
+
+    def extend_arrays(self, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray):
+        """按列追加一批样本"""
+        with self._lock:
+            offset = 0
+            while offset < len(timestamps):
+                segment = self._writable()
+                offset += segment.append(timestamps[offset:], temperature[offset:], humidity[offset:])
+
+    def append(self, timestamp: float, temperature: float, humidity: float):
+        """追加一个样本"""
+        with self._lock:
+            self._writable().append_one(timestamp, temperature, humidity)
+
+    def merge(self, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray):
+        """写入一批早于已有数据的补传样本
+
+        整批按时间排序后写成晚到段；未写满的晚到段超过 LATE_MERGE_FANIN 个时合并。
+        """
+        if not len(timestamps):
+            return
+        order = np.argsort(timestamps, kind='stable')
+        with self._lock:
+            self._write_late(timestamps[order], temperature[order], humidity[order])
+            small = [segment for segment in self.late if segment.count < self.capacity]
+            if len(small) > LATE_MERGE_FANIN:
+                self._compact_late(small)
+
+    def _write_late(self, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray):
+        """把按时间排序的样本写成晚到段，每段最多 capacity 个样本，调用时持有锁"""
+        for offset in range(0, len(timestamps), self.capacity):
+            end = min(offset + self.capacity, len(timestamps))
+            path = os.path.join(self.directory, f'{LATE_PREFIX}{self._late_sequence:016d}{SEGMENT_SUFFIX}')
+            self._late_sequence += 1
+            segment = Segment.create(path, end - offset, 0)
+            segment.append(timestamps[offset:end], temperature[offset:end], humidity[offset:end])
+            segment.unmap()
+            self.late.append(segment)
+
+    def _compact_late(self, segments: List[Segment]):
+        """把若干晚到段合并排序后重新写出，然后删除旧文件，调用时持有锁
+
+        新段先写完再删除旧段；旧段只以复制返回，删除时没有外部视图引用其映射。
+        """
+        parts = [self._segment(segment).view() for segment in segments]
+        timestamps = np.concatenate([part.timestamps for part in parts])
+        order = np.argsort(timestamps, kind='stable')
+        temperature = np.concatenate([part.temperature for part in parts])[order]
+        humidity = np.concatenate([part.humidity for part in parts])[order]
+        timestamps = timestamps[order]
+        del parts
+        self._write_late(timestamps, temperature, humidity)
+        for segment in segments:
+            self._cache.discard(segment)
+            segment.unmap()
+            self.late.remove(segment)
+            try:
+                os.remove(segment.path)
+            except OSError:
+                # 删除失败时保留文件，下次加载会与合并后的段重复，查询结果仍然有序
+                pass
+
+    def _writable(self) -> Segment:
+        """返回写入段，当前段已满时新建下一个段"""
+        if self.segments and not self.segments[-1].full:
+            return self.segments[-1]
+        if self.segments:
+            # 写满的段交给映射缓存管理
+            sealed = self.segments[-1]
+            sealed.flush()
+            sealed.unmap()
+        # 文件名为第一个样本的序号，按名称排序即为写入顺序
+        first_index = self.total
+        path = os.path.join(self.directory, f'{first_index:016d}{SEGMENT_SUFFIX}')
+        segment = Segment.create(path, self.capacity, first_index)
+        self.segments.append(segment)
+        return segment
+
+    def drop_before(self, timestamp: float) -> int:
+        """删除全部样本都早于 timestamp 的已写满段
+
+        已返回的视图仍然有效；文件暂时无法删除时（例如仍被映射）留到下次再删。
+
+        Returns:
+            删除的样本数
+        """
+        dropped = 0
+        with self._lock:
+            for segment in [segment for segment in self.late if segment.last_timestamp < timestamp]:
+                self._cache.discard(segment)
+                segment.unmap()
+                try:
+                    os.remove(segment.path)
+                except OSError:
+                    continue
+                self.late.remove(segment)
+            while len(self.segments) > 1 and self.segments[0].last_timestamp < timestamp:
+                segment = self.segments[0]
+                self._cache.discard(segment)
+                segment.unmap()
+                try:
+                    os.remove(segment.path)
+                except OSError:
+                    break
+                self.segments.pop(0)
+                dropped += segment.count
+        return dropped
+
+    def _segment(self, segment: Segment) -> Segment:
+        """映射段文件：写入段保持映射，已写满的段经过映射缓存"""
+        if self.segments and segment is self.segments[-1] and not segment.full:
+            segment.map(writable=True)
+        else:
+            self._cache.touch(segment)
+        return segment
+
+    def views(self, start: float = -np.inf, stop: float = np.inf) -> Iterator[SeriesView]:
+        """逐段产生时间戳在 [start, stop) 范围内的样本
+
+        没有晚到样本落入的段以零复制视图产生；有晚到样本落入的段与这些样本合并排序后
+        以复制的视图产生，复制量不超过一个段加上落入其中的晚到样本。段映射和晚到段的
+        复制在调用时完成，之后的写入和合并不影响结果。
+
+        Args:
+            start: 起始时间（秒）
+            stop: 结束时间（秒，不含）
+        """
+        with self._lock:
+            parts = self._range(self.segments, start, stop)
+            late = self._late_range(start, stop)
+        return self._merge_late(parts, late)
+
+    @staticmethod
+    def _merge_late(parts: List[SeriesView], late: List[SeriesView]) -> Iterator[SeriesView]:
+        """把各晚到段的样本按时间插入有序的段视图，与已有样本时间戳相同时排在其后"""
+        if not late:
+            yield from parts
+            return
+        timestamps = np.concatenate([part.timestamps for part in late])
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        temperature = np.concatenate([part.temperature for part in late])[order]
+        humidity = np.concatenate([part.humidity for part in late])[order]
+        del late, order
+        taken = 0
+        for part in parts:
+            # 时间戳不晚于本段最后一个样本的晚到样本插入本段
+            end = int(np.searchsorted(timestamps, part.timestamps[-1], 'right'))
+            if end == taken:
+                yield part
+                continue
+            positions = np.searchsorted(part.timestamps, timestamps[taken:end], 'right')
+            yield SeriesView(np.insert(part.timestamps, positions, timestamps[taken:end]),
+                             np.insert(part.temperature, positions, temperature[taken:end]),
+                             np.insert(part.humidity, positions, humidity[taken:end]),
+                             part.first_index)
+            taken = end
+        if taken < len(timestamps):
+            yield SeriesView(timestamps[taken:], temperature[taken:], humidity[taken:],
+                             parts[-1].first_index + len(parts[-1].timestamps) if parts else 0)
+
+    def late_views(self, start: float = -np.inf, stop: float = np.inf) -> List[SeriesView]:
+        """返回晚到段中时间戳在 [start, stop) 范围内的样本，每个段一个复制的视图"""
+        with self._lock:
+            return self._late_range(start, stop)
+
+    def _late_range(self, start: float, stop: float) -> List[SeriesView]:
+        """在锁内复制晚到段的样本，合并时删除的旧段不会被外部视图引用"""
+        return [SeriesView(part.timestamps.copy(), part.temperature.copy(), part.humidity.copy(),
+                           part.first_index)
+                for part in self._range(self.late, start, stop)]
+
+    def _range(self, segments: List[Segment], start: float, stop: float) -> List[SeriesView]:
+        result = []
+        for segment in segments:
+            if (segment.count == 0 or segment.last_timestamp < start
+                    or segment.first_timestamp >= stop):
+                continue
+            self._segment(segment)
+            lo = 0 if segment.first_timestamp >= start else segment.search(start)
+            hi = segment.count if segment.last_timestamp < stop else segment.search(stop)
+            if hi > lo:
+                result.append(segment.view(lo, hi))
+        return result
+
+    def tail(self, count: int) -> SeriesView:
+        """返回最近 count 个样本，跨段时复制拼接"""
+        with self._lock:
+            parts = []
+            remaining = count
+            for segment in reversed(self.segments):
+                if remaining <= 0:
+                    break
+                length = segment.count
+                if length == 0:
+                    continue
+                take = min(remaining, length)
+                parts.append(self._segment(segment).view(length - take, length))
+                remaining -= take
+        if not parts:
+            return SeriesView(np.empty(0), np.empty(0, np.float32), np.empty(0, np.float32),
+                              self.total)
+        if len(parts) == 1:
+            return parts[0]
+        parts.reverse()
+        return SeriesView(np.concatenate([part.timestamps for part in parts]),
+                          np.concatenate([part.temperature for part in parts]),
+                          np.concatenate([part.humidity for part in parts]),
+                          parts[0].first_index)
+
+    def flush(self):
+        with self._lock:
+            if self.segments:
+                self.segments[-1].flush()
+
+    def close(self):
+        with self._lock:
+            for segment in self.segments + self.late:
+                self._cache.discard(segment)
+                segment.unmap()
+
+class SegmentStore:
+    """所有客户端的持久化样本存储
+
+    每个客户端一个目录，目录名为转义后的客户端ID，其中是按顺序编号的段文件。
+    打开时只读取各段的文件头建立索引，数据在查询时才映射，因此打开数周的历史
+    只需要毫秒级时间。写入在接入线程进行，查询可在任意线程进行。
+    """
+
+    def __init__(self, root: str, segment_capacity: int = DEFAULT_SEGMENT_CAPACITY,
+                 max_mapped: int = DEFAULT_MAX_MAPPED):
+        """打开或创建存储目录
+
+        Args:
+            root: 存储目录
+            segment_capacity: 每个段文件容纳的样本数
+            max_mapped: 同时保持映射的已写满段数
+        """
+        self.root = root
+        self.segment_capacity = segment_capacity
+        self._cache = _MapCache(max_mapped)
+        self._series: Dict[str, SegmentSeries] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        for name in os.listdir(root):
+            directory = os.path.join(root, name)
+            if os.path.isdir(directory):
+                series = SegmentSeries(directory, segment_capacity, self._cache)
+                series.load()
+                self._series[unquote(name)] = series
+
+    def series(self, client_id: str) -> SegmentSeries:
+        """返回客户端的段序列，不存在时创建"""
+        series = self._series.get(client_id)
+        if series is None:
+            with self._lock:
+                series = self._series.get(client_id)
+                if series is None:
+                    directory = os.path.join(self.root, quote(client_id, safe=''))
+                    os.makedirs(directory, exist_ok=True)
+                    series = self._series[client_id] = SegmentSeries(
+                        directory, self.segment_capacity, self._cache)
+        return series
+
+    def get(self, client_id: str) -> Optional[SegmentSeries]:
+        """返回客户端的段序列，不存在时返回 None"""
+        return self._series.get(client_id)
+
+    def append(self, client_id: str, samples: Sequence[Tuple[float, float, float]]):
+        """追加客户端的一批样本
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 元组序列
+        """
+        if not len(samples):
+            return
+        if len(samples) == 1:
+            # 逐个上报是最常见的情况，直接写入标量
+            self.series(client_id).append(*samples[0])
+            return
+        columns = np.asarray(samples, dtype=np.float64)
+        self.series(client_id).extend_arrays(columns[:, 0], columns[:, 1], columns[:, 2])
+
+    def merge(self, client_id: str, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray):
+        """写入客户端一批早于已有数据的补传样本"""
+        self.series(client_id).merge(timestamps, temperature, humidity)
+
+    def client_ids(self) -> List[str]:
+        """返回有数据的客户端ID列表"""
+        return [client_id for client_id, series in list(self._series.items()) if series.total]
+
+    def __len__(self) -> int:
+        return sum(len(series) for series in list(self._series.values()))
+
+    def flush(self):
+        """把所有写入段的修改写回文件"""
+        for series in list(self._series.values()):
+            series.flush()
+
+    def close(self):
+        """写回并释放所有映射"""
+        for series in list(self._series.values()):
+            series.close()
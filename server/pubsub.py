@@ -0,0 +1,239 @@
+import fnmatch
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .engine import IngestEngine, IngestHandler, ClientConnection, DEFAULT_BACKLOG
+from common.protocol import Protocol
+
+# 慢订阅者的处理策略：丢弃最早的消息，或每个客户端只保留最新的一条
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICY_CONFLATE = 'conflate'
+POLICIES = (POLICY_DROP_OLDEST, POLICY_CONFLATE)
+# 每个订阅者默认最多缓存的消息数
+DEFAULT_QUEUE_SIZE = 1024
+# 样本元组中各通道的位置
+CHANNEL_INDEX = {'temperature': 1, 'humidity': 2}
+
+class Subscriber:
+    """一个订阅连接
+
+    待发送的消息保存在有界队列中，由发布线程写入、订阅服务的事件循环取出。
+    队列满时按策略丢弃：drop_oldest 丢弃最早的消息；conflate 每个客户端只保留
+    最新的一条，队列中客户端数超过上限时丢弃最久未更新的客户端。
+    """
+
+    def __init__(self, connection: ClientConnection, pattern: str, channels: Sequence[str],
+                 policy: str = POLICY_DROP_OLDEST, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """初始化订阅
+
+        Args:
+            connection: 订阅者连接
+            pattern: 客户端ID通配符
+            channels: 订阅的通道
+            policy: 队列满时的处理策略
+            queue_size: 队列长度
+        """
+        self.connection = connection
+        self.pattern = pattern
+        self.channels = tuple(channels)
+        self.policy = policy
+        self.queue_size = queue_size
+        self.delivered = 0  # 已写出的消息数
+        self.dropped = 0  # 被丢弃或合并的消息数
+        self._queue = deque() if policy == POLICY_DROP_OLDEST else OrderedDict()
+        self._lock = threading.Lock()
+
+    def matches(self, client_id: str) -> bool:
+        return fnmatch.fnmatchcase(client_id, self.pattern)
+
+    def offer(self, client_id: str, frame: bytes):
+        """放入一条消息，不会阻塞"""
+        with self._lock:
+            queue = self._queue
+            if self.policy == POLICY_DROP_OLDEST:
+                if len(queue) >= self.queue_size:
+                    queue.popleft()
+                    self.dropped += 1
+                queue.append(frame)
+            else:
+                if client_id in queue:
+                    # 同一客户端的旧消息被最新的消息替换
+                    del queue[client_id]
+                    self.dropped += 1
+                elif len(queue) >= self.queue_size:
+                    queue.popitem(last=False)
+                    self.dropped += 1
+                queue[client_id] = frame
+
+    def drain(self) -> List[bytes]:
+        """取出全部待发送的消息"""
+        with self._lock:
+            queue = self._queue
+            frames = list(queue) if self.policy == POLICY_DROP_OLDEST else list(queue.values())
+            queue.clear()
+        self.delivered += len(frames)
+        return frames
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+class PubSubHub(IngestHandler):
+    """实时数据的订阅分发
+
+    下游消费者用与传感器相同的帧协议连接订阅端口，发送
+    {"type": "subscribe", "clients": "sensor-*", "channels": ["temperature"],
+     "policy": "conflate", "queue_size": 100}
+    订阅后收到 {"type": "samples", "client_id": ..., "channels": [...], "samples": [[时间戳, 值...], ...]}。
+
+    publish() 在接入线程中调用：每批样本对每种通道组合只序列化一次，然后放入各
+    匹配订阅者的有界队列，不做任何网络写入，因此慢订阅者不会阻塞接入。订阅连接由
+    独立的事件循环线程处理，每轮把订阅者队列中的消息合并写出；发送缓冲区超过
+    高水位时暂停写出，消息在队列中按订阅者的策略丢弃或合并。
+    """
+
+    def __init__(self, backlog: int = DEFAULT_BACKLOG):
+        """初始化订阅服务
+
+        Args:
+            backlog: 监听队列长度
+        """
+        self.backlog = backlog
+        self.engine: Optional[IngestEngine] = None
+        self.subscribers: List[Subscriber] = []
+        # client_id -> 匹配的订阅者，订阅变化时整体替换
+        self._routes: Dict[str, List[Subscriber]] = {}
+        self._pending: set = set()  # 有待发送消息的订阅者
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+
+    def start(self, host: str, port: int):
+        """开始监听订阅连接
+
+        Raises:
+            OSError: 端口绑定失败
+        """
+        self.engine = IngestEngine(self, self.backlog)
+        self.engine.start(host, port)
+
+    def stop(self):
+        """关闭所有订阅连接并停止监听"""
+        if self.engine:
+            self.engine.stop()
+            self.engine = None
+        self.subscribers = []
+        self._routes = {}
+
+    def address(self) -> Tuple[str, int]:
+        """返回实际监听的地址"""
+        return self.engine.address()
+
+    def publish(self, client_id: str, samples: Sequence[Tuple[float, float, float]]):
+        """把一批样本分发给匹配的订阅者，可在任意线程调用
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 元组序列
+        """
+        subscribers = self._routes.get(client_id)
+        if subscribers is None:
+            subscribers = self._match(client_id)
+        if not subscribers:
+            return
+        frames: Dict[Tuple[str, ...], bytes] = {}
+        for subscriber in subscribers:
+            frame = frames.get(subscriber.channels)
+            if frame is None:
+                frame = frames[subscriber.channels] = self._encode(client_id, subscriber.channels, samples)
+            subscriber.offer(client_id, frame)
+        with self._lock:
+            self._pending.update(subscribers)
+            if self._flush_scheduled or not self.engine:
+                return
+            self._flush_scheduled = True
+        self.engine.call_in_loop(self._flush)
+
+    @staticmethod
+    def _encode(client_id: str, channels: Tuple[str, ...], samples) -> bytes:
+        indexes = [CHANNEL_INDEX[channel] for channel in channels]
+        rows = [[sample[0]] + [sample[i] for i in indexes] for sample in samples]
+        return Protocol.pack_message({'type': 'samples', 'client_id': client_id,
+                                      'channels': list(channels), 'samples': rows})
+
+    def _match(self, client_id: str) -> List[Subscriber]:
+        """计算并缓存客户端匹配的订阅者"""
+        routes = self._routes
+        subscribers = [subscriber for subscriber in self.subscribers if subscriber.matches(client_id)]
+        routes[client_id] = subscribers
+        return subscribers
+
+    def _flush(self):
+        """在事件循环线程中写出所有订阅者的待发送消息"""
+        with self._lock:
+            pending = self._pending
+            self._pending = set()
+            self._flush_scheduled = False
+        for subscriber in pending:
+            self._write(subscriber)
+
+    def _write(self, subscriber: Subscriber):
+        connection = subscriber.connection
+        if connection.paused or connection.transport.is_closing():
+            # 暂停期间消息留在队列中，恢复写入时再发送
+            return
+        frames = subscriber.drain()
+        if frames:
+            connection.transport.write(b''.join(frames))
+
+    # IngestHandler 回调，均在事件循环线程中执行
+
+    def connection_made(self, connection: ClientConnection) -> ClientConnection:
+        return connection
+
+    def message_received(self, connection: ClientConnection, message: dict) -> bool:
+        msg_type = message.get('type')
+        if msg_type == 'subscribe':
+            pattern = message.get('clients', '*')
+            channels = message.get('channels') or list(CHANNEL_INDEX)
+            policy = message.get('policy', POLICY_DROP_OLDEST)
+            queue_size = message.get('queue_size', DEFAULT_QUEUE_SIZE)
+            error = None
+            if not isinstance(pattern, str):
+                error = f'客户端通配符应为字符串：{pattern}'
+            elif not isinstance(channels, list) or not all(
+                    isinstance(channel, str) and channel in CHANNEL_INDEX for channel in channels):
+                error = f'未知的通道：{channels}'
+            elif policy not in POLICIES:
+                error = f'未知的策略：{policy}'
+            elif not isinstance(queue_size, int) or queue_size <= 0:
+                error = f'队列长度无效：{queue_size}'
+            if error:
+                connection.transport.write(Protocol.pack_message(
+                    {'type': 'subscribe_response', 'success': False, 'message': error}))
+                return True
+            self._unsubscribe(connection)
+            subscriber = Subscriber(connection, pattern, channels, policy, queue_size)
+            self._set_subscribers(self.subscribers + [subscriber])
+            connection.transport.write(Protocol.pack_message(
+                {'type': 'subscribe_response', 'success': True, 'message': '订阅成功'}))
+        elif msg_type == 'unsubscribe':
+            self._unsubscribe(connection)
+        return True
+
+    def connection_resumed(self, connection: ClientConnection):
+        for subscriber in self.subscribers:
+            if subscriber.connection is connection:
+                self._write(subscriber)
+
+    def connection_lost(self, connection: ClientConnection):
+        self._unsubscribe(connection)
+
+    def _unsubscribe(self, connection: ClientConnection):
+        remaining = [subscriber for subscriber in self.subscribers if subscriber.connection is not connection]
+        if len(remaining) != len(self.subscribers):
+            self._set_subscribers(remaining)
+
+    def _set_subscribers(self, subscribers: List[Subscriber]):
+        # 整体替换列表和路由缓存，发布线程读到的总是一致的快照
+        self.subscribers = subscribers
+        self._routes = {}
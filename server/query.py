@@ -0,0 +1,295 @@
+import json
+import math
+import time
+import logging
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .store import SampleStore, SeriesView
+from .persist import SegmentStore
+from .retention import RetentionManager
+from .metrics import MetricsRegistry
+
+# 每个响应分块包含的最大行数
+CHUNK_ROWS = 2000
+# 每个路径保留的最近请求耗时数，用于计算分位数
+LATENCY_SAMPLES = 10000
+CHANNELS = ('temperature', 'humidity')
+NDJSON_CONTENT_TYPE = 'application/x-ndjson; charset=utf-8'
+
+logger = logging.getLogger('server.query')
+
+# 路由处理函数：接收查询参数，返回响应分块的迭代器
+RouteHandler = Callable[[Dict[str, List[str]]], Iterable[bytes]]
+
+class QueryError(ValueError):
+    """查询参数错误"""
+
+class RangeQuery(NamedTuple):
+    """历史范围查询"""
+    client_ids: List[str]
+    start: float
+    stop: float
+    channels: Tuple[str, ...]
+    resolution: Optional[float]  # None 表示原始样本
+    limit: Optional[int]  # 最多返回的行数
+
+class QueryService:
+    """历史数据查询
+
+    每个客户端的样本按时间戳升序保存，范围定位通过二分查找完成，代价为 O(log n)。
+    结果按客户端依次输出为 NDJSON（每行一个 JSON 对象），每次只格式化一个分块，
+    不会在内存中物化整个结果。开启持久化时从段文件读取原始样本，否则从内存读取。
+    """
+
+    def __init__(self, store: SampleStore, retention: RetentionManager,
+                 persist: Optional[SegmentStore] = None):
+        """初始化查询服务
+
+        Args:
+            store: 内存样本存储
+            retention: 分层汇总
+            persist: 持久化存储，None 表示只查询内存
+        """
+        self.store = store
+        self.retention = retention
+        self.persist = persist
+
+    def parse(self, params: Dict[str, List[str]]) -> RangeQuery:
+        """解析查询参数
+
+        参数：clients（逗号分隔，默认全部）、start/end（秒，默认不限）、
+        channels（逗号分隔，默认全部通道）、resolution（秒，可选）、limit（可选）
+
+        Raises:
+            QueryError: 参数错误
+        """
+        def single(name: str) -> Optional[str]:
+            values = params.get(name)
+            return values[-1] if values else None
+
+        def number(name: str, default: float, finite: bool = False) -> float:
+            value = single(name)
+            if value is None:
+                return default
+            try:
+                result = float(value)
+            except ValueError:
+                raise QueryError(f'参数 {name} 不是数字：{value}')
+            # start/end 可以为正负无穷，其余参数必须是有限数
+            if math.isnan(result) or finite and not math.isfinite(result):
+                raise QueryError(f'参数 {name} 不是有限数：{value}')
+            return result
+
+        clients = single('clients')
+        if clients:
+            client_ids = [client_id for client_id in clients.split(',') if client_id]
+        else:
+            client_ids = sorted(set(self.store.client_ids())
+                                | set(self.persist.client_ids() if self.persist else ()))
+        channels = tuple(single('channels').split(',')) if single('channels') else CHANNELS
+        unknown = [channel for channel in channels if channel not in CHANNELS]
+        if unknown:
+            raise QueryError(f'未知的通道：{",".join(unknown)}')
+        resolution = number('resolution', 0, finite=True) or None
+        limit = number('limit', 0, finite=True)
+        if limit < 0 or resolution is not None and resolution < 0:
+            raise QueryError('resolution 和 limit 不能为负数')
+        return RangeQuery(client_ids, number('start', -math.inf), number('end', math.inf),
+                          channels, resolution, int(limit) or None)
+
+    def tier_for(self, resolution: Optional[float]) -> Optional[float]:
+        """返回不超过所需分辨率的最粗汇总层级，没有时返回 None（使用原始样本）"""
+        if resolution is None:
+            return None
+        candidates = [tier for tier in self.retention.resolutions if tier <= resolution]
+        return max(candidates) if candidates else None
+
+    def run(self, query: RangeQuery) -> Iterator[bytes]:
+        """执行查询，逐块产生 NDJSON 数据"""
+        remaining = query.limit if query.limit is not None else math.inf
+        tier = self.tier_for(query.resolution)
+        for client_id in query.client_ids:
+            prefix = '{"client_id":%s,"timestamp":' % json.dumps(client_id, ensure_ascii=False)
+            if tier is None:
+                parts = self._raw_views(client_id, query.start, query.stop)
+            else:
+                rollup = self.retention.tier(client_id, tier)
+                parts = [rollup.records(query.start, query.stop)] if rollup is not None else []
+            for part in parts:
+                for offset in range(0, len(part), CHUNK_ROWS):
+                    if remaining <= 0:
+                        return
+                    count = int(min(CHUNK_ROWS, len(part) - offset, remaining))
+                    chunk = part[offset:offset + count] if tier is not None else \
+                        SeriesView(*(column[offset:offset + count] for column in part[:3]), 0)
+                    if tier is None:
+                        yield self._format_raw(prefix, chunk, query.channels)
+                    else:
+                        yield self._format_rollup(prefix, chunk, query.channels)
+                    remaining -= count
+
+    def _raw_views(self, client_id: str, start: float, stop: float) -> Iterable[SeriesView]:
+        """返回客户端在时间范围内的原始样本，持久化存储按段逐个产生"""
+        if self.persist is not None:
+            segments = self.persist.get(client_id)
+            if segments is not None:
+                return segments.views(start, stop)
+        series = self.store.get(client_id)
+        if series is None:
+            return []
+        return [series.view_by_time(start, stop)]
+
+    @staticmethod
+    def _format_raw(prefix: str, view: SeriesView, channels: Tuple[str, ...]) -> bytes:
+        template = prefix + '%.3f' + ''.join(',"%s":%%.2f' % channel for channel in channels) + '}\n'
+        columns = [view.timestamps.tolist()] + [getattr(view, channel).tolist() for channel in channels]
+        return ''.join(template % row for row in zip(*columns)).encode('utf-8')
+
+    @staticmethod
+    def _format_rollup(prefix: str, records: np.ndarray, channels: Tuple[str, ...]) -> bytes:
+        template = prefix + '%.3f,"count":%d' + ''.join(
+            ',"%s":{"min":%%.2f,"max":%%.2f,"mean":%%.2f}' % channel for channel in channels) + '}\n'
+        columns = [records['start'].tolist(), records['count'].tolist()]
+        for channel in channels:
+            columns += [records[f'{channel}_{field}'].tolist() for field in ('min', 'max', 'mean')]
+        return ''.join(template % row for row in zip(*columns)).encode('utf-8')
+
+    def clients(self) -> Iterator[bytes]:
+        """逐行产生客户端ID及内存中的样本数和时间范围"""
+        for client_id in sorted(self.store.client_ids()):
+            view = self.store.get(client_id).view()
+            first, last = (float(view.timestamps[0]), float(view.timestamps[-1])) if len(view) else (None, None)
+            yield (json.dumps({'client_id': client_id, 'samples': len(view), 'first': first, 'last': last},
+                              ensure_ascii=False) + '\n').encode('utf-8')
+
+class QueryServer:
+    """HTTP 查询服务
+
+    使用标准库的多线程 HTTP 服务器，在独立线程中运行，不占用接入事件循环。
+    响应使用分块传输编码逐块发送。内置路由：
+    GET /query?clients=a,b&start=..&end=..&channels=temperature&resolution=60&limit=1000
+    GET /clients
+    """
+
+    def __init__(self, service: QueryService, metrics: Optional[MetricsRegistry] = None):
+        """初始化查询服务
+
+        Args:
+            service: 查询服务
+            metrics: 指标注册表，不为 None 时按路径记录请求耗时直方图
+        """
+        self.service = service
+        self.metrics = metrics
+        self.routes: Dict[str, RouteHandler] = {
+            '/query': lambda params: self.service.run(self.service.parse(params)),
+            '/clients': lambda params: self.service.clients(),
+        }
+        self.content_types: Dict[str, str] = {}
+        self.latencies: Dict[str, deque] = {}
+        self.httpd: Optional[ThreadingHTTPServer] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def add_route(self, path: str, handler: RouteHandler, content_type: str = NDJSON_CONTENT_TYPE):
+        """注册路由，处理函数在请求线程中执行"""
+        self.routes[path] = handler
+        self.content_types[path] = content_type
+
+    def start(self, host: str, port: int):
+        """开始监听
+
+        Raises:
+            OSError: 端口绑定失败
+        """
+        self.httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.query_server = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='query-server', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止监听"""
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.thread.join()
+            self.httpd = None
+            self.thread = None
+
+    def address(self) -> Tuple[str, int]:
+        """返回实际监听的地址"""
+        return self.httpd.server_address[:2]
+
+    def record(self, path: str, seconds: float):
+        """记录一次请求的耗时"""
+        samples = self.latencies.get(path)
+        if samples is None:
+            samples = self.latencies.setdefault(path, deque(maxlen=LATENCY_SAMPLES))
+        samples.append(seconds)
+        if self.metrics is not None:
+            self.metrics.histogram('http_request_seconds', 'HTTP 请求耗时（秒）',
+                                   {'path': path}).observe(seconds)
+
+    def latency(self, path: str = '/query') -> Dict[str, float]:
+        """返回路径最近请求耗时的统计（毫秒）"""
+        samples = np.array(self.latencies.get(path, ()))
+        if not len(samples):
+            return {'count': 0}
+        p50, p99 = np.percentile(samples, [50, 99]) * 1000
+        return {'count': len(samples), 'p50': float(p50), 'p99': float(p99),
+                'max': float(samples.max() * 1000)}
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        started = time.perf_counter()
+        server: QueryServer = self.server.query_server
+        url = urlsplit(self.path)
+        handler = server.routes.get(url.path)
+        if handler is None:
+            self._send_error(404, f'未知的路径：{url.path}')
+            return
+        try:
+            chunks = iter(handler(parse_qs(url.query)))
+        except QueryError as e:
+            self._send_error(400, str(e))
+            return
+        except Exception as e:
+            logger.exception('处理请求 %s 失败', self.path)
+            self._send_error(500, f'服务器内部错误：{e}')
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', server.content_types.get(url.path, NDJSON_CONTENT_TYPE))
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            return
+        except Exception:
+            # 响应头已发出，无法再返回错误状态，不写结束分块并关闭连接，客户端可据此判断响应不完整
+            logger.exception('处理请求 %s 失败', self.path)
+            self.close_connection = True
+            return
+        server.record(url.path, time.perf_counter() - started)
+
+    def _send_error(self, status: int, message: str):
+        body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug('%s %s', self.address_string(), format % args)
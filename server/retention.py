@@ -0,0 +1,461 @@
+import math
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from .store import SampleStore
+from .persist import SegmentStore
+
+# 原始样本默认保留7天（内存中另受 history_capacity 限制）
+DEFAULT_RAW_RETENTION = 7 * 86400
+# 汇总层级：(分辨率, 保留时长)，单位秒，由细到粗排列
+DEFAULT_TIERS = ((60, 30 * 86400), (3600, 365 * 86400))
+# 每个客户端检查过期数据的最短间隔（秒，按样本时间）
+EVICT_INTERVAL = 60
+
+# 汇总记录：每个时间桶一条，first_index 为桶内第一个样本的序号
+ROLLUP_DTYPE = np.dtype([
+    ('start', '<f8'),
+    ('first_index', '<i8'),
+    ('count', '<i4'),
+    ('temperature_min', '<f4'),
+    ('temperature_max', '<f4'),
+    ('temperature_mean', '<f4'),
+    ('humidity_min', '<f4'),
+    ('humidity_max', '<f4'),
+    ('humidity_mean', '<f4'),
+])
+
+class RollupSeries:
+    """单个客户端一个分辨率的汇总序列
+
+    样本到达时累加到当前时间桶，进入下一个桶时把当前桶写成一条记录，因此汇总
+    随数据增量建立，不需要回扫原始样本。记录保存在预分配的结构化数组中，超过
+    保留时长或容量的记录从头部丢弃，写满时整体搬移一次。
+    晚到的样本计入当前桶；补传的样本通过 merge_array 计入各自的时间桶。
+    """
+
+    def __init__(self, resolution: float, retention: float):
+        """初始化汇总序列
+
+        Args:
+            resolution: 时间桶宽度（秒）
+            retention: 保留时长（秒）
+        """
+        self.resolution = resolution
+        self.retention = retention
+        self.capacity = int(math.ceil(retention / resolution)) + 1
+        self._records = np.zeros(self.capacity + max(16, self.capacity // 4), dtype=ROLLUP_DTYPE)
+        self._start = 0
+        self._end = 0
+        # 当前桶：编号、第一个样本序号、样本数、温度最小/最大/和、湿度最小/最大/和
+        self._bucket = None
+        self._open = [0, 0, math.inf, -math.inf, 0.0, math.inf, -math.inf, 0.0]
+        self.last_timestamp = -math.inf  # 已汇总的最新样本时间
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._end - self._start + (self._bucket is not None)
+
+    @property
+    def nbytes(self) -> int:
+        return self._records.nbytes
+
+    def add(self, timestamp: float, temperature: float, humidity: float, index: int):
+        """加入一个样本
+
+        Args:
+            timestamp: 时间戳（秒）
+            temperature: 温度
+            humidity: 湿度
+            index: 样本序号
+        """
+        bucket = int(timestamp // self.resolution)
+        with self._lock:
+            if self._bucket is None or bucket > self._bucket:
+                self._seal()
+                self._bucket = bucket
+                self._open[:] = [index, 0, math.inf, -math.inf, 0.0, math.inf, -math.inf, 0.0]
+            state = self._open
+            state[1] += 1
+            state[2] = min(state[2], temperature)
+            state[3] = max(state[3], temperature)
+            state[4] += temperature
+            state[5] = min(state[5], humidity)
+            state[6] = max(state[6], humidity)
+            state[7] += humidity
+            self.last_timestamp = max(self.last_timestamp, timestamp)
+
+    def add_array(self, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray,
+                  first_index: int):
+        """加入一批样本，按桶分组后向量汇总"""
+        if not len(timestamps):
+            return
+        buckets = (timestamps // self.resolution).astype(np.int64)
+        with self._lock:
+            if self._bucket is not None:
+                buckets = np.maximum(buckets, self._bucket)
+            # 晚到的样本计入当前桶，保证桶编号单调
+            buckets = np.maximum.accumulate(buckets)
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+            counts = np.diff(np.append(starts, len(buckets)))
+            groups = [
+                counts,
+                np.minimum.reduceat(temperature, starts), np.maximum.reduceat(temperature, starts),
+                np.add.reduceat(temperature, starts, dtype=np.float64),
+                np.minimum.reduceat(humidity, starts), np.maximum.reduceat(humidity, starts),
+                np.add.reduceat(humidity, starts, dtype=np.float64),
+            ]
+            for group, bucket in enumerate(buckets[starts].tolist()):
+                values = [float(column[group]) for column in groups]
+                if self._bucket is None or bucket > self._bucket:
+                    self._seal()
+                    self._bucket = bucket
+                    self._open[:] = [first_index + int(starts[group]), int(values[0]),
+                                     *values[1:]]
+                else:
+                    state = self._open
+                    state[1] += int(values[0])
+                    state[2] = min(state[2], values[1])
+                    state[3] = max(state[3], values[2])
+                    state[4] += values[3]
+                    state[5] = min(state[5], values[4])
+                    state[6] = max(state[6], values[5])
+                    state[7] += values[6]
+            self.last_timestamp = max(self.last_timestamp, float(timestamps.max()))
+
+    def merge_array(self, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray):
+        """把早于当前桶的补传样本计入各自的时间桶
+
+        已有的桶原地合并，没有的桶按时间插入新记录；补传样本插入原始样本后序号后移，
+        之后各桶的第一个样本序号随之调整，与样本存储保持一致。
+        """
+        if not len(timestamps):
+            return
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, temperature, humidity = timestamps[order], temperature[order], humidity[order]
+        buckets = (timestamps // self.resolution).astype(np.int64)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.append(starts[1:], len(buckets))
+        if self._bucket is None:
+            # 还没有任何数据，按正常顺序汇总
+            self.add_array(timestamps, temperature, humidity, 0)
+            return
+        with self._lock:
+            sealed = self._records[self._start:self._end]
+            # 每条记录之前的补传样本数即其序号的偏移
+            shifts = np.searchsorted(timestamps, sealed['start'])
+            open_shift = int(np.searchsorted(timestamps, self._bucket * self.resolution))
+            new_records = []
+            for lo, hi, bucket in zip(starts.tolist(), ends.tolist(), buckets[starts].tolist()):
+                t, h = temperature[lo:hi], humidity[lo:hi]
+                values = (hi - lo, float(t.min()), float(t.max()), float(t.sum(dtype=np.float64)),
+                          float(h.min()), float(h.max()), float(h.sum(dtype=np.float64)))
+                if bucket >= self._bucket:
+                    state = self._open
+                    state[1] += values[0]
+                    state[2] = min(state[2], values[1])
+                    state[3] = max(state[3], values[2])
+                    state[4] += values[3]
+                    state[5] = min(state[5], values[4])
+                    state[6] = max(state[6], values[5])
+                    state[7] += values[6]
+                    continue
+                start = bucket * self.resolution
+                position = int(np.searchsorted(sealed['start'], start))
+                if position < len(sealed) and sealed['start'][position] == start:
+                    _merge_record(sealed[position], values)
+                    continue
+                # 新桶的样本排在下一条记录的样本之前
+                following = int(sealed['first_index'][position]) if position < len(sealed) else self._open[0]
+                record = np.zeros(1, dtype=ROLLUP_DTYPE)[0]
+                record['start'] = start
+                record['first_index'] = following + lo
+                record['count'] = 0
+                _merge_record(record, values)
+                new_records.append((position, record))
+            sealed['first_index'] += shifts
+            self._open[0] += open_shift
+            if new_records:
+                positions = [position for position, _ in new_records]
+                merged = np.insert(sealed, positions, np.array([record for _, record in new_records],
+                                                               dtype=ROLLUP_DTYPE))
+                merged = merged[-(self.capacity - 1):]
+                records = np.zeros(max(len(self._records), len(merged) + 16), dtype=ROLLUP_DTYPE)
+                records[:len(merged)] = merged
+                self._records = records
+                self._start, self._end = 0, len(merged)
+
+    def _seal(self):
+        """把当前桶写成一条记录"""
+        if self._bucket is None:
+            return
+        if self._end == len(self._records):
+            keep = min(self._end - self._start, self.capacity - 1)
+            records = np.zeros_like(self._records)
+            records[:keep] = self._records[self._end - keep:self._end]
+            self._records = records
+            self._start, self._end = 0, keep
+        self._records[self._end] = self._open_record()
+        self._end += 1
+        self._start = max(self._start, self._end - self.capacity)
+        self._bucket = None
+
+    def _open_record(self) -> tuple:
+        first_index, count, t_min, t_max, t_sum, h_min, h_max, h_sum = self._open
+        return (self._bucket * self.resolution, first_index, count,
+                t_min, t_max, t_sum / count, h_min, h_max, h_sum / count)
+
+    def evict_before(self, timestamp: float) -> int:
+        """丢弃起始时间早于 timestamp 的记录
+
+        Returns:
+            丢弃的记录数
+        """
+        with self._lock:
+            evicted = int(np.searchsorted(self._records['start'][self._start:self._end], timestamp))
+            self._start += evicted
+            return evicted
+
+    def records(self, start: float = -math.inf, stop: float = math.inf) -> np.ndarray:
+        """返回起始时间在 [start, stop) 范围内的记录（含当前桶）"""
+        with self._lock:
+            starts = self._records['start'][self._start:self._end]
+            lo = self._start + int(np.searchsorted(starts, start))
+            hi = self._start + int(np.searchsorted(starts, stop))
+            return self._with_open(lo, hi, self._bucket is not None
+                                   and start <= self._bucket * self.resolution < stop)
+
+    def records_by_index(self, first: int, last: int) -> np.ndarray:
+        """返回包含序号 [first, last) 范围内样本的记录（含当前桶）"""
+        with self._lock:
+            first_indexes = self._records['first_index'][self._start:self._end]
+            lo = self._start + max(0, int(np.searchsorted(first_indexes, first, 'right')) - 1)
+            hi = self._start + int(np.searchsorted(first_indexes, last))
+            return self._with_open(lo, hi, self._bucket is not None and self._open[0] < last)
+
+    def count_by_index(self, first: int, last: int) -> int:
+        """返回序号 [first, last) 范围内的记录数"""
+        with self._lock:
+            first_indexes = self._records['first_index'][self._start:self._end]
+            count = int(np.searchsorted(first_indexes, last)) - int(np.searchsorted(first_indexes, first))
+            return count + (self._bucket is not None and first <= self._open[0] < last)
+
+    def _with_open(self, lo: int, hi: int, include_open: bool) -> np.ndarray:
+        sealed = self._records[lo:hi]
+        if not include_open:
+            return sealed.copy()
+        return np.concatenate((sealed, np.array([self._open_record()], dtype=ROLLUP_DTYPE)))
+
+    def snapshot(self) -> np.ndarray:
+        """返回全部记录（含当前桶），用于保存"""
+        with self._lock:
+            return self._with_open(self._start, self._end, self._bucket is not None)
+
+    def restore(self, records: np.ndarray):
+        """从保存的记录恢复，最后一条作为当前桶继续累加"""
+        with self._lock:
+            records = records[-self.capacity:]
+            if not len(records):
+                return
+            sealed, last = records[:-1], records[-1]
+            self._records[:len(sealed)] = sealed
+            self._start, self._end = 0, len(sealed)
+            count = int(last['count'])
+            self._bucket = int(last['start'] // self.resolution)
+            self._open[:] = [int(last['first_index']), count,
+                             float(last['temperature_min']), float(last['temperature_max']),
+                             float(last['temperature_mean']) * count,
+                             float(last['humidity_min']), float(last['humidity_max']),
+                             float(last['humidity_mean']) * count]
+
+def _merge_record(record: np.void, values: tuple):
+    """把一组样本的 (样本数, 温度最小/最大/和, 湿度最小/最大/和) 合并进一条汇总记录"""
+    count = int(record['count'])
+    total = count + values[0]
+    record['temperature_min'] = min(float(record['temperature_min']), values[1]) if count else values[1]
+    record['temperature_max'] = max(float(record['temperature_max']), values[2]) if count else values[2]
+    record['temperature_mean'] = (float(record['temperature_mean']) * count + values[3]) / total
+    record['humidity_min'] = min(float(record['humidity_min']), values[4]) if count else values[4]
+    record['humidity_max'] = max(float(record['humidity_max']), values[5]) if count else values[5]
+    record['humidity_mean'] = (float(record['humidity_mean']) * count + values[6]) / total
+    record['count'] = total
+
+def rollup_points(records: np.ndarray, column: str, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """把汇总记录转换为绘图用的最小/最大值折线
+
+    每条记录在其第一个和最后一个样本序号处各画一个点（最小值、最大值）；记录数
+    超过 width 时先按像素合并相邻记录。
+
+    Args:
+        records: 汇总记录
+        column: 通道名（temperature 或 humidity）
+        width: 像素宽度
+
+    Returns:
+        (x, y)，x 为样本序号
+    """
+    first = records['first_index']
+    last = first + records['count'] - 1
+    low = records[f'{column}_min']
+    high = records[f'{column}_max']
+    if len(records) > width > 0:
+        step = -(-len(records) // width)
+        starts = np.arange(0, len(records), step)
+        first = first[starts]
+        last = np.maximum.reduceat(last, starts)
+        low = np.minimum.reduceat(low, starts)
+        high = np.maximum.reduceat(high, starts)
+    x = np.empty(2 * len(first))
+    y = np.empty(2 * len(first))
+    x[0::2], x[1::2] = first, last
+    y[0::2], y[1::2] = low, high
+    return x, y
+
+class RetentionManager:
+    """原始样本保留和分层汇总
+
+    数据到达时增量更新每个汇总层级，并按样本时间定期丢弃超过保留时长的原始
+    样本（内存和段文件）和汇总记录，内存占用与运行时间无关。查询时选择满足
+    范围和分辨率的最粗层级，缩小查看数月的数据也只需读取少量记录。
+    """
+
+    def __init__(self, store: SampleStore, raw_retention: float = DEFAULT_RAW_RETENTION,
+                 tiers: Sequence[Tuple[float, float]] = DEFAULT_TIERS,
+                 persist: Optional[SegmentStore] = None):
+        """初始化保留策略
+
+        Args:
+            store: 内存样本存储
+            raw_retention: 原始样本保留时长（秒）
+            tiers: 汇总层级 (分辨率, 保留时长)，单位秒
+            persist: 持久化存储，None 表示不持久化
+        """
+        self.store = store
+        self.raw_retention = raw_retention
+        self.tiers = tuple(sorted((float(r), float(k)) for r, k in tiers))
+        self.persist = persist
+        self._rollups: Dict[str, List[RollupSeries]] = {}
+        self._next_evict: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def resolutions(self) -> Tuple[float, ...]:
+        return tuple(resolution for resolution, _ in self.tiers)
+
+    def rollups(self, client_id: str) -> List[RollupSeries]:
+        """返回客户端各层级的汇总序列（由细到粗），不存在时创建"""
+        rollups = self._rollups.get(client_id)
+        if rollups is None:
+            with self._lock:
+                rollups = self._rollups.setdefault(
+                    client_id, [RollupSeries(resolution, retention) for resolution, retention in self.tiers])
+        return rollups
+
+    def tier(self, client_id: str, resolution: float) -> Optional[RollupSeries]:
+        """返回客户端指定分辨率的汇总序列，没有数据时返回 None"""
+        rollups = self._rollups.get(client_id)
+        if rollups is None or resolution not in self.resolutions:
+            return None
+        return rollups[self.resolutions.index(resolution)]
+
+    def update(self, client_id: str, samples: Sequence[Tuple[float, float, float]], first_index: int):
+        """汇总客户端的一批样本，到期时丢弃过期数据
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 元组序列
+            first_index: 第一个样本的序号
+        """
+        if not len(samples):
+            return
+        rollups = self.rollups(client_id)
+        if len(samples) == 1:
+            timestamp, temperature, humidity = samples[0]
+            for rollup in rollups:
+                rollup.add(timestamp, temperature, humidity, first_index)
+            latest = timestamp
+        else:
+            columns = np.asarray(samples, dtype=np.float64)
+            for rollup in rollups:
+                rollup.add_array(columns[:, 0], columns[:, 1], columns[:, 2], first_index)
+            latest = float(columns[:, 0].max())
+        if latest >= self._next_evict.get(client_id, -math.inf):
+            self._next_evict[client_id] = latest + EVICT_INTERVAL
+            self.evict(client_id, latest)
+
+    def merge(self, client_id: str, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray):
+        """把补传的样本计入各层级的时间桶，已超过该层级保留时长的样本被忽略"""
+        for rollup in self.rollups(client_id):
+            keep = timestamps >= rollup.last_timestamp - rollup.retention
+            rollup.merge_array(timestamps[keep], temperature[keep], humidity[keep])
+
+    def evict(self, client_id: str, now: float):
+        """丢弃客户端超过保留时长的原始样本和汇总记录
+
+        Args:
+            client_id: 客户端ID
+            now: 当前时间（按样本时间，秒）
+        """
+        series = self.store.get(client_id)
+        if series is not None:
+            series.evict_before(now - self.raw_retention)
+        if self.persist is not None:
+            segments = self.persist.get(client_id)
+            if segments is not None:
+                segments.drop_before(now - self.raw_retention)
+        for rollup in self._rollups.get(client_id, ()):
+            rollup.evict_before(now - rollup.retention)
+
+    def select(self, client_id: str, first: int, last: int, width: int) -> Optional[RollupSeries]:
+        """选择绘制序号 [first, last) 范围时使用的层级
+
+        优先选择范围内记录数不少于像素宽度的最粗层级；没有这样的层级时，范围内
+        的原始样本仍在内存中则使用原始样本，否则使用最细的汇总层级。
+
+        Returns:
+            汇总序列，使用原始样本时返回 None
+        """
+        rollups = self._rollups.get(client_id)
+        if not rollups:
+            return None
+        for rollup in reversed(rollups):
+            if rollup.count_by_index(first, last) >= width:
+                return rollup
+        series = self.store.get(client_id)
+        if series is not None and first >= series.total - len(series):
+            return None
+        return rollups[0]
+
+    def save(self, path: str):
+        """把所有汇总记录保存到 npz 文件"""
+        arrays = {}
+        clients, covered = [], []
+        for client_id, rollups in list(self._rollups.items()):
+            name = quote(client_id, safe='')
+            clients.append(name)
+            covered.append(max(rollup.last_timestamp for rollup in rollups))
+            for rollup in rollups:
+                arrays[f'{name}/{rollup.resolution:g}'] = rollup.snapshot()
+        with open(path, 'wb') as f:
+            np.savez(f, clients=np.array(clients, dtype=str), covered=np.array(covered), **arrays)
+
+    def load(self, path: str) -> Dict[str, float]:
+        """从 npz 文件恢复汇总记录，忽略未配置的层级
+
+        Returns:
+            客户端ID到已汇总的最新样本时间的字典，用于补汇总之后写入的样本
+        """
+        covered = {}
+        with np.load(path) as data:
+            for name, last_timestamp in zip(data['clients'].tolist(), data['covered'].tolist()):
+                client_id = unquote(name)
+                for rollup in self.rollups(client_id):
+                    key = f'{name}/{rollup.resolution:g}'
+                    if key in data.files:
+                        rollup.restore(data[key])
+                        rollup.last_timestamp = last_timestamp
+                covered[client_id] = last_timestamp
+        return covered
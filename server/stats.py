@@ -0,0 +1,275 @@
+import time
+import math
+import random
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 默认统计窗口（秒）：1分钟、15分钟、1小时
+DEFAULT_WINDOWS = (60, 900, 3600)
+# 每个窗口划分的子区间数，窗口按子区间宽度滑动
+DEFAULT_BUCKETS = 6
+# 每个子区间为估计分位数保留的样本数（蓄水池抽样）
+DEFAULT_RESERVOIR = 64
+# 统计的通道
+CHANNELS = ('temperature', 'humidity')
+
+class WindowStats(NamedTuple):
+    """一个统计窗口的结果"""
+    count: int
+    mean: float
+    stddev: float
+    min: float
+    max: float
+    p50: float
+    p95: float
+
+class RunningStats:
+    """可合并的 Welford 累加器，O(1) 更新均值和方差"""
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        """加入一个值"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def add_array(self, values: np.ndarray):
+        """加入一批值，先按批计算再合并"""
+        if len(values):
+            mean = float(values.mean())
+            self.merge(len(values), mean, float(((values - mean) ** 2).sum()),
+                       float(values.min()), float(values.max()))
+
+    def merge(self, count: int, mean: float, m2: float, minimum: float, maximum: float):
+        """合并另一组统计量（Chan 并行算法）"""
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+class RollingWindow:
+    """单个通道在一个时间窗口内的滚动统计
+
+    窗口划分为 buckets 个等宽子区间，另加一个正在写入的子区间，每个子区间保存
+    Welford 统计量和固定大小的蓄水池样本。写入只更新当前子区间，代价为 O(1)；子区间
+    过期后原地复用。查询时合并仍在窗口内的子区间，代价与样本数无关。
+    统计覆盖最近 window 到 window × (1 + 1/buckets) 秒的样本。
+
+    分位数由各子区间的蓄水池样本按子区间样本数加权估计，误差随数据本身的分布
+    缩放，与取值范围无关；子区间样本数不超过蓄水池大小时结果是精确的。
+    """
+
+    def __init__(self, window: float, buckets: int = DEFAULT_BUCKETS,
+                 reservoir: int = DEFAULT_RESERVOIR):
+        """初始化滚动窗口
+
+        Args:
+            window: 窗口长度（秒）
+            buckets: 子区间数
+            reservoir: 每个子区间保留的样本数
+        """
+        self.window = window
+        self.width = window / buckets
+        self.buckets = buckets
+        self.reservoir = reservoir
+        slots = buckets + 1
+        self._ids = [-1] * slots
+        self._stats = [RunningStats() for _ in range(slots)]
+        self._samples = np.zeros((slots, reservoir))
+        self._latest = -1  # 最新子区间编号
+
+    def add(self, timestamp: float, value: float):
+        """加入一个样本"""
+        slot = self._slot(int(timestamp // self.width))
+        if slot is None:
+            return
+        stats = self._stats[slot]
+        # 算法 R：第 n 个样本以 reservoir / n 的概率替换蓄水池中的随机一个
+        position = stats.count if stats.count < self.reservoir else random.randrange(stats.count + 1)
+        if position < self.reservoir:
+            self._samples[slot, position] = value
+        stats.add(value)
+
+    def add_array(self, timestamps: np.ndarray, values: np.ndarray):
+        """加入一批样本"""
+        ids = (timestamps // self.width).astype(np.int64)
+        first_id, last_id = int(ids.min()), int(ids.max())
+        if first_id == last_id:
+            # 常见情况：整批落在同一个子区间
+            groups = [(first_id, slice(None))]
+        else:
+            groups = [(int(bucket_id), ids == bucket_id) for bucket_id in np.unique(ids)]
+        for bucket_id, selector in groups:
+            slot = self._slot(bucket_id)
+            if slot is None:
+                continue
+            selected = values[selector]
+            stats = self._stats[slot]
+            # 批量的算法 R：第 n 个样本替换随机位置 [0, n)，落在蓄水池之外的位置丢弃
+            seen = stats.count + np.arange(1, len(selected) + 1)
+            positions = np.where(seen <= self.reservoir, seen - 1,
+                                 (np.random.random(len(selected)) * seen).astype(np.int64))
+            keep = positions < self.reservoir
+            self._samples[slot, positions[keep]] = selected[keep]
+            stats.add_array(selected)
+
+    def result(self, now: float) -> WindowStats:
+        """返回窗口内的统计结果
+
+        Args:
+            now: 当前时间（秒）
+        """
+        oldest = int(now // self.width) - self.buckets
+        total = RunningStats()
+        samples, weights = [], []
+        for slot, bucket_id in enumerate(self._ids):
+            stats = self._stats[slot]
+            if bucket_id >= oldest and stats.count:
+                total.merge(stats.count, stats.mean, stats.m2, stats.min, stats.max)
+                kept = min(stats.count, self.reservoir)
+                samples.append(self._samples[slot, :kept])
+                # 每个保留的样本代表子区间中 count / kept 个样本
+                weights.append(np.full(kept, stats.count / kept))
+        if total.count == 0:
+            nan = math.nan
+            return WindowStats(0, nan, nan, nan, nan, nan, nan)
+        p50, p95 = self._quantiles(np.concatenate(samples), np.concatenate(weights), total, (0.5, 0.95))
+        return WindowStats(total.count, float(total.mean), math.sqrt(total.variance), float(total.min),
+                           float(total.max), p50, p95)
+
+    def _slot(self, bucket_id: int) -> Optional[int]:
+        """返回子区间对应的槽位，必要时清空过期槽位；早于窗口的样本返回 None"""
+        if bucket_id > self._latest:
+            self._latest = bucket_id
+        elif bucket_id < self._latest - self.buckets:
+            return None
+        slot = bucket_id % len(self._ids)
+        if self._ids[slot] != bucket_id:
+            self._ids[slot] = bucket_id
+            self._stats[slot].reset()
+        return slot
+
+    @staticmethod
+    def _quantiles(samples: np.ndarray, weights: np.ndarray, total: RunningStats,
+                   qs: Sequence[float]) -> Tuple[float, ...]:
+        """按加权样本估计分位数
+
+        每个样本位于其权重区间的中点，相邻样本之间线性插值，结果限制在最小值和最大值之间。
+        """
+        order = np.argsort(samples, kind='stable')
+        samples = samples[order]
+        weights = weights[order]
+        positions = (np.cumsum(weights) - weights / 2) / weights.sum()
+        values = np.interp(qs, positions, samples)
+        return tuple(min(max(float(value), total.min), total.max) for value in values)
+
+class StatsEngine:
+    """所有客户端的滚动统计
+
+    每个客户端、每个通道、每个窗口维护一个 RollingWindow，数据到达时增量更新，
+    查询不需要扫描原始样本。可在接入线程写入、在任意线程查询。
+    """
+
+    def __init__(self, windows: Sequence[float] = DEFAULT_WINDOWS,
+                 buckets: int = DEFAULT_BUCKETS, reservoir: int = DEFAULT_RESERVOIR):
+        """初始化统计引擎
+
+        Args:
+            windows: 统计窗口（秒）
+            buckets: 每个窗口的子区间数
+            reservoir: 每个子区间为估计分位数保留的样本数
+        """
+        self.windows = tuple(windows)
+        self.buckets = buckets
+        self.reservoir = reservoir
+        self._clients: Dict[str, Dict[str, List[RollingWindow]]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, client_id: str, samples: Sequence[Tuple[float, float, float]]):
+        """加入客户端的一批样本
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 元组序列
+        """
+        if not len(samples):
+            return
+        with self._lock:
+            channels = self._clients.get(client_id)
+            if channels is None:
+                channels = self._clients[client_id] = {
+                    channel: [RollingWindow(window, self.buckets, self.reservoir) for window in self.windows]
+                    for channel in CHANNELS}
+            if len(samples) == 1:
+                timestamp, temperature, humidity = samples[0]
+                for rolling in channels['temperature']:
+                    rolling.add(timestamp, temperature)
+                for rolling in channels['humidity']:
+                    rolling.add(timestamp, humidity)
+                return
+            columns = np.asarray(samples, dtype=np.float64)
+            for channel, values in (('temperature', columns[:, 1]), ('humidity', columns[:, 2])):
+                for rolling in channels[channel]:
+                    rolling.add_array(columns[:, 0], values)
+
+    def summary(self, client_id: str, window: float = DEFAULT_WINDOWS[0],
+                now: float = None) -> Optional[Dict[str, WindowStats]]:
+        """返回客户端在一个窗口内各通道的统计
+
+        Args:
+            client_id: 客户端ID
+            window: 统计窗口（秒），必须是配置的窗口之一
+            now: 当前时间，默认读取系统时间
+
+        Returns:
+            通道名到统计结果的字典，客户端没有数据时返回 None
+
+        Raises:
+            ValueError: 窗口未配置
+        """
+        if window not in self.windows:
+            raise ValueError(f'未配置的统计窗口：{window}')
+        index = self.windows.index(window)
+        if now is None:
+            now = time.time()
+        with self._lock:
+            channels = self._clients.get(client_id)
+            if channels is None:
+                return None
+            return {channel: windows[index].result(now) for channel, windows in channels.items()}
+
+    def remove(self, client_id: str):
+        """删除客户端的统计"""
+        with self._lock:
+            self._clients.pop(client_id, None)
+
+    def client_ids(self) -> List[str]:
+        """返回有统计数据的客户端ID列表"""
+        with self._lock:
+            return list(self._clients.keys())
@@ -0,0 +1,232 @@
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 每个客户端默认保留的样本数（1Hz 采样约一天）
+DEFAULT_CAPACITY = 86400
+# 缓冲区在容量之外预留的比例，攒满后整体搬移一次，摊还为 O(1) 追加
+DEFAULT_SLACK = 0.25
+
+class SeriesView(NamedTuple):
+    """样本序列的只读视图"""
+    timestamps: np.ndarray  # float64，秒
+    temperature: np.ndarray  # float32
+    humidity: np.ndarray  # float32
+    first_index: int  # 第一个样本的绝对序号（自写入以来的累计编号）
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+class SampleSeries:
+    """单个客户端的列式样本存储
+
+    时间戳、温度、湿度分别保存在预分配的 NumPy 数组中，每个样本占16字节。
+    新样本总是写在已有数据之后，已写入的元素不会被原地修改；缓冲区写满时
+    把最近 capacity 个样本复制到新分配的数组中，旧数组在无人引用后释放。
+    因此 view() 返回的切片无需复制，之后的写入也不会改变其内容。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, slack: float = DEFAULT_SLACK):
+        """初始化样本序列
+
+        Args:
+            capacity: 最多保留的样本数，超出后丢弃最早的样本
+            slack: 缓冲区额外预留的比例
+        """
+        self.capacity = capacity
+        self._size = capacity + max(1, int(capacity * slack))
+        self._timestamps, self._temperature, self._humidity = self._allocate()
+        self._start = 0  # 有效数据在缓冲区中的起止位置 [start, end)
+        self._end = 0
+        self.total = 0  # 累计写入的样本数
+        self.generation = 0  # 补传合并的次数，合并会改变已有样本的绝对序号
+        self._lock = threading.Lock()
+
+    def _allocate(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return (np.empty(self._size, dtype=np.float64),
+                np.empty(self._size, dtype=np.float32),
+                np.empty(self._size, dtype=np.float32))
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def nbytes(self) -> int:
+        """缓冲区占用的字节数"""
+        return self._timestamps.nbytes + self._temperature.nbytes + self._humidity.nbytes
+
+    def append(self, timestamp: float, temperature: float, humidity: float):
+        """追加一个样本"""
+        self.extend_arrays(np.array([timestamp]), np.array([temperature]), np.array([humidity]))
+
+    def extend(self, samples: Sequence[Tuple[float, float, float]]):
+        """追加一批样本
+
+        Args:
+            samples: (时间戳, 温度, 湿度) 元组序列
+        """
+        if not len(samples):
+            return
+        columns = np.asarray(samples, dtype=np.float64)
+        self.extend_arrays(columns[:, 0], columns[:, 1], columns[:, 2])
+
+    def extend_arrays(self, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray):
+        """按列追加一批样本，三个数组长度必须相同"""
+        count = len(timestamps)
+        if count == 0:
+            return
+        if count > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            temperature = temperature[-self.capacity:]
+            humidity = humidity[-self.capacity:]
+        with self._lock:
+            written = len(timestamps)
+            if self._end + written > self._size:
+                self._compact(self.capacity - written)
+            end = self._end + written
+            self._timestamps[self._end:end] = timestamps
+            self._temperature[self._end:end] = temperature
+            self._humidity[self._end:end] = humidity
+            self._end = end
+            self._start = max(self._start, end - self.capacity)
+            self.total += count
+
+    def merge(self, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray):
+        """按时间戳合并一批可能早于已有数据的样本（补传）
+
+        合并结果写入新分配的缓冲区，已返回的视图不受影响，代价与保留的样本数成正比。
+        合并点之后样本的绝对序号整体后移，超出容量时丢弃最早的样本；generation 加一，
+        按绝对序号缓存结果的使用者据此失效缓存。
+        """
+        count = len(timestamps)
+        if count == 0:
+            return
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, temperature, humidity = timestamps[order], temperature[order], humidity[order]
+        with self._lock:
+            retained = self._timestamps[self._start:self._end]
+            # 与已有样本时间戳相同时排在其后
+            positions = np.searchsorted(retained, timestamps, 'right')
+            merged = (np.insert(retained, positions, timestamps),
+                      np.insert(self._temperature[self._start:self._end], positions, temperature),
+                      np.insert(self._humidity[self._start:self._end], positions, humidity))
+            keep = min(len(merged[0]), self.capacity)
+            buffers = self._allocate()
+            for buffer, column in zip(buffers, merged):
+                buffer[:keep] = column[len(column) - keep:]
+            self._timestamps, self._temperature, self._humidity = buffers
+            self._start, self._end = 0, keep
+            self.total += count
+            self.generation += 1
+
+    def _compact(self, keep: int):
+        """把最近 keep 个样本搬到新缓冲区开头"""
+        keep = min(keep, len(self))
+        timestamps, temperature, humidity = self._allocate()
+        if keep > 0:
+            timestamps[:keep] = self._timestamps[self._end - keep:self._end]
+            temperature[:keep] = self._temperature[self._end - keep:self._end]
+            humidity[:keep] = self._humidity[self._end - keep:self._end]
+        self._timestamps, self._temperature, self._humidity = timestamps, temperature, humidity
+        self._start = 0
+        self._end = keep
+
+    def evict_before(self, timestamp: float) -> int:
+        """丢弃时间戳早于 timestamp 的样本，已返回的视图不受影响
+
+        Returns:
+            丢弃的样本数
+        """
+        with self._lock:
+            evicted = int(np.searchsorted(self._timestamps[self._start:self._end], timestamp))
+            self._start += evicted
+            return evicted
+
+    def view(self, start: int = 0, stop: Optional[int] = None) -> SeriesView:
+        """返回 [start, stop) 范围的零复制视图
+
+        Args:
+            start: 相对于最早保留样本的起始位置
+            stop: 结束位置（不含），默认到最新样本
+
+        Returns:
+            样本视图
+        """
+        with self._lock:
+            return self._slice(start, stop)
+
+    def _slice(self, start: int, stop: Optional[int]) -> SeriesView:
+        length = self._end - self._start
+        start, stop, _ = slice(start, stop).indices(length)
+        stop = max(start, stop)
+        lo, hi = self._start + start, self._start + stop
+        first_index = self.total - length + start
+        return SeriesView(self._timestamps[lo:hi], self._temperature[lo:hi],
+                          self._humidity[lo:hi], first_index)
+
+    def view_by_time(self, start: float, stop: float) -> SeriesView:
+        """返回时间戳在 [start, stop) 范围内的零复制视图，二分查找定位，O(log n)"""
+        with self._lock:
+            timestamps = self._timestamps[self._start:self._end]
+            lo = int(np.searchsorted(timestamps, start))
+            return self._slice(lo, int(np.searchsorted(timestamps, stop)))
+
+    def view_by_index(self, first: int, last: int) -> SeriesView:
+        """按绝对序号返回 [first, last) 范围的视图，超出保留范围的部分被截掉"""
+        retained_first = self.total - len(self)
+        return self.view(max(0, first - retained_first), max(0, last - retained_first))
+
+    def latest(self) -> Optional[Tuple[float, float, float]]:
+        """返回最新的样本，没有数据时返回 None"""
+        with self._lock:
+            if self._end == self._start:
+                return None
+            i = self._end - 1
+            return (float(self._timestamps[i]), float(self._temperature[i]), float(self._humidity[i]))
+
+class SampleStore:
+    """所有客户端的样本存储"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """初始化样本存储
+
+        Args:
+            capacity: 每个客户端最多保留的样本数
+        """
+        self.capacity = capacity
+        self._series: Dict[str, SampleSeries] = {}
+        self._lock = threading.Lock()
+
+    def series(self, client_id: str) -> SampleSeries:
+        """返回客户端的样本序列，不存在时创建"""
+        series = self._series.get(client_id)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(client_id, SampleSeries(self.capacity))
+        return series
+
+    def get(self, client_id: str) -> Optional[SampleSeries]:
+        """返回客户端的样本序列，不存在时返回 None"""
+        return self._series.get(client_id)
+
+    def append(self, client_id: str, samples: Sequence[Tuple[float, float, float]]):
+        """追加客户端的一批样本
+
+        Args:
+            client_id: 客户端ID
+            samples: (时间戳, 温度, 湿度) 元组序列
+        """
+        self.series(client_id).extend(samples)
+
+    def client_ids(self) -> List[str]:
+        """返回有数据的客户端ID列表"""
+        return list(self._series.keys())
+
+    def __len__(self) -> int:
+        return sum(len(series) for series in list(self._series.values()))
+
+    @property
+    def nbytes(self) -> int:
+        """所有缓冲区占用的字节数"""
+        return sum(series.nbytes for series in list(self._series.values()))
@@ -1,15 +1,26 @@
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QLabel, QPushButton, QLineEdit, QTextEdit, QTableWidget,
-                             QTableWidgetItem, QHeaderView, QListWidget, QSplitter, QComboBox)
+                             QLabel, QPushButton, QLineEdit, QPlainTextEdit, QTableView,
+                             QHeaderView, QSplitter, QComboBox, QCheckBox, QGroupBox,
+                             QGridLayout, QDoubleSpinBox)
 from PyQt5.QtCore import Qt, pyqtSignal, QTimer
 import pyqtgraph as pg
 import numpy as np
+import logging
 from typing import Dict, List
-from datetime import datetime
 import time
 from PyQt5.QtGui import QIcon
 import os
 
+from ..store import SampleStore
+from ..stats import StatsEngine
+from ..fleet import FleetAggregates
+from ..decimate import SeriesDecimator
+from ..retention import RetentionManager, rollup_points
+from ..metrics import MetricsRegistry, bucket_quantile
+from ..latency import LatencyTracker
+from .models import SampleTableModel, ClientRegistryModel, ClientFilterProxy
+from common.logbuffer import LogBuffer, LOG_LEVELS
+
 class MainWindow(QMainWindow):
     """服务器主窗口"""
     
@@ -17,7 +28,18 @@ class MainWindow(QMainWindow):
     start_server_clicked = pyqtSignal(str)  # 启动服务器按钮点击信号（服务器地址）
     stop_server_clicked = pyqtSignal()     # 停止服务器按钮点击信号
     
-    def __init__(self):
+    def __init__(self, store: SampleStore, stats: StatsEngine, fleet: FleetAggregates,
+                 retention: RetentionManager, metrics: MetricsRegistry, latency: LatencyTracker):
+        """初始化主窗口
+        
+        Args:
+            store: 服务器核心的样本存储，图表、表格和客户端列表都从中读取数据
+            stats: 服务器核心的滚动统计引擎，客户端列表的统计列从中读取
+            fleet: 服务器核心的全网汇总，汇总面板从中读取
+            retention: 服务器核心的分层汇总，缩小查看和按粒度查看表格时从中读取
+            metrics: 服务器核心的指标注册表，运行指标面板从中读取
+            latency: 服务器核心的延迟统计，客户端列表的延迟列从中读取
+        """
         super().__init__()
         
         # 设置应用图标
@@ -29,8 +51,24 @@ class MainWindow(QMainWindow):
         
         self.setWindowIcon(QIcon(icon_path))
         
-        # 存储每个客户端的数据历史
-        self.client_data_history = {}
+        # 样本数据存储
+        self.store = store
+        self.stats = stats
+        self.fleet = fleet
+        self.retention = retention
+        self.metrics = metrics
+        self.latency = latency
+        # 上次刷新运行指标面板时的计数，用于计算速率和区间分位数
+        self.metrics_previous: Dict[str, object] = {}
+        self.metrics_refreshed = time.monotonic()
+        self.fleet_dirty = False  # 有新数据或状态变化，汇总面板需要刷新
+        
+        # 日志和上下线记录缓冲区，可在任意线程写入，每帧批量显示
+        self.log_buffer = LogBuffer()
+        self.status_buffer = LogBuffer(capacity=100, suppress_window=0)
+        
+        # 每个客户端的温度、湿度曲线
+        self.client_curves = {}
         
         # 最大显示点数（不是存储限制）
         self.max_display_points = 100
@@ -47,6 +85,8 @@ class MainWindow(QMainWindow):
         
         # 添加视图控制标志
         self.auto_range = True  # 初始时启用自动范围
+        self.view_dirty = False  # 视图范围变化后需要重新取数
+        self._setting_range = False  # 正在以程序方式调整视图范围
         
         # 初始化UI
         self.init_ui()
@@ -57,18 +97,30 @@ class MainWindow(QMainWindow):
         self.update_timer.timeout.connect(self._update_all)
         self.update_timer.start(100)
         
+        # 运行指标每秒刷新一次
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self._update_metrics_panel)
+        self.metrics_timer.start(1000)
+        
         # 缓存需要更新的数据
         self.pending_updates = set()
 
     def _update_all(self):
         """统一更新所有数据"""
         try:
+            # 更新客户端列表中有变化的行
+            self.client_model.flush()
+            self._flush_logs()
+            if self.fleet_dirty:
+                self._update_fleet_summary()
+            
             # 更新图表
-            if self.pending_updates and self.view_combo.currentText() == '图表视图':
+            if (self.pending_updates or self.view_dirty) and self.view_combo.currentText() == '图表视图':
                 self._update_plots()
             
             # 更新表格（如果在表格视图且有新数据）
             if self.view_combo.currentText() == '数据表格' and self.pending_updates:
+                self.pending_updates.clear()
                 self._update_data_table()
         except Exception as e:
             print(f"Error in update_all: {e}")
@@ -78,6 +130,7 @@ class MainWindow(QMainWindow):
         try:
             # 停止定时器
             self.update_timer.stop()
+            self.metrics_timer.stop()
             # 如果服务器正在运行，发送停止信号
             if self.start_btn.text() == '停止服务器':
                 self.stop_server_clicked.emit()
@@ -117,20 +170,82 @@ class MainWindow(QMainWindow):
         left_panel = QWidget()
         left_layout = QVBoxLayout(left_panel)
         
-        # 创建客户端列表表格
-        self.client_table = QTableWidget()
-        self.client_table.setColumnCount(4)
-        self.client_table.setHorizontalHeaderLabels(['客户端ID', '状态', '温度', '湿度'])
+        # 创建客户端列表表格，只刷新有变化的行
+        self.client_model = ClientRegistryModel(self.store, self.stats, self.latency, self)
+        self.client_proxy = ClientFilterProxy(self)
+        self.client_proxy.setSourceModel(self.client_model)
+        self.online_only_check = QCheckBox('仅在线')
+        self.online_only_check.toggled.connect(self.client_proxy.set_online_only)
+        client_control_layout = QHBoxLayout()
+        client_control_layout.addWidget(self.online_only_check)
+        client_control_layout.addStretch()
+        client_control_layout.addWidget(QLabel('统计窗口:'))
+        self.stats_window_combo = QComboBox()
+        for window in self.stats.windows:
+            self.stats_window_combo.addItem(self._window_label(window), window)
+        self.stats_window_combo.currentIndexChanged.connect(self._on_stats_window_changed)
+        client_control_layout.addWidget(self.stats_window_combo)
+        left_layout.addLayout(client_control_layout)
+        self.client_table = QTableView()
+        self.client_table.setModel(self.client_proxy)
+        self.client_table.setSortingEnabled(True)
+        self.client_table.sortByColumn(0, Qt.AscendingOrder)
+        self.client_table.verticalHeader().hide()
         header = self.client_table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Stretch)
         # 添加表格点击事件
-        self.client_table.itemClicked.connect(self._on_table_clicked)
+        self.client_table.clicked.connect(self._on_table_clicked)
         left_layout.addWidget(self.client_table)
         
+        # 创建全网汇总面板
+        fleet_group = QGroupBox('全网汇总')
+        fleet_layout = QGridLayout(fleet_group)
+        self.fleet_labels = {}
+        for i, (key, title) in enumerate([('online', '在线'), ('temperature', '平均温度'),
+                                          ('hottest', '最高温度'), ('humidity', '平均湿度'),
+                                          ('most_humid', '最高湿度'), ('above', '超过阈值')]):
+            fleet_layout.addWidget(QLabel(f'{title}:'), i // 2, (i % 2) * 2)
+            self.fleet_labels[key] = QLabel('--')
+            fleet_layout.addWidget(self.fleet_labels[key], i // 2, (i % 2) * 2 + 1)
+        fleet_layout.addWidget(QLabel('温度阈值:'), 3, 0)
+        self.fleet_threshold = QDoubleSpinBox()
+        self.fleet_threshold.setRange(-40, 85)
+        self.fleet_threshold.setValue(30.0)
+        self.fleet_threshold.setSuffix('°C')
+        self.fleet_threshold.valueChanged.connect(self._update_fleet_summary)
+        fleet_layout.addWidget(self.fleet_threshold, 3, 1)
+        # 在线客户端的温度分布
+        self.fleet_plot = pg.PlotWidget()
+        self.fleet_plot.setBackground('k')
+        self.fleet_plot.setMaximumHeight(120)
+        self.fleet_plot.setMouseEnabled(x=False, y=False)
+        self.fleet_plot.hideButtons()
+        self.fleet_bars = pg.BarGraphItem(x=[], height=[], width=1, brush='w')
+        self.fleet_plot.addItem(self.fleet_bars)
+        fleet_layout.addWidget(self.fleet_plot, 4, 0, 1, 4)
+        left_layout.addWidget(fleet_group)
+        
+        # 创建运行指标面板
+        metrics_group = QGroupBox('运行指标')
+        metrics_layout = QGridLayout(metrics_group)
+        self.metrics_labels = {}
+        for i, (key, title) in enumerate([('messages', '消息速率'), ('samples', '样本速率'),
+                                          ('handler', '消息处理'), ('ingest', '样本写入'),
+                                          ('ui_frame', '界面帧'), ('clients', '在线/连接'),
+                                          ('errors', '解码/处理错误'), ('heartbeats', '心跳丢失'),
+                                          ('pubsub', '订阅/积压'), ('transport', '传输延迟'),
+                                          ('end_to_end', '端到端延迟')]):
+            metrics_layout.addWidget(QLabel(f'{title}:'), i // 2, (i % 2) * 2)
+            self.metrics_labels[key] = QLabel('--')
+            metrics_layout.addWidget(self.metrics_labels[key], i // 2, (i % 2) * 2 + 1)
+        left_layout.addWidget(metrics_group)
+        
         # 创建上下线记录列表
         left_layout.addWidget(QLabel('客户端上下线记录'))
-        self.status_list = QListWidget()
-        left_layout.addWidget(self.status_list)
+        self.status_text = QPlainTextEdit()
+        self.status_text.setReadOnly(True)
+        self.status_text.setMaximumBlockCount(self.status_buffer.capacity)
+        left_layout.addWidget(self.status_text)
         
         splitter.addWidget(left_panel)
         
@@ -193,12 +308,25 @@ class MainWindow(QMainWindow):
         self.humidity_plot.sigRangeChanged.connect(self._on_view_range_changed)
         plot_layout.addWidget(self.humidity_plot)
         
-        # 数据表格视图
-        self.data_table = QTableWidget()
-        self.data_table.setColumnCount(4)
-        self.data_table.setHorizontalHeaderLabels(['时间', '客户端ID', '温度', '湿度'])
+        # 数据表格视图，行数据由模型按页从样本存储读取
+        self.table_model = SampleTableModel(self.store, self.retention, self)
+        self.data_table = QTableView()
+        self.data_table.setModel(self.table_model)
+        self.data_table.verticalHeader().hide()
         header = self.data_table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Stretch)
+        self.data_table.setAlternatingRowColors(True)  # 交替行颜色
+        self.data_table.setStyleSheet("""
+            QTableView {
+                gridline-color: #d0d0d0;
+                background-color: white;
+                alternate-background-color: #f7f7f7;
+            }
+            QTableView::item {
+                padding: 5px;
+            }
+        """)
+        self.current_page = 0
         
         # 分页控制
         self.page_control = QWidget()
@@ -211,6 +339,13 @@ class MainWindow(QMainWindow):
         page_layout.addWidget(self.prev_btn)
         page_layout.addWidget(self.page_label)
         page_layout.addWidget(self.next_btn)
+        page_layout.addWidget(QLabel('粒度:'))
+        self.resolution_combo = QComboBox()
+        self.resolution_combo.addItem('原始数据', None)
+        for resolution in self.retention.resolutions:
+            self.resolution_combo.addItem(self._window_label(resolution), resolution)
+        self.resolution_combo.currentIndexChanged.connect(self._on_resolution_changed)
+        page_layout.addWidget(self.resolution_combo)
         
         # 将表格和分页控制添加到一个容器中
         table_widget = QWidget()
@@ -232,11 +367,28 @@ class MainWindow(QMainWindow):
         layout.addWidget(splitter)
         
         # 创建日志显示部分
-        self.log_text = QTextEdit()
+        log_control_layout = QHBoxLayout()
+        log_control_layout.addWidget(QLabel('日志级别:'))
+        self.log_level_combo = QComboBox()
+        for name, level in LOG_LEVELS:
+            self.log_level_combo.addItem(name, level)
+        self.log_level_combo.setCurrentIndex(self.log_level_combo.findData(logging.INFO))
+        self.log_level_combo.currentIndexChanged.connect(self._on_log_level_changed)
+        log_control_layout.addWidget(self.log_level_combo)
+        log_control_layout.addStretch()
+        layout.addLayout(log_control_layout)
+        
+        # 纯文本显示，行数与缓冲区容量一致，超出后自动删除最早的行
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(self.log_buffer.capacity)
         self.log_text.setMinimumHeight(200)  # 设置最小高度
         self.log_text.setStyleSheet("font-size: 12pt;")  # 增大字体
         layout.addWidget(self.log_text)
+        
+        # 状态栏显示接入队列统计
+        self.ingest_label = QLabel()
+        self.statusBar().addPermanentWidget(self.ingest_label)
     
     def _on_start_clicked(self):
         """启动/停止服务器按钮点击处理"""
@@ -255,27 +407,22 @@ class MainWindow(QMainWindow):
             # 停止服务器时保持所有数据和显示状态不变
             if not running:
                 # 保持所有曲线可见
-                for client_id, history in self.client_data_history.items():
+                for client_id, curves in self.client_curves.items():
                     if self.client_combo.currentText() == '全部' or self.client_combo.currentText() == client_id:
-                        history['temp_curve'].show()
-                        history['humidity_curve'].show()
+                        curves['temp_curve'].show()
+                        curves['humidity_curve'].show()
         except Exception as e:
             print(f"Error setting server state: {e}")
     
-    def update_client_list(self, clients: List[Dict]):
-        """更新客户端列表
+    def update_client_status(self, client_id: str, status: str):
+        """更新客户端列表中的状态
         
         Args:
-            clients: 客户端列表，每个客户端是一个字典，包含id、status、temperature、humidity字段
+            client_id: 客户端ID
+            status: 状态（在线/离线）
         """
-        self.client_table.setRowCount(len(clients))
-        for i, client in enumerate(clients):
-            self.client_table.setItem(i, 0, QTableWidgetItem(client['id']))
-            self.client_table.setItem(i, 1, QTableWidgetItem(client['status']))
-            if 'temperature' in client:
-                self.client_table.setItem(i, 2, QTableWidgetItem(f"{client['temperature']:.1f}°C"))
-            if 'humidity' in client:
-                self.client_table.setItem(i, 3, QTableWidgetItem(f"{client['humidity']:.1f}%"))
+        self.client_model.set_status(client_id, status)
+        self.fleet_dirty = True
     
     def add_status_record(self, client_id: str, status: str):
         """添加客户端状态记录
@@ -284,78 +431,97 @@ class MainWindow(QMainWindow):
             client_id: 客户端ID
             status: 状态（上线/下线）
         """
-        time_str = datetime.now().strftime('%H:%M:%S')
-        self.status_list.insertItem(0, f'[{time_str}] 客户端 {client_id} {status}')
-        # 限制记录数量
-        if self.status_list.count() > 100:
-            self.status_list.takeItem(self.status_list.count() - 1)
+        self.status_buffer.log(f'客户端 {client_id} {status}')
     
-    def update_client_data(self, client_id: str, temperature: float, humidity: float):
-        """更新客户端数据"""
+    def client_data_updated(self, client_id: str):
+        """客户端有新数据写入存储
+        
+        Args:
+            client_id: 客户端ID
+        """
         try:
-            if client_id not in self.client_data_history:
-                self.client_data_history[client_id] = {
-                    'temp': [],
-                    'humidity': [],
-                    'timestamps': [],
+            if client_id not in self.client_curves:
+                self.client_curves[client_id] = {
                     'temp_curve': self.temp_plot.plot(
                         pen=pg.mkPen(color='w', width=2)
                     ),
                     'humidity_curve': self.humidity_plot.plot(
                         pen=pg.mkPen(color='w', width=2)
                     ),
-                    'display_start': 0  # 显示起始索引
+                    'decimator': SeriesDecimator(self.store.series(client_id))
                 }
             
-            history = self.client_data_history[client_id]
-            
-            # 添加新数据和时间戳
-            history['temp'].append(temperature)
-            history['humidity'].append(humidity)
-            history['timestamps'].append(time.time())
-            
-            # 更新显示范围（保留所有数据，只调整显示窗口）
-            total_points = len(history['temp'])
-            if total_points > self.max_display_points:
-                history['display_start'] = total_points - self.max_display_points
-            
             # 标记需要更新
             self.pending_updates.add(client_id)
+            self.client_model.mark_data(client_id)
+            self.fleet_dirty = True
         except Exception as e:
             print(f"Error updating client data: {e}")
     
     def remove_client_data(self, client_id: str):
         """移除客户端数据"""
         # 客户端下线时不删除数据，只隐藏曲线
-        if client_id in self.client_data_history:
-            history = self.client_data_history[client_id]
+        if client_id in self.client_curves:
+            curves = self.client_curves[client_id]
             if self.client_combo.currentText() != '全部' and self.client_combo.currentText() != client_id:
-                history['temp_curve'].hide()
-                history['humidity_curve'].hide()
+                curves['temp_curve'].hide()
+                curves['humidity_curve'].hide()
             # 保持数据不变，以便后续查看
     
-    def log_message(self, message: str):
-        """添加日志消息
+    def set_ingest_stats(self, depth: int, drained: int, drain_ms: float):
+        """显示接入队列统计
+        
+        Args:
+            depth: 当前积压的事件数
+            drained: 上一帧处理的事件数
+            drain_ms: 上一帧处理耗时（毫秒）
+        """
+        self.ingest_label.setText(f'队列积压 {depth} | 本帧处理 {drained} 条，耗时 {drain_ms:.1f} ms')
+    
+    def log_message(self, message: str, level: int = logging.INFO):
+        """添加日志消息，可在任意线程调用
         
         Args:
             message: 日志消息
+            level: 日志级别（logging 模块的级别）
         """
-        self.log_text.append(message) 
+        self.log_buffer.log(message, level)
+    
+    def _flush_logs(self):
+        """把新日志和上下线记录一次性追加到界面"""
+        min_level = self.log_level_combo.currentData()
+        lines = [record.format() for record in self.log_buffer.drain() if record.level >= min_level]
+        if lines:
+            self.log_text.appendPlainText('\n'.join(lines))
+        lines = [record.format() for record in self.status_buffer.drain()]
+        if lines:
+            self.status_text.appendPlainText('\n'.join(lines))
+    
+    def _on_log_level_changed(self):
+        """日志级别变化时按缓冲区内容重新显示"""
+        self._flush_logs()
+        records = self.log_buffer.records(self.log_level_combo.currentData())
+        self.log_text.setPlainText('\n'.join(record.format() for record in records)) 
     
     def _on_client_selected(self, client_id: str):
         """客户端选择变化处理"""
         try:
             # 切换客户端时重新启用自动范围
             self.auto_range = True
+            self.view_dirty = True
             
             # 显示/隐藏相应的曲线
-            for cid, history in self.client_data_history.items():
+            for cid, curves in self.client_curves.items():
                 if client_id == '全部' or client_id == cid:
-                    history['temp_curve'].show()
-                    history['humidity_curve'].show()
+                    curves['temp_curve'].show()
+                    curves['humidity_curve'].show()
                 else:
-                    history['temp_curve'].hide()
-                    history['humidity_curve'].hide()
+                    curves['temp_curve'].hide()
+                    curves['humidity_curve'].hide()
+            
+            if self.view_combo.currentText() == '数据表格':
+                self.current_page = 0
+                self._update_data_table()
         except Exception as e:
             print(f"Error in client selection: {e}")
     
@@ -378,10 +544,88 @@ class MainWindow(QMainWindow):
         # 不从下拉列表中移除，保留历史数据
         pass
     
-    def _on_table_clicked(self, item):
+    def _update_fleet_summary(self):
+        """刷新全网汇总面板"""
+        self.fleet_dirty = False
+        summary = self.fleet.summary(self.fleet_threshold.value())
+        labels = self.fleet_labels
+        labels['online'].setText(f'{summary.online} / {summary.total}')
+        if summary.reporting == 0:
+            for key in ('temperature', 'hottest', 'humidity', 'most_humid', 'above'):
+                labels[key].setText('--')
+            self.fleet_bars.setOpts(x=[], height=[])
+            return
+        labels['temperature'].setText(f'{summary.temperature_mean:.1f}°C')
+        labels['hottest'].setText(f'{summary.temperature_max:.1f}°C ({summary.temperature_max_client})')
+        labels['humidity'].setText(f'{summary.humidity_mean:.1f}%')
+        labels['most_humid'].setText(f'{summary.humidity_max:.1f}% ({summary.humidity_max_client})')
+        labels['above'].setText(str(summary.above_threshold))
+        edges = summary.histogram_edges
+        self.fleet_bars.setOpts(x=(edges[:-1] + edges[1:]) / 2, height=summary.histogram,
+                                width=(edges[1] - edges[0]) * 0.9)
+    
+    def _update_metrics_panel(self):
+        """刷新运行指标面板，速率和耗时分位数按两次刷新之间的增量计算"""
+        now = time.monotonic()
+        elapsed = max(now - self.metrics_refreshed, 1e-6)
+        self.metrics_refreshed = now
+        metrics = self.metrics
+        labels = self.metrics_labels
+        
+        def rate(name: str) -> float:
+            total = metrics.total(name)
+            previous = self.metrics_previous.get(name, total)
+            self.metrics_previous[name] = total
+            return (total - previous) / elapsed
+        
+        def latency(name: str, stage: str = None) -> str:
+            histogram = metrics.get(name, {'stage': stage} if stage else None)
+            if histogram is None:
+                return '--'
+            counts, _ = histogram.snapshot()
+            key = f'{name}:{stage}'
+            previous = self.metrics_previous.get(key)
+            self.metrics_previous[key] = counts
+            if previous is not None:
+                counts = [a - b for a, b in zip(counts, previous)]
+            p50 = bucket_quantile(histogram.bounds, counts, 0.5)
+            if np.isnan(p50):
+                return '--'
+            p99 = bucket_quantile(histogram.bounds, counts, 0.99)
+            return f'p50 {p50 * 1000:.2f} / p99 {p99 * 1000:.2f} ms'
+        
+        labels['messages'].setText(f'{rate("messages_received_total"):.0f} 条/秒')
+        labels['samples'].setText(f'{rate("samples_ingested_total"):.0f} 个/秒')
+        labels['handler'].setText(latency('message_handler_seconds'))
+        labels['ingest'].setText(latency('ingest_seconds'))
+        labels['ui_frame'].setText(latency('ui_frame_seconds'))
+        labels['clients'].setText(f'{metrics.total("clients_online"):.0f} / {metrics.total("connections"):.0f}')
+        labels['errors'].setText(f'{metrics.total("decode_errors_total"):.0f} / '
+                                 f'{metrics.total("handler_errors_total"):.0f}')
+        labels['heartbeats'].setText(f'{metrics.total("heartbeat_misses_total"):.0f}')
+        labels['pubsub'].setText(f'{metrics.total("pubsub_subscribers"):.0f} / '
+                                 f'{metrics.total("pubsub_queued_frames"):.0f}')
+        labels['transport'].setText(latency('latency_seconds', 'transport'))
+        labels['end_to_end'].setText(latency('latency_seconds', 'end_to_end'))
+    
+    @staticmethod
+    def _window_label(window: float) -> str:
+        """统计窗口的显示名称"""
+        if window >= 3600 and window % 3600 == 0:
+            return f'{int(window // 3600)}小时'
+        if window >= 60 and window % 60 == 0:
+            return f'{int(window // 60)}分钟'
+        return f'{window:g}秒'
+    
+    def _on_stats_window_changed(self):
+        """切换客户端列表统计列的窗口"""
+        self.client_model.set_stats_window(self.stats_window_combo.currentData())
+        self.client_model.flush()
+    
+    def _on_table_clicked(self, index):
         """处理表格点击事件"""
-        if item.column() == 0:  # 只处理客户端ID列的点击
-            client_id = item.text()
+        if index.column() == 0:  # 只处理客户端ID列的点击
+            client_id = self.client_model.client_id(self.client_proxy.mapToSource(index).row())
             self.client_combo.setCurrentText(client_id)
     
     def _on_view_changed(self, view_type: str):
@@ -396,6 +640,7 @@ class MainWindow(QMainWindow):
             if view_type == '图表视图':
                 widgets[0].show()
                 widgets[1].hide()
+                self.view_dirty = True  # 表格视图期间到达的数据需要重绘
             else:
                 widgets[0].hide()
                 widgets[1].show()
@@ -407,86 +652,33 @@ class MainWindow(QMainWindow):
         """更新数据表格"""
         try:
             selected_client = self.client_combo.currentText()
+            self.table_model.set_clients(None if selected_client == '全部' else [selected_client])
             
-            # 收集所有数据
-            all_data = []
-            for client_id, history in self.client_data_history.items():
-                if selected_client == '全部' or selected_client == client_id:
-                    for i in range(len(history['temp'])):
-                        all_data.append({
-                            'time': time.strftime('%H:%M:%S', time.localtime(history['timestamps'][i])),
-                            'client_id': client_id,
-                            'temp': history['temp'][i],
-                            'humidity': history['humidity'][i]
-                        })
-            
-            # 按时间戳降序排序
-            all_data.sort(key=lambda x: x['time'], reverse=True)
-            
-            # 计算分页
-            self.rows_per_page = max(1, (self.data_table.height() - 50) // 30)
-            self.total_rows = len(all_data)
-            self.total_pages = max(1, (self.total_rows + self.rows_per_page - 1) // self.rows_per_page)
-            
-            # 确保当前页码有效
-            if not hasattr(self, 'current_page'):
-                self.current_page = 0
-            if self.current_page >= self.total_pages:
-                self.current_page = max(0, self.total_pages - 1)
-            
-            self._show_current_page(all_data)
-        except Exception as e:
-            print(f"Error updating data table: {e}")
-    
-    def _show_current_page(self, all_data: List[Dict]):
-        """显示当前页的数据"""
-        try:
-            start = self.current_page * self.rows_per_page
-            end = min(start + self.rows_per_page, self.total_rows)
-            page_data = all_data[start:end]
-            
-            # 设置表格行数
-            self.data_table.setRowCount(len(page_data))
-            
-            # 设置表格数据
-            for i, data in enumerate(page_data):
-                # 设置单元格文本对齐方式为居中
-                for j, text in enumerate([
-                    data['time'],
-                    data['client_id'],
-                    f"{data['temp']:.1f}°C",
-                    f"{data['humidity']:.1f}%"
-                ]):
-                    item = QTableWidgetItem(text)
-                    item.setTextAlignment(Qt.AlignCenter)  # 居中对齐
-                    self.data_table.setItem(i, j, item)
+            # 计算分页，只载入当前页
+            rows_per_page = max(1, (self.data_table.height() - 50) // 30)
+            self.table_model.refresh(self.current_page, rows_per_page)
+            self.current_page = self.table_model.page
+            total_rows = self.table_model.total_rows
+            total_pages = self.table_model.page_count
             
             # 更新页码显示
-            if self.total_rows == 0:
+            if total_rows == 0:
                 self.page_label.setText('无数据')
             else:
-                self.page_label.setText(f'第 {self.current_page + 1} 页 / 共 {self.total_pages} 页 (共 {self.total_rows} 条记录)')
+                self.page_label.setText(f'第 {self.current_page + 1} 页 / 共 {total_pages} 页 (共 {total_rows} 条记录)')
             
             # 更新按钮状态
             self.prev_btn.setEnabled(self.current_page > 0)
-            self.next_btn.setEnabled(self.current_page < self.total_pages - 1)
-            
-            # 调整表格外观
-            self.data_table.resizeColumnsToContents()  # 自动调整列宽
-            self.data_table.setAlternatingRowColors(True)  # 交替行颜色
-            self.data_table.setStyleSheet("""
-                QTableWidget {
-                    gridline-color: #d0d0d0;
-                    background-color: white;
-                    alternate-background-color: #f7f7f7;
-                }
-                QTableWidget::item {
-                    padding: 5px;
-                }
-            """)
+            self.next_btn.setEnabled(self.current_page < total_pages - 1)
         except Exception as e:
-            print(f"Error showing current page: {e}")
+            print(f"Error updating data table: {e}")
     
+    def _on_resolution_changed(self):
+        """切换数据表格的粒度"""
+        self.table_model.set_resolution(self.resolution_combo.currentData())
+        self.current_page = 0
+        self._update_data_table()
+
     def _on_prev_page(self):
         """上一页"""
         if self.current_page > 0:
@@ -495,47 +687,57 @@ class MainWindow(QMainWindow):
     
     def _on_next_page(self):
         """下一页"""
-        if self.current_page < self.total_pages - 1:
+        if self.current_page < self.table_model.page_count - 1:
             self.current_page += 1
             self._update_data_table()
 
     def _update_plots(self):
         """更新所有需要更新的图表"""
         try:
-            if not self.pending_updates:
-                return
+            # 视图范围变化时所有可见曲线都要按新范围取数
+            client_ids = list(self.client_curves) if self.view_dirty else list(self.pending_updates)
+            self.pending_updates.clear()
+            self.view_dirty = False
             
-            # 更新曲线数据
-            for client_id in self.pending_updates:
-                if client_id in self.client_data_history:
-                    history = self.client_data_history[client_id]
-                    if history['temp_curve'].isVisible():
-                        total_points = len(history['temp'])
-                        if total_points > 0:
-                            # 创建X轴数据
-                            x = np.arange(total_points)
-                            
-                            # 更新曲线数据
-                            history['temp_curve'].setData(
-                                x, 
-                                history['temp']
-                            )
-                            history['humidity_curve'].setData(
-                                x, 
-                                history['humidity']
-                            )
-                            
-                            # 只在自动范围模式下调整视图
-                            if self.auto_range and total_points > self.max_display_points:
-                                display_start = total_points - self.max_display_points
-                                self.temp_plot.setXRange(display_start, total_points)
-                                self.humidity_plot.setXRange(display_start, total_points)
+            latest_index = 0
+            for client_id in client_ids:
+                curves = self.client_curves.get(client_id)
+                series = self.store.get(client_id)
+                if curves is None or series is None or not curves['temp_curve'].isVisible():
+                    continue
+                latest_index = max(latest_index, series.total)
+                for curve, plot, column in ((curves['temp_curve'], self.temp_plot, 'temperature'),
+                                            (curves['humidity_curve'], self.humidity_plot, 'humidity')):
+                    # 只取视图范围内的样本，缩小查看时按像素宽度降采样
+                    if self.auto_range:
+                        first, last = series.total - self.max_display_points, series.total
+                    else:
+                        x_min, x_max = plot.viewRange()[0]
+                        first, last = int(np.floor(x_min)), int(np.ceil(x_max)) + 1
+                    width = int(plot.getViewBox().width()) or 1000
+                    # 范围内样本远多于像素或原始样本已过期时，改用满足分辨率的最粗汇总层级
+                    rollup = self.retention.select(client_id, first, last, width)
+                    if rollup is None:
+                        curve.setData(*curves['decimator'].points(column, first, last, width))
+                    else:
+                        curve.setData(*rollup_points(rollup.records_by_index(first, last), column, width))
             
-            self.pending_updates.clear()
+            # 只在自动范围模式下调整视图
+            if self.auto_range and latest_index > self.max_display_points:
+                display_start = latest_index - self.max_display_points
+                self._setting_range = True
+                try:
+                    self.temp_plot.setXRange(display_start, latest_index)
+                    self.humidity_plot.setXRange(display_start, latest_index)
+                finally:
+                    self._setting_range = False
         except Exception as e:
             print(f"Error updating plots: {e}")
 
     def _on_view_range_changed(self):
         """处理视图范围变化"""
-        # 用户手动调整视图范围时，禁用自动范围
-        self.auto_range = False
\ No newline at end of file
+        if self._setting_range:
+            return
+        # 用户手动调整视图范围时，禁用自动范围，并按新范围重新取数
+        self.auto_range = False
+        self.view_dirty = True
@@ -0,0 +1,407 @@
+import time
+from typing import Dict, List, Optional, Sequence, Set
+
+import numpy as np
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, QVariant
+
+from ..store import SampleStore
+from ..stats import StatsEngine, WindowStats
+from ..retention import RetentionManager
+from ..latency import LatencyTracker
+
+def merge_split(timestamps: Sequence[np.ndarray], rank: int) -> List[int]:
+    """在多个升序时间戳数组中找出合并后前 rank 个样本的分界位置
+
+    每轮取剩余范围最大的数组的中位数作为基准，用二分查找统计各数组中小于和
+    不大于基准的样本数，并据此收窄范围，不需要真正合并数组。
+    时间戳相同的样本按数组顺序排列。
+
+    Args:
+        timestamps: 各客户端按时间升序排列的时间戳
+        rank: 合并后的前缀长度
+
+    Returns:
+        各数组的分界位置，其和等于 rank
+    """
+    lo = [0] * len(timestamps)
+    hi = [len(a) for a in timestamps]
+    rank = max(0, min(rank, sum(hi)))
+    while True:
+        widths = [h - l for l, h in zip(lo, hi)]
+        widest = max(range(len(widths)), key=widths.__getitem__, default=None)
+        if widest is None or widths[widest] == 0:
+            return lo
+        pivot = timestamps[widest][(lo[widest] + hi[widest]) // 2]
+        below = [int(np.searchsorted(a, pivot, 'left')) for a in timestamps]
+        upto = [int(np.searchsorted(a, pivot, 'right')) for a in timestamps]
+        if sum(below) > rank:
+            hi = [min(h, b) for h, b in zip(hi, below)]
+        elif sum(upto) < rank:
+            lo = [max(l, u) for l, u in zip(lo, upto)]
+        else:
+            # 分界落在等于基准的样本中，按数组顺序分配
+            remaining = rank - sum(below)
+            split = []
+            for b, u in zip(below, upto):
+                take = min(u - b, remaining)
+                split.append(b + take)
+                remaining -= take
+            return split
+
+class SampleTableModel(QAbstractTableModel):
+    """数据表格的虚拟模型
+
+    直接读取样本存储，只物化当前页的样本，单元格文本在视图请求时才格式化。
+    各客户端的样本按写入顺序（即时间顺序）保存，某一页的样本通过多路归并的
+    分界查找定位，代价为 O(页大小 + 客户端数 × log² n)，与总行数无关。
+    选择汇总分辨率后，每行对应一个时间桶，显示均值和最小/最大值。
+    """
+
+    HEADERS = ['时间', '客户端ID', '温度', '湿度']
+    # 汇总记录中对应各列的字段
+    ROLLUP_COLUMNS = {
+        'timestamps': 'start',
+        'temperature': 'temperature_mean',
+        'humidity': 'humidity_mean',
+        'temperature_min': 'temperature_min',
+        'temperature_max': 'temperature_max',
+        'humidity_min': 'humidity_min',
+        'humidity_max': 'humidity_max',
+    }
+
+    def __init__(self, store: SampleStore, retention: Optional[RetentionManager] = None, parent=None):
+        """初始化模型
+
+        Args:
+            store: 样本存储
+            retention: 分层汇总，None 表示只显示原始样本
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.store = store
+        self.retention = retention
+        self.resolution: Optional[float] = None  # None 表示原始样本
+        self.client_ids: Optional[List[str]] = None  # None 表示全部客户端
+        self.page = 0
+        self.rows_per_page = 1
+        self.total_rows = 0
+        self._row_clients: List[str] = []
+        self._columns: Dict[str, np.ndarray] = {}
+
+    @property
+    def page_count(self) -> int:
+        """总页数"""
+        return max(1, -(-self.total_rows // self.rows_per_page))
+
+    def set_clients(self, client_ids: Optional[List[str]]):
+        """设置显示的客户端
+
+        Args:
+            client_ids: 客户端ID列表，None 表示全部
+        """
+        self.client_ids = client_ids
+
+    def set_resolution(self, resolution: Optional[float]):
+        """设置显示的数据粒度
+
+        Args:
+            resolution: 汇总分辨率（秒），None 表示原始样本
+        """
+        self.resolution = resolution
+
+    def _client_columns(self, client_id: str) -> Optional[Dict[str, np.ndarray]]:
+        """返回客户端按时间升序排列的各列数据"""
+        if self.resolution is None:
+            series = self.store.get(client_id)
+            if series is None:
+                return None
+            view = series.view()
+            return {'timestamps': view.timestamps, 'temperature': view.temperature,
+                    'humidity': view.humidity}
+        rollup = self.retention.tier(client_id, self.resolution) if self.retention else None
+        if rollup is None:
+            return None
+        records = rollup.records()
+        return {column: records[field] for column, field in self.ROLLUP_COLUMNS.items()}
+
+    def refresh(self, page: int, rows_per_page: int):
+        """按最新数据重新定位并载入一页，按时间从新到旧排列
+
+        Args:
+            page: 页码（从0开始），超出范围时取最后一页
+            rows_per_page: 每页行数
+        """
+        client_ids = self.store.client_ids() if self.client_ids is None else self.client_ids
+        views = []
+        for client_id in client_ids:
+            columns = self._client_columns(client_id)
+            if columns is not None:
+                views.append((client_id, columns))
+
+        self.rows_per_page = max(1, rows_per_page)
+        self.total_rows = sum(len(columns['timestamps']) for _, columns in views)
+        self.page = max(0, min(page, self.page_count - 1))
+
+        # 页内行按降序排列，对应升序合并结果中的 [first, last)
+        last = self.total_rows - self.page * self.rows_per_page
+        first = max(0, last - self.rows_per_page)
+        timestamps = [columns['timestamps'] for _, columns in views]
+        starts = merge_split(timestamps, first)
+        stops = merge_split(timestamps, last)
+
+        if views:
+            owners = np.concatenate([np.full(stop - start, index)
+                                     for index, (start, stop) in enumerate(zip(starts, stops))])
+            parts = {name: np.concatenate([columns[name][start:stop]
+                                           for (_, columns), start, stop in zip(views, starts, stops)])
+                     for name in views[0][1]}
+            # 按时间、再按客户端顺序排序，与分界查找的规则一致，然后倒序
+            order = np.lexsort((owners, parts['timestamps']))[::-1]
+            row_clients = [views[i][0] for i in owners[order].tolist()]
+            parts = {name: values[order] for name, values in parts.items()}
+        else:
+            row_clients, parts = [], {}
+
+        if len(row_clients) == len(self._row_clients):
+            self._set_rows(row_clients, parts)
+            if row_clients:
+                self.dataChanged.emit(self.index(0, 0),
+                                      self.index(len(row_clients) - 1, len(self.HEADERS) - 1))
+        else:
+            self.beginResetModel()
+            self._set_rows(row_clients, parts)
+            self.endResetModel()
+
+    def _set_rows(self, row_clients: List[str], columns: Dict[str, np.ndarray]):
+        self._row_clients = row_clients
+        self._columns = columns
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._row_clients)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role != Qt.DisplayRole:
+            return QVariant()
+        row, column = index.row(), index.column()
+        columns = self._columns
+        if column == 0:
+            timestamp = time.localtime(columns['timestamps'][row])
+            if self.resolution is None:
+                return time.strftime('%H:%M:%S', timestamp)
+            return time.strftime('%m-%d %H:%M', timestamp)
+        if column == 1:
+            return self._row_clients[row]
+        name, unit = ('temperature', '°C') if column == 2 else ('humidity', '%')
+        text = f"{columns[name][row]:.1f}{unit}"
+        if self.resolution is not None:
+            text += f" ({columns[name + '_min'][row]:.1f} ~ {columns[name + '_max'][row]:.1f})"
+        return text
+
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+class ClientRegistryModel(QAbstractTableModel):
+    """客户端列表模型
+
+    每行对应一个出现过的客户端，行号一经分配不再变化。状态变化和新数据只把
+    对应的行标记为待刷新，flush() 时从样本存储和统计引擎读取这些行的最新数值，
+    并按连续的行区间发出 dataChanged，没有变化的客户端不产生任何开销。
+    """
+
+    HEADERS = ['客户端ID', '状态', '温度', '湿度', '温度均值', '温度P95', '湿度均值', '湿度P95', '延迟P99']
+    # 统计列对应的（通道，字段，单位）
+    STATS_COLUMNS = {
+        4: ('temperature', 'mean', '°C'),
+        5: ('temperature', 'p95', '°C'),
+        6: ('humidity', 'mean', '%'),
+        7: ('humidity', 'p95', '%'),
+    }
+    # 端到端延迟列
+    LATENCY_COLUMN = 8
+
+    def __init__(self, store: SampleStore, stats: StatsEngine,
+                 latency: Optional[LatencyTracker] = None, parent=None):
+        """初始化模型
+
+        Args:
+            store: 样本存储，最新温湿度从中读取
+            stats: 滚动统计引擎，统计列从中读取
+            latency: 延迟统计，延迟列从中读取，None 表示不显示
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.store = store
+        self.stats = stats
+        self.latency = latency
+        self.stats_window = stats.windows[0]
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}  # client_id -> 行号
+        self._status: List[str] = []
+        self._temperature: List[Optional[float]] = []
+        self._humidity: List[Optional[float]] = []
+        self._stats: List[Optional[Dict[str, WindowStats]]] = []
+        self._latency: List[float] = []  # 端到端延迟P99（秒），没有记录时为 nan
+        self._dirty: Set[int] = set()
+
+    def client_id(self, row: int) -> str:
+        """返回行对应的客户端ID"""
+        return self._ids[row]
+
+    def set_status(self, client_id: str, status: str):
+        """记录客户端状态变化
+
+        Args:
+            client_id: 客户端ID
+            status: 状态（在线/离线）
+        """
+        row = self._row(client_id)
+        if self._status[row] != status:
+            self._status[row] = status
+            self._dirty.add(row)
+
+    def mark_data(self, client_id: str):
+        """标记客户端有新数据"""
+        self._dirty.add(self._row(client_id))
+
+    def set_stats_window(self, window: float):
+        """切换统计列使用的窗口，所有行在下次 flush() 时刷新
+
+        Args:
+            window: 统计窗口（秒）
+        """
+        self.stats_window = window
+        self._dirty.update(range(len(self._ids)))
+
+    def flush(self):
+        """刷新待更新的行"""
+        if not self._dirty:
+            return
+        rows = sorted(self._dirty)
+        self._dirty.clear()
+        for row in rows:
+            series = self.store.get(self._ids[row])
+            latest = series.latest() if series is not None else None
+            if latest is not None:
+                _, self._temperature[row], self._humidity[row] = latest
+            self._stats[row] = self.stats.summary(self._ids[row], self.stats_window)
+            if self.latency is not None:
+                self._latency[row] = self.latency.quantile(self._ids[row], 'end_to_end', 0.99)
+        # 相邻的行合并为一次通知
+        first = previous = rows[0]
+        for row in rows[1:] + [None]:
+            if row is not None and row == previous + 1:
+                previous = row
+                continue
+            self.dataChanged.emit(self.index(first, 0), self.index(previous, len(self.HEADERS) - 1))
+            if row is not None:
+                first = previous = row
+
+    def _row(self, client_id: str) -> int:
+        row = self._rows.get(client_id)
+        if row is None:
+            row = len(self._ids)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._ids.append(client_id)
+            self._rows[client_id] = row
+            self._status.append("在线")
+            self._temperature.append(None)
+            self._humidity.append(None)
+            self._stats.append(None)
+            self._latency.append(np.nan)
+            self.endInsertRows()
+        return row
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._ids)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        row, column = index.row(), index.column()
+        if column in self.STATS_COLUMNS:
+            return self._stats_data(row, column, role)
+        if column == self.LATENCY_COLUMN:
+            return self._latency_data(row, role)
+        if role == Qt.UserRole:
+            # 排序用的原始值
+            value = (self._ids, self._status, self._temperature, self._humidity)[column][row]
+            return float('-inf') if value is None else value
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if column == 0:
+            return self._ids[row]
+        if column == 1:
+            return self._status[row]
+        if column == 2:
+            value = self._temperature[row]
+            return '' if value is None else f"{value:.1f}°C"
+        value = self._humidity[row]
+        return '' if value is None else f"{value:.1f}%"
+
+    def _latency_data(self, row: int, role):
+        value = self._latency[row]
+        if np.isnan(value):
+            return float('-inf') if role == Qt.UserRole else QVariant()
+        if role == Qt.UserRole:
+            return value
+        if role == Qt.DisplayRole:
+            return f"{value * 1000:.1f} ms"
+        if role == Qt.ToolTipRole:
+            client_id = self._ids[row]
+            rtt = self.latency.rtt(client_id)
+            return (f"时钟偏差 {self.latency.offset(client_id) * 1000:.1f} ms，"
+                    f"心跳往返 {'--' if rtt is None else f'{rtt * 1000:.1f} ms'}")
+        return QVariant()
+
+    def _stats_data(self, row: int, column: int, role):
+        channel, field, unit = self.STATS_COLUMNS[column]
+        summary = self._stats[row]
+        stats = summary[channel] if summary else None
+        if stats is None or stats.count == 0:
+            return float('-inf') if role == Qt.UserRole else QVariant()
+        if role == Qt.UserRole:
+            return getattr(stats, field)
+        if role == Qt.DisplayRole:
+            return f"{getattr(stats, field):.1f}{unit}"
+        if role == Qt.ToolTipRole:
+            return (f"样本数 {stats.count}，均值 {stats.mean:.2f}{unit}，标准差 {stats.stddev:.2f}\n"
+                    f"最小 {stats.min:.1f}{unit}，最大 {stats.max:.1f}{unit}，"
+                    f"P50 {stats.p50:.1f}{unit}，P95 {stats.p95:.1f}{unit}")
+        return QVariant()
+
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+class ClientFilterProxy(QSortFilterProxyModel):
+    """客户端列表的排序和过滤代理，可只显示在线客户端"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.online_only = False
+        self.setSortRole(Qt.UserRole)
+        self.setDynamicSortFilter(True)
+
+    def set_online_only(self, online_only: bool):
+        """设置是否只显示在线客户端"""
+        self.online_only = online_only
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if not self.online_only:
+            return True
+        index = self.sourceModel().index(source_row, 1, source_parent)
+        return self.sourceModel().data(index) == "在线"
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+
+from server.alerts import (AlertEngine, ThresholdRule, RateOfChangeRule, FlatlineRule, ZScoreRule,
+                           load_rules)
+
+def _samples(temperatures, start=0.0, step=1.0, humidity=50.0):
+    return [(start + i * step, float(value), humidity) for i, value in enumerate(temperatures)]
+
+def _transitions(events):
+    return [(event.rule, event.timestamp, event.active) for event in events]
+
+def _per_sample(engine, client_id, samples):
+    events = []
+    for sample in samples:
+        events += engine.evaluate(client_id, [sample])
+    return events
+
+def test_threshold_latches_with_hysteresis():
+    engine = AlertEngine([ThresholdRule('高温', 'temperature', above=30, hysteresis=2)])
+    samples = _samples([25, 31, 32, 29, 31, 27.5, 31])
+    events = engine.evaluate('c', samples)
+    # 回落到 29 仍在滞回区内，不恢复，也不重复告警；降到 28 以下才恢复
+    assert _transitions(events) == [('高温', 1.0, True), ('高温', 5.0, False), ('高温', 6.0, True)]
+    assert events[0].value == 31 and '告警' in events[0].message
+    assert _transitions(engine.evaluate('c', _samples([31, 20], start=7))) == [('高温', 8.0, False)]
+
+def test_batch_and_per_sample_evaluation_agree():
+    rng = np.random.default_rng(1)
+    values = np.cumsum(rng.normal(0, 1, 500)) + 22
+    values[300] += 15
+    values[400:440] = values[399]
+
+    def rules():
+        return [ThresholdRule('高温', 'temperature', above=25, hysteresis=0.5),
+                ThresholdRule('低温', 'temperature', below=18),
+                RateOfChangeRule('突变', 'temperature', max_rate=2.5),
+                FlatlineRule('卡死', 'temperature', duration=10),
+                ZScoreRule('离群', 'temperature', threshold=3, warmup=20)]
+
+    samples = _samples(values)
+    batch = AlertEngine(rules())
+    batch_events = []
+    for start in range(0, len(samples), 64):
+        batch_events += batch.evaluate('c', samples[start:start + 64])
+    single_events = _per_sample(AlertEngine(rules()), 'c', samples)
+    assert sorted(_transitions(batch_events)) == sorted(_transitions(single_events))
+    assert {'突变', '卡死', '离群'} <= {event.rule for event in batch_events}
+
+def test_flatline_and_rate_rules():
+    engine = AlertEngine([FlatlineRule('卡死', 'humidity', duration=5),
+                          RateOfChangeRule('突变', 'temperature', max_rate=1)])
+    samples = [(float(t), 20.0 + (t == 3) * 5, 40.0) for t in range(10)]
+    events = _per_sample(engine, 'c', samples)
+    assert _transitions(events) == [('突变', 3.0, True), ('突变', 5.0, False), ('卡死', 5.0, True)]
+
+def test_rules_apply_to_matching_clients_only():
+    engine = AlertEngine([ThresholdRule('高温', 'temperature', above=30, clients='lab-*')])
+    assert engine.evaluate('office-1', _samples([35])) == []
+    assert len(engine.evaluate('lab-1', _samples([35]))) == 1
+    engine.remove('lab-1')
+    assert len(engine.evaluate('lab-1', _samples([35]))) == 1
+
+def test_load_rules(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps([{'type': 'threshold', 'channel': 'temperature', 'above': 35},
+                                {'type': 'zscore', 'name': 'z', 'channel': 'humidity'}]),
+                    encoding='utf-8')
+    rules = load_rules(str(path))
+    assert [rule.name for rule in rules] == ['threshold:temperature', 'z']
+    path.write_text(json.dumps([{'type': 'spline', 'channel': 'temperature'}]), encoding='utf-8')
+    with pytest.raises(ValueError, match='未知的规则类型'):
+        load_rules(str(path))
+    path.write_text(json.dumps([{'type': 'rate', 'channel': 'temperature'}]), encoding='utf-8')
+    with pytest.raises(ValueError, match='规则参数错误'):
+        load_rules(str(path))
+    with pytest.raises(ValueError, match='未知的通道'):
+        ThresholdRule('x', 'pressure', above=1)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from server.store import SampleSeries
+from server.decimate import SeriesDecimator, minmax_decimate
+
+def _fill(series: SampleSeries, count: int, value: float, start: float = 1000.0):
+    timestamps = start + np.arange(count, dtype=np.float64)
+    series.extend_arrays(timestamps, np.full(count, value), np.full(count, value))
+
+def test_minmax_decimate_keeps_extremes():
+    values = np.zeros(1000, dtype=np.float32)
+    values[123] = 5.0
+    values[877] = -5.0
+    x, y = minmax_decimate(values, 0, 100)
+    assert len(x) == 20
+    assert y.max() == 5.0 and y.min() == -5.0
+    assert x[np.argmax(y)] == 123
+
+def test_points_follow_appended_samples():
+    series = SampleSeries(capacity=100000)
+    _fill(series, 20000, 0.0)
+    decimator = SeriesDecimator(series)
+    decimator.points('temperature', 0, series.total, 100)
+    _fill(series, 20000, 7.0, start=30000.0)
+    x, y = decimator.points('temperature', 0, series.total, 100)
+    assert y.max() == 7.0
+    assert np.all(np.diff(x) >= 0)
+
+def test_points_after_merge_match_fresh_decimator():
+    series = SampleSeries(capacity=100000)
+    _fill(series, 20000, 0.0)
+    decimator = SeriesDecimator(series)
+    _, y = decimator.points('temperature', 0, series.total, 100)
+    assert y.max() == 0.0
+
+    # 补传的样本插入已有数据中间，之后样本的绝对序号整体后移
+    late = 5000.5 + np.arange(5000, dtype=np.float64)
+    series.merge(late, np.full(5000, 50.0), np.full(5000, 50.0))
+
+    x, y = decimator.points('temperature', 0, series.total, 100)
+    fresh_x, fresh_y = SeriesDecimator(series).points('temperature', 0, series.total, 100)
+    assert y.max() == 50.0
+    np.testing.assert_array_equal(x, fresh_x)
+    np.testing.assert_array_equal(y, fresh_y)
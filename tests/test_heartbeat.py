@@ -0,0 +1,40 @@
+from server.heartbeat import DeadlineScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_expire_returns_due_keys_once():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(clock)
+    scheduler.schedule('a', 5)
+    scheduler.schedule('b', 10)
+    assert scheduler.next_deadline() == 5
+    assert scheduler.expire(4) == []
+    assert scheduler.expire(6) == ['a']
+    assert 'a' not in scheduler and len(scheduler) == 1
+    assert scheduler.expire(20) == ['b']
+    assert scheduler.next_deadline() is None
+
+def test_postponed_deadline_is_requeued():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(clock)
+    scheduler.schedule('a', 5)
+    clock.now = 4
+    scheduler.schedule('a', 5)
+    assert scheduler.expire(6) == []
+    assert scheduler.expire(9) == ['a']
+
+def test_advanced_deadline_and_remove():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(clock)
+    scheduler.schedule('a', 10)
+    scheduler.schedule('a', 2)
+    scheduler.schedule('b', 1)
+    scheduler.remove('b')
+    assert scheduler.next_deadline() == 2
+    assert scheduler.expire(3) == ['a']
+    assert scheduler.expire(100) == []
@@ -0,0 +1,52 @@
+import threading
+
+import numpy as np
+import pytest
+
+from server.metrics import MetricsRegistry
+from server.latency import LatencyTracker
+
+def test_records_per_client_and_fleet():
+    metrics = MetricsRegistry()
+    tracker = LatencyTracker(metrics, capacity=2)
+    for i in range(100):
+        tracker.record(f'c{i % 5}', 'store', 0.002)
+    tracker.record('c0', 'end_to_end', 0.03)
+    assert tracker.fleet_counts('store').sum() == 100
+    assert 0.001 < tracker.quantile('c1', 'store', 0.5) <= 0.0025
+    assert np.isnan(tracker.quantile('missing', 'store', 0.5))
+    summary = tracker.summary('c0')
+    assert summary['store']['count'] == 20 and summary['end_to_end']['count'] == 1
+    assert summary['render'] == {'count': 0}
+    assert metrics.get('latency_seconds', {'stage': 'store'}).count == 100
+
+def test_growth_does_not_lose_counts():
+    tracker = LatencyTracker(capacity=1)
+    barrier = threading.Barrier(2)
+
+    def work(prefix):
+        barrier.wait()
+        for i in range(5000):
+            tracker.record(f'{prefix}{i % 300}', 'decode', 0.0001)
+
+    threads = [threading.Thread(target=work, args=(prefix,)) for prefix in 'ab']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tracker.fleet_counts('decode').sum() == 10000
+
+def test_clock_offset_uses_fastest_round_trip():
+    tracker = LatencyTracker(offset_window=3)
+    tracker.expect_clock('gw')
+    assert tracker.to_server_time('gw', 100.0) is None
+    tracker.add_clock_sample('gw', 0.5, 0.02)
+    tracker.add_clock_sample('gw', 0.2, 0.001)
+    tracker.add_clock_sample('gw', 0.9, 0.05)
+    assert tracker.offset('gw') == 0.2 and tracker.rtt('gw') == 0.001
+    tracker.set_clock_source('sensor', 'gw')
+    assert tracker.to_server_time('sensor', 100.0) == pytest.approx(99.8)
+    # 最快的一次往返移出窗口后换用剩余样本中最快的
+    tracker.add_clock_sample('gw', 0.7, 0.04)
+    tracker.add_clock_sample('gw', 0.6, 0.03)
+    assert tracker.offset('gw') == 0.6
@@ -0,0 +1,64 @@
+import socket
+import time
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from common.protocol import Protocol, FrameDecoder, BinaryCodec
+from client.spool import SampleSpool
+from client.client import ServerLink
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('等待超时')
+        time.sleep(0.01)
+
+@pytest.fixture
+def link():
+    client, server = socket.socketpair()
+    spool = SampleSpool(None, capacity=100)
+    received = []
+    link = ServerLink(client, FrameDecoder(), spool, lambda message, arrived: received.append(message))
+    link.start()
+    yield link, server, spool, received
+    link.close()
+    server.close()
+
+def _read(sock, decoder):
+    messages = []
+    while not messages:
+        messages = decoder.feed(sock.recv(65536))
+    return messages
+
+def test_backfill_is_consumed_only_after_ack(link):
+    link, server, spool, received = link
+    spool.append([(float(t), 20.0, 50.0) for t in range(10)])
+    sequence, records = spool.peek(4)
+    assert link.send(BinaryCodec(1).backfill(records, sequence), backfill=(sequence, 4))
+    (message,) = _read(server, FrameDecoder())
+    assert message['sequence'] == 0 and len(Protocol.backfill_samples(message)) == 4
+    assert link.backfill_pending and len(spool) == 10
+
+    server.sendall(Protocol.create_heartbeat_ack(1.0, 2.0) + Protocol.create_backfill_ack(sequence, 4))
+    _wait(lambda: not link.backfill_pending)
+    assert len(spool) == 6 and spool.peek(1)[0] == 4
+    _wait(lambda: received)
+    assert received[0]['type'] == 'heartbeat_ack'
+
+def test_lost_connection_spools_unsent_samples(link):
+    link, server, spool, _ = link
+    server.close()
+    _wait(link.lost.is_set)
+    samples = [(1.0, 20.0, 50.0), (2.0, 21.0, 50.0)]
+    assert not link.send(b'frame', samples)
+    assert len(spool) == 2
+    assert link.error
+
+def test_invalid_server_message_marks_link_lost(link):
+    link, server, _, _ = link
+    server.sendall(Protocol.frame(b'\xb5\xff'))
+    _wait(link.lost.is_set)
+    assert '接收消息错误' in link.error
@@ -0,0 +1,55 @@
+import logging
+
+from common.logbuffer import LogBuffer
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_repeats_are_suppressed_and_summarized():
+    clock = FakeClock()
+    buffer = LogBuffer(capacity=100, suppress_window=10, clock=clock)
+    assert buffer.log('连接失败', logging.WARNING)
+    for _ in range(5):
+        clock.now += 1
+        assert not buffer.log('连接失败', logging.WARNING)
+    # 级别不同的相同内容不去重
+    assert buffer.log('连接失败', logging.INFO)
+    clock.now += 10
+    messages = [record.message for record in buffer.drain()]
+    assert messages == ['连接失败', '连接失败', '连接失败（10秒内重复 5 次）']
+    assert buffer.suppressed == 5
+    assert buffer.drain() == []
+
+def test_dedupe_table_is_bounded():
+    clock = FakeClock()
+    buffer = LogBuffer(capacity=10, suppress_window=10, clock=clock)
+    buffer.log('a')
+    buffer.log('a')
+    clock.now += 2
+    for i in range(10):
+        buffer.log(f'message {i}')
+    assert len(buffer._recent) == 10
+    # 提前结束的窗口按实际经过的时间补记
+    assert any(record.message == 'a（2秒内重复 1 次）' for record in buffer.records())
+
+def test_records_are_bounded_and_filtered():
+    buffer = LogBuffer(capacity=5, suppress_window=0)
+    for i in range(8):
+        buffer.log(f'info {i}')
+    buffer.log('error', logging.ERROR)
+    assert len(buffer.records()) == 5
+    assert [record.message for record in buffer.records(logging.WARNING)] == ['error']
+    assert buffer.dropped == 4
+    assert buffer.records()[-1].format().endswith('error [错误]')
+
+def test_file_sink(tmp_path):
+    path = tmp_path / 'client.log'
+    buffer = LogBuffer(suppress_window=0)
+    buffer.add_file_sink(str(path))
+    buffer.log('已连接')
+    buffer.close()
+    assert '已连接' in path.read_text(encoding='utf-8')
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from server.metrics import MetricsRegistry, bucket_quantile
+
+def _run_threads(target, count):
+    for _ in range(count):
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+
+def test_dead_thread_cells_are_folded_without_reads():
+    registry = MetricsRegistry('test_')
+    counter = registry.counter('requests_total', '请求数')
+    histogram = registry.histogram('request_seconds', '请求耗时', {'path': '/query'})
+
+    def request():
+        counter.inc()
+        histogram.observe(0.002)
+
+    _run_threads(request, 500)
+    # 只有新建单元时回收，期间没有读取
+    assert len(counter._cells._cells) <= 1
+    assert len(histogram._cells._cells) <= 1
+    assert counter.value == 500
+    assert histogram.count == 500
+    assert histogram.snapshot()[1] == pytest.approx(1.0)
+
+def test_concurrent_increments_are_not_lost():
+    counter = MetricsRegistry().counter('c', 'c')
+    barrier = threading.Barrier(8)
+
+    def work():
+        barrier.wait()
+        for _ in range(10000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value == 80000
+
+def test_render_and_registration():
+    registry = MetricsRegistry('sensor_')
+    registry.counter('frames_total', '帧数', {'type': 'data'}).inc(3)
+    assert registry.counter('frames_total', '帧数', {'type': 'data'}).value == 3
+    registry.gauge('queue', '队列长度', func=lambda: 7)
+    with pytest.raises(ValueError):
+        registry.gauge('frames_total', '帧数', {'type': 'data'})
+    text = registry.render()
+    assert '# TYPE sensor_frames_total counter' in text
+    assert 'sensor_frames_total{type="data"} 3' in text
+    assert 'sensor_queue 7' in text
+
+def test_bucket_quantile_interpolates():
+    assert bucket_quantile((1.0, 2.0), (0, 10, 0), 0.5) == pytest.approx(1.5)
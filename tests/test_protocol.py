@@ -0,0 +1,77 @@
+import base64
+import json
+import zlib
+
+import pytest
+
+from common.protocol import (Protocol, FrameDecoder, JsonCodec, BinaryCodec, BINARY_SAMPLE,
+                             MAX_BATCH_SIZE, MAX_BACKFILL_SIZE, CODEC_BINARY, CODEC_JSON)
+
+SAMPLES = [(1000.0 + i, 20.5 + i, 50.25) for i in range(5)]
+
+def _decode(frames):
+    return FrameDecoder().feed(b''.join(frames))
+
+def test_decoder_handles_split_and_merged_frames():
+    frames = [Protocol.create_heartbeat_message('a'), Protocol.create_data_batch_message('a', SAMPLES),
+              BinaryCodec(7).data_batch(SAMPLES)]
+    stream = b''.join(frames)
+    decoder = FrameDecoder()
+    messages = []
+    for i in range(0, len(stream), 3):
+        messages += decoder.feed(stream[i:i + 3])
+    assert [message['type'] for message in messages] == ['heartbeat', 'data_batch', 'data_batch']
+    assert decoder.pending() == 0
+    assert decoder.feed(frames[0][:5]) == [] and decoder.pending() == 5
+
+def test_decoder_rejects_oversized_frame():
+    with pytest.raises(ValueError, match='超出限制'):
+        FrameDecoder(max_frame_size=16).feed(Protocol.create_data_batch_message('a', SAMPLES))
+
+@pytest.mark.parametrize('codec', [JsonCodec('a'), BinaryCodec(7)])
+def test_codecs_round_trip(codec):
+    batch, heartbeat, disconnect = _decode([codec.data_batch(SAMPLES), codec.heartbeat((0.5, 0.01)),
+                                            codec.disconnect()])
+    assert [tuple(sample) for sample in batch['samples']] == SAMPLES
+    assert heartbeat['type'] == 'heartbeat' and heartbeat['clock_offset'] == 0.5
+    assert disconnect['type'] == 'disconnect'
+    (data,) = _decode([codec.data({'temperature': 21.5, 'humidity': 40.0})])
+    assert data['type'] == 'data' and data['data'] == {'temperature': 21.5, 'humidity': 40.0}
+
+def test_binary_messages_carry_session():
+    codec = BinaryCodec(42)
+    (message,) = _decode([codec.data_multi([('s1', 1, SAMPLES[:2]), ('s2', 2, SAMPLES[2:])])])
+    assert message['session'] == 42
+    assert message['groups'] == [(1, SAMPLES[:2]), (2, SAMPLES[2:])]
+    with pytest.raises(ValueError):
+        codec.data_batch(SAMPLES * (MAX_BATCH_SIZE // len(SAMPLES) + 1))
+
+@pytest.mark.parametrize('codec', [JsonCodec('a'), BinaryCodec(7)])
+def test_backfill_round_trip(codec):
+    records = b''.join(BINARY_SAMPLE.pack(*sample) for sample in SAMPLES)
+    (message,) = _decode([codec.backfill(records, 123)])
+    assert message['type'] == 'backfill' and message['sequence'] == 123
+    assert Protocol.backfill_samples(message) == SAMPLES
+    (ack,) = _decode([Protocol.create_backfill_ack(123, 5)])
+    assert (ack['type'], ack['sequence'], ack['count']) == ('backfill_ack', 123, 5)
+
+def test_backfill_rejects_inflated_payload():
+    records = b''.join(BINARY_SAMPLE.pack(*sample) for sample in SAMPLES)
+    with pytest.raises(ValueError, match='长度与样本数不符'):
+        Protocol.unpack_backfill(zlib.compress(records * 2), len(SAMPLES))
+    with pytest.raises(ValueError, match='超出限制'):
+        Protocol.unpack_backfill(zlib.compress(records), MAX_BACKFILL_SIZE + 1)
+    with pytest.raises(ValueError, match='解压失败'):
+        Protocol.unpack_backfill(b'not zlib', len(SAMPLES))
+    message = json.loads(Protocol.create_backfill_message('a', records, 0)[4:])
+    message['records'] = base64.b64encode(b'garbage').decode('ascii')
+    with pytest.raises(ValueError):
+        Protocol.backfill_samples(message)
+
+def test_codec_negotiation():
+    assert Protocol.negotiate_codec(None) == CODEC_JSON
+    assert Protocol.negotiate_codec(['msgpack', CODEC_BINARY]) == CODEC_BINARY
+    assert isinstance(Protocol.create_codec(CODEC_BINARY, 'a', 3), BinaryCodec)
+    assert isinstance(Protocol.create_codec(CODEC_BINARY, 'a'), JsonCodec)
+    (response,) = _decode([Protocol.create_connect_response(True, 'ok')])
+    assert response == {'type': 'connect_response', 'success': True, 'message': 'ok'}
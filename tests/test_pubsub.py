@@ -0,0 +1,72 @@
+import socket
+
+import pytest
+
+from common.protocol import Protocol, FrameDecoder
+from server.pubsub import PubSubHub, Subscriber, POLICY_CONFLATE
+
+SAMPLES = [(1000.0, 20.5, 50.0), (1001.0, 21.0, 51.0)]
+
+@pytest.fixture
+def hub():
+    hub = PubSubHub()
+    hub.start('127.0.0.1', 0)
+    yield hub
+    hub.stop()
+
+class Connection:
+    def __init__(self, address):
+        self.socket = socket.create_connection(address, timeout=5)
+        self.decoder = FrameDecoder()
+        self.messages = []
+
+    def send(self, message):
+        self.socket.sendall(Protocol.pack_message(message))
+
+    def receive(self):
+        while not self.messages:
+            self.messages += self.decoder.feed(self.socket.recv(65536))
+        return self.messages.pop(0)
+
+def test_subscribers_receive_matching_samples(hub):
+    lab = Connection(hub.address())
+    lab.send({'type': 'subscribe', 'clients': 'lab-*', 'channels': ['humidity']})
+    assert lab.receive()['success'] is True
+    everything = Connection(hub.address())
+    everything.send({'type': 'subscribe'})
+    assert everything.receive()['success'] is True
+
+    hub.publish('office-1', SAMPLES[:1])
+    hub.publish('lab-1', SAMPLES)
+    assert lab.receive() == {'type': 'samples', 'client_id': 'lab-1', 'channels': ['humidity'],
+                             'samples': [[1000.0, 50.0], [1001.0, 51.0]]}
+    assert everything.receive()['client_id'] == 'office-1'
+    assert everything.receive()['samples'] == [list(sample) for sample in SAMPLES]
+
+@pytest.mark.parametrize('request_fields', [
+    {'clients': 5},
+    {'channels': 'temperature'},
+    {'channels': ['pressure']},
+    {'policy': 'latest'},
+    {'queue_size': 0},
+])
+def test_invalid_subscribe_is_rejected(hub, request_fields):
+    connection = Connection(hub.address())
+    connection.send(dict({'type': 'subscribe'}, **request_fields))
+    response = connection.receive()
+    assert response['type'] == 'subscribe_response' and response['success'] is False
+    assert hub.subscribers == []
+    hub.publish('c', SAMPLES)
+
+def test_queue_policies():
+    drop = Subscriber(None, '*', ['temperature'], queue_size=2)
+    for i in range(5):
+        drop.offer('c', b'%d' % i)
+    assert drop.drain() == [b'3', b'4'] and drop.dropped == 3
+
+    conflate = Subscriber(None, '*', ['temperature'], POLICY_CONFLATE, queue_size=2)
+    for client_id, frame in (('a', b'a1'), ('b', b'b1'), ('a', b'a2'), ('c', b'c1')):
+        conflate.offer(client_id, frame)
+    # a 的旧消息被替换，之后最久未更新的 b 被挤出
+    assert conflate.drain() == [b'a2', b'c1'] and conflate.dropped == 2
+    assert len(conflate) == 0 and conflate.delivered == 2
@@ -0,0 +1,106 @@
+import json
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from server.store import SampleStore
+from server.persist import SegmentStore
+from server.retention import RetentionManager
+from server.query import QueryService, QueryServer, QueryError, CHUNK_ROWS
+
+def _service(persist=None):
+    store = SampleStore(10000)
+    retention = RetentionManager(store, tiers=((60, 86400),), persist=persist)
+    timestamps = 1_000_000.0 + np.arange(5000)
+    samples = [(float(t), 20.0 + (t % 7), 50.0) for t in timestamps]
+    for client_id in ('a', 'b'):
+        store.append(client_id, samples)
+        retention.update(client_id, samples, 0)
+        if persist is not None:
+            persist.append(client_id, samples)
+    return QueryService(store, retention, persist)
+
+def _rows(chunks):
+    return [json.loads(line) for chunk in chunks for line in chunk.decode('utf-8').splitlines()]
+
+@pytest.mark.parametrize('params, message', [
+    ({'start': ['x']}, '不是数字'),
+    ({'start': ['nan']}, '不是有限数'),
+    ({'limit': ['inf']}, '不是有限数'),
+    ({'resolution': ['1e400']}, '不是有限数'),
+    ({'limit': ['-1']}, '不能为负数'),
+    ({'channels': ['temperature,pressure']}, '未知的通道'),
+])
+def test_parse_errors(params, message):
+    with pytest.raises(QueryError, match=message):
+        _service().parse(params)
+
+def test_parse_defaults():
+    query = _service().parse({'start': ['-inf'], 'channels': ['humidity']})
+    assert query.client_ids == ['a', 'b']
+    assert query.start == -np.inf and query.stop == np.inf
+    assert query.channels == ('humidity',)
+    assert query.resolution is None and query.limit is None
+
+def test_raw_query_is_chunked_and_limited():
+    service = _service()
+    chunks = list(service.run(service.parse({'clients': ['b'], 'start': ['1000100'],
+                                             'end': ['1004600']})))
+    assert len(chunks) == -(-4500 // CHUNK_ROWS)
+    rows = _rows(chunks)
+    assert len(rows) == 4500
+    assert rows[0] == {'client_id': 'b', 'timestamp': 1000100.0, 'temperature': 20.0 + 1000100 % 7,
+                       'humidity': 50.0}
+    rows = _rows(service.run(service.parse({'limit': ['7000'], 'channels': ['temperature']})))
+    assert len(rows) == 7000
+    assert [row['client_id'] for row in rows[4999:5001]] == ['a', 'b']
+    assert 'humidity' not in rows[0]
+
+def test_raw_query_reads_persisted_segments(tmp_path):
+    service = _service(SegmentStore(str(tmp_path), segment_capacity=1000))
+    rows = _rows(service.run(service.parse({'clients': ['a'], 'start': ['1000990'],
+                                            'end': ['1001010']})))
+    assert [row['timestamp'] for row in rows] == [1000990.0 + i for i in range(20)]
+
+def test_rollup_query_uses_coarsest_tier():
+    service = _service()
+    query = service.parse({'clients': ['a'], 'resolution': ['300']})
+    assert service.tier_for(query.resolution) == 60
+    rows = _rows(service.run(query))
+    assert sum(row['count'] for row in rows) == 5000
+    assert all(set(row['temperature']) == {'min', 'max', 'mean'} for row in rows)
+    assert service.tier_for(30) is None
+
+@pytest.fixture
+def server():
+    service = _service()
+    query_server = QueryServer(service)
+
+    def broken(params):
+        raise RuntimeError('boom')
+
+    query_server.add_route('/broken', broken)
+    query_server.start('127.0.0.1', 0)
+    yield 'http://%s:%d' % query_server.address()
+    query_server.stop()
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def test_http_routes(server):
+    status, body = _get(server + '/query?clients=a&limit=3')
+    assert status == 200
+    assert len(_rows([body])) == 3
+    status, body = _get(server + '/query?limit=nan')
+    assert status == 400 and '不是有限数' in json.loads(body)['error']
+    assert _get(server + '/missing')[0] == 404
+    status, body = _get(server + '/broken')
+    assert status == 500 and 'boom' in json.loads(body)['error']
+    status, body = _get(server + '/clients')
+    assert [row['client_id'] for row in _rows([body])] == ['a', 'b']
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from server.store import SampleStore
+from server.retention import RollupSeries, RetentionManager, rollup_points
+
+FIELDS = ('temperature_min', 'temperature_max', 'temperature_mean',
+          'humidity_min', 'humidity_max', 'humidity_mean')
+
+def _columns(timestamps, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    return (timestamps, rng.uniform(15, 30, len(timestamps)).astype(np.float32),
+            rng.uniform(30, 80, len(timestamps)).astype(np.float32))
+
+def _assert_same(records, expected):
+    np.testing.assert_array_equal(records['start'], expected['start'])
+    np.testing.assert_array_equal(records['first_index'], expected['first_index'])
+    np.testing.assert_array_equal(records['count'], expected['count'])
+    for field in FIELDS:
+        np.testing.assert_allclose(records[field], expected[field], rtol=1e-5)
+
+def test_add_and_add_array_agree():
+    timestamps, temperature, humidity = _columns(1000.0 + np.arange(0, 600, 0.7))
+    single = RollupSeries(60, 86400)
+    for i, sample in enumerate(zip(timestamps, temperature, humidity)):
+        single.add(*map(float, sample), i)
+    batch = RollupSeries(60, 86400)
+    for start in range(0, len(timestamps), 97):
+        batch.add_array(timestamps[start:start + 97], temperature[start:start + 97],
+                        humidity[start:start + 97], start)
+    _assert_same(batch.records(), single.records())
+    assert batch.records()['count'].sum() == len(timestamps)
+
+def test_merge_array_matches_rollup_of_merged_samples():
+    timestamps, temperature, humidity = _columns(np.arange(0, 3600, 1.0))
+    # 去掉若干段样本，之后作为补传合并：有的落在已有桶中，有的整桶缺失
+    missing = ((timestamps >= 600) & (timestamps < 780)) | ((timestamps >= 1500) & (timestamps < 1530))
+    rollup = RollupSeries(60, 86400)
+    rollup.add_array(timestamps[~missing], temperature[~missing], humidity[~missing], 0)
+    rollup.merge_array(timestamps[missing][::-1], temperature[missing][::-1], humidity[missing][::-1])
+
+    expected = RollupSeries(60, 86400)
+    expected.add_array(timestamps, temperature, humidity, 0)
+    _assert_same(rollup.records(), expected.records())
+
+def test_merge_array_into_empty_series():
+    rollup = RollupSeries(60, 86400)
+    rollup.merge_array(*_columns([130.0, 10.0, 70.0]))
+    records = rollup.records()
+    assert records['start'].tolist() == [0.0, 60.0, 120.0]
+    assert records['first_index'].tolist() == [0, 1, 2]
+
+def test_evict_and_snapshot_restore():
+    rollup = RollupSeries(60, 600)
+    rollup.add_array(*_columns(np.arange(0, 3600, 10.0)), 0)
+    assert len(rollup) <= rollup.capacity + 1
+    assert rollup.evict_before(3000) > 0
+    assert rollup.records()['start'][0] >= 3000
+    restored = RollupSeries(60, 600)
+    restored.restore(rollup.snapshot())
+    _assert_same(restored.records(), rollup.records())
+
+def test_manager_evicts_raw_samples_and_merges_backfill():
+    store = SampleStore(100000)
+    manager = RetentionManager(store, raw_retention=600, tiers=((60, 3600), (600, 86400)))
+    samples = [(float(t), 20.0, 50.0) for t in range(0, 1200)]
+    store.append('c', samples)
+    manager.update('c', samples, 0)
+    assert store.get('c').view().timestamps[0] >= 1199 - 600
+    assert manager.tier('c', 600).records()['count'].sum() == 1200
+    manager.merge('c', *_columns([30.5, 31.5]))
+    assert manager.tier('c', 60).records()['count'].sum() == 1202
+    assert manager.tier('c', 5) is None
+    assert manager.select('c', 0, 1200, 10).resolution == 60
+
+def test_rollup_points_merge_records_per_pixel():
+    rollup = RollupSeries(60, 86400)
+    rollup.add_array(*_columns(np.arange(0, 6000, 1.0)), 0)
+    x, y = rollup_points(rollup.records(), 'temperature', 10)
+    assert len(x) == 20
+    records = rollup.records()
+    assert y.max() == pytest.approx(records['temperature_max'].max())
+    assert x[0] == 0 and x[-1] == 5999
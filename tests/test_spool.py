@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+from client.spool import SampleSpool, HEADER_SIZE
+from client.sensor import SAMPLE_DTYPE
+
+def _samples(start, count):
+    return [(float(t), 20.0 + t % 10, 50.0) for t in range(start, start + count)]
+
+def _timestamps(data):
+    return np.frombuffer(data, dtype=SAMPLE_DTYPE)['timestamp'].tolist()
+
+def test_wraparound_overwrites_oldest():
+    spool = SampleSpool(None, capacity=10)
+    spool.append(_samples(0, 7))
+    spool.consume(*spool.peek(5)[:1], 5)
+    spool.append(_samples(7, 10))
+    # 写满后丢弃最早的样本，读取跨越缓冲区末尾
+    assert len(spool) == 10
+    assert spool.dropped == 2
+    sequence, data = spool.peek(100)
+    assert sequence == 7
+    assert _timestamps(data) == list(range(7, 17))
+
+def test_consume_only_removes_acknowledged_prefix():
+    spool = SampleSpool(None, capacity=10)
+    spool.append(_samples(0, 6))
+    sequence, data = spool.peek(4)
+    assert (sequence, _timestamps(data)) == (0, [0.0, 1.0, 2.0, 3.0])
+    # 确认之前 peek 不删除样本
+    assert len(spool) == 6
+    spool.append(_samples(6, 8))
+    # 待确认的样本已被覆盖一部分：只删除仍在缓存中的部分
+    spool.consume(sequence, 4)
+    assert len(spool) == 10
+    assert spool.peek(1)[0] == 4
+    # 重复的确认不再删除任何样本
+    spool.consume(sequence, 4)
+    assert len(spool) == 10
+    spool.consume(4, 10)
+    assert len(spool) == 0
+    assert spool.peek(10)[1] == b''
+
+def test_file_survives_reopen(tmp_path):
+    path = str(tmp_path / 'a' / 'c.spool')
+    spool = SampleSpool(path, capacity=8)
+    spool.append(_samples(0, 12))
+    spool.consume(4, 2)
+    spool.close()
+
+    spool = SampleSpool(path, capacity=100)
+    assert spool.capacity == 8
+    assert len(spool) == 6 and spool.dropped == 4
+    assert _timestamps(spool.peek(10)[1]) == list(range(6, 12))
+
+def test_invalid_file_is_recreated(tmp_path):
+    path = str(tmp_path / 'c.spool')
+    SampleSpool(path, capacity=8).close()
+    with open(path, 'r+b') as f:
+        f.truncate(HEADER_SIZE + 3 * SAMPLE_DTYPE.itemsize)
+    spool = SampleSpool(path, capacity=8)
+    assert len(spool) == 0
+    assert os.path.getsize(path) == HEADER_SIZE + 8 * SAMPLE_DTYPE.itemsize
+    spool.append(_samples(0, 8))
+    spool.close()
+
+    with open(path, 'wb') as f:
+        f.write(b'garbage')
+    spool = SampleSpool(path, capacity=4)
+    assert spool.capacity == 4 and len(spool) == 0
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from server.stats import StatsEngine, RollingWindow
+
+def _samples(values, start=1000.0, step=0.1):
+    return [(start + i * step, float(value), 50.0) for i, value in enumerate(values)]
+
+def test_summary_matches_numpy():
+    rng = np.random.default_rng(3)
+    values = rng.normal(22, 0.4, 600)
+    engine = StatsEngine(windows=(60,))
+    engine.update('c', _samples(values))
+    stats = engine.summary('c', 60, now=1060.0)['temperature']
+    assert stats.count == 600
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.stddev == pytest.approx(values.std(), rel=1e-3)
+    assert (stats.min, stats.max) == (pytest.approx(values.min()), pytest.approx(values.max()))
+    assert stats.p50 == pytest.approx(np.median(values), abs=0.1)
+    assert stats.p95 == pytest.approx(np.percentile(values, 95), abs=0.15)
+    assert type(stats.p50) is float
+
+def test_single_and_batch_updates_agree():
+    values = np.linspace(10, 30, 200)
+    single = StatsEngine(windows=(60,))
+    for sample in _samples(values):
+        single.update('c', [sample])
+    batch = StatsEngine(windows=(60,))
+    batch.update('c', _samples(values))
+    a = single.summary('c', 60, now=1020.0)['temperature']
+    b = batch.summary('c', 60, now=1020.0)['temperature']
+    assert (a.count, a.min, a.max) == (b.count, b.min, b.max)
+    assert a.mean == pytest.approx(b.mean)
+    assert a.stddev == pytest.approx(b.stddev)
+
+def test_old_buckets_leave_the_window():
+    engine = StatsEngine(windows=(60,), buckets=6)
+    engine.update('c', _samples([100.0] * 10, start=1000.0))
+    engine.update('c', _samples([20.0] * 10, start=1100.0))
+    stats = engine.summary('c', 60, now=1101.0)['temperature']
+    assert stats.count == 10 and stats.max == 20.0
+    assert engine.summary('c', 60, now=2000.0)['temperature'].count == 0
+
+def test_unknown_window_and_client():
+    engine = StatsEngine(windows=(60,))
+    assert engine.summary('missing', 60) is None
+    with pytest.raises(ValueError):
+        engine.summary('missing', 61)
+    engine.update('c', _samples([1.0]))
+    engine.remove('c')
+    assert engine.client_ids() == []
+
+def test_reservoir_memory_is_bounded():
+    window = RollingWindow(60, buckets=6, reservoir=16)
+    timestamps = 1000.0 + np.arange(100000) * 0.0005
+    window.add_array(timestamps, np.sin(np.arange(100000)))
+    assert window.result(1050.0).count == 100000
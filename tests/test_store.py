@@ -0,0 +1,56 @@
+import numpy as np
+
+from server.store import SampleSeries, SampleStore
+
+def _fill(series, timestamps, value=20.0):
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    series.extend_arrays(timestamps, np.full(len(timestamps), value), np.full(len(timestamps), 50.0))
+
+def test_views_survive_later_writes():
+    series = SampleSeries(capacity=100, slack=0.1)
+    _fill(series, np.arange(100))
+    view = series.view()
+    _fill(series, np.arange(100, 250), 30.0)
+    np.testing.assert_array_equal(view.timestamps, np.arange(100))
+    assert np.all(view.temperature == 20.0)
+    assert len(series) == 100 and series.total == 250
+    latest = series.view()
+    assert latest.first_index == 150
+    np.testing.assert_array_equal(latest.timestamps, np.arange(150, 250))
+
+def test_view_by_time_and_index():
+    series = SampleSeries(capacity=1000)
+    _fill(series, np.arange(0, 500, 0.5))
+    assert len(series.view_by_time(10, 20)) == 20
+    assert series.view_by_time(10, 20).first_index == 20
+    view = series.view_by_index(990, 2000)
+    assert view.first_index == 990 and len(view) == 10
+    assert len(series.view_by_index(-5, 3)) == 3
+
+def test_merge_inserts_late_samples_in_order():
+    series = SampleSeries(capacity=10)
+    _fill(series, [1, 2, 4, 5])
+    before = series.view()
+    series.merge(np.array([6.0, 3.0, 2.0]), np.full(3, 99.0), np.full(3, 50.0))
+    view = series.view()
+    assert view.timestamps.tolist() == [1, 2, 2, 3, 4, 5, 6]
+    # 与已有样本时间戳相同时排在其后
+    assert view.temperature.tolist() == [20, 20, 99, 99, 20, 20, 99]
+    assert series.total == 7 and series.generation == 1
+    assert before.timestamps.tolist() == [1, 2, 4, 5]
+
+def test_merge_keeps_capacity_and_evict_before():
+    series = SampleSeries(capacity=5)
+    _fill(series, [10, 20, 30, 40, 50])
+    series.merge(np.array([15.0, 25.0]), np.zeros(2), np.zeros(2))
+    assert series.view().timestamps.tolist() == [20, 25, 30, 40, 50]
+    assert series.evict_before(35) == 3
+    assert series.view().timestamps.tolist() == [40, 50]
+    assert series.latest() == (50.0, 20.0, 50.0)
+
+def test_store_creates_series_on_demand():
+    store = SampleStore(capacity=10)
+    assert store.get('a') is None
+    store.append('a', [(1.0, 20.0, 50.0), (2.0, 21.0, 51.0)])
+    assert store.client_ids() == ['a']
+    assert store.get('a').latest() == (2.0, 21.0, 51.0)
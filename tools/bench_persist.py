@@ -0,0 +1,62 @@
+"""样本持久化的性能测试
+
+比较只保存在内存中和同时写入段文件时的接入吞吐量，并测量重新打开存储的耗时。
+
+用法：python tools/bench_persist.py [--clients 100] [--samples 20000] [--batch 20]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.core import ServerCore
+from server.persist import SegmentStore
+
+def ingest(core: ServerCore, clients: int, samples: int, batch: int) -> float:
+    """按批写入样本，返回每秒样本数"""
+    batches = [[(1.0e9 + i + j, 20.0 + (j % 10) * 0.1, 50.0) for j in range(batch)]
+               for i in range(0, samples, batch)]
+    started = time.perf_counter()
+    for index, samples_batch in enumerate(batches):
+        for client in range(clients):
+            core._ingest(f'client-{client}', samples_batch)
+    elapsed = time.perf_counter() - started
+    return clients * len(batches) * batch / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='样本持久化性能测试')
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--samples', type=int, default=20000, help='每个客户端的样本数')
+    parser.add_argument('--batch', type=int, default=20, help='每批样本数，1 表示逐个写入')
+    parser.add_argument('--data-dir', help='段文件目录，默认使用临时目录并在结束后删除')
+    args = parser.parse_args()
+
+    memory_rate = ingest(ServerCore(), args.clients, args.samples, args.batch)
+    print(f'仅内存：{memory_rate:,.0f} 样本/秒')
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='bench_persist_')
+    try:
+        core = ServerCore(data_dir=data_dir)
+        persist_rate = ingest(core, args.clients, args.samples, args.batch)
+        core.persist.close()
+        print(f'写入段文件：{persist_rate:,.0f} 样本/秒（{persist_rate / memory_rate:.0%}）')
+
+        started = time.perf_counter()
+        store = SegmentStore(data_dir)
+        opened = time.perf_counter() - started
+        segments = sum(len(store.get(client_id).segments) for client_id in store.client_ids())
+        print(f'重新打开 {len(store):,} 个样本（{segments} 个段）：{opened * 1000:.1f} 毫秒')
+
+        started = time.perf_counter()
+        ServerCore(data_dir=data_dir)
+        print(f'启动并恢复内存历史：{(time.perf_counter() - started) * 1000:.1f} 毫秒')
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""订阅分发的吞吐量测试
+
+启动订阅服务并连接多个订阅者，在发布线程中连续发布样本，统计发布耗时
+（即对接入路径的影响）和订阅者实际收到的消息速率。部分订阅者可设置为不读取，
+用来观察慢订阅者的丢弃/合并策略。
+
+用法：python tools/bench_pubsub.py [--subscribers 100] [--batches 20000] [--slow 10]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.pubsub import PubSubHub, POLICIES, POLICY_DROP_OLDEST
+from common.protocol import Protocol, FRAME_HEADER
+
+def subscribe(address, policy: str, queue_size: int) -> socket.socket:
+    sock = socket.create_connection(address)
+    sock.sendall(Protocol.pack_message({'type': 'subscribe', 'clients': '*', 'policy': policy,
+                                        'queue_size': queue_size}))
+    return sock
+
+def reader(sock: socket.socket, counts: list, index: int, stop: threading.Event):
+    """统计收到的帧数"""
+    buffer = bytearray()
+    sock.settimeout(0.2)
+    while not stop.is_set():
+        try:
+            data = sock.recv(1 << 20)
+        except socket.timeout:
+            continue
+        if not data:
+            break
+        buffer.extend(data)
+        offset = 0
+        while len(buffer) - offset >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(buffer, offset)
+            if len(buffer) - offset < FRAME_HEADER.size + length:
+                break
+            offset += FRAME_HEADER.size + length
+            counts[index] += 1
+        del buffer[:offset]
+
+def main():
+    parser = argparse.ArgumentParser(description='订阅分发吞吐量测试')
+    parser.add_argument('--subscribers', type=int, default=100)
+    parser.add_argument('--slow', type=int, default=0, help='其中不读取数据的订阅者数')
+    parser.add_argument('--batches', type=int, default=20000, help='发布的批数')
+    parser.add_argument('--batch-size', type=int, default=1, help='每批样本数')
+    parser.add_argument('--clients', type=int, default=100, help='发布数据的客户端数')
+    parser.add_argument('--policy', choices=POLICIES, default=POLICY_DROP_OLDEST)
+    parser.add_argument('--queue-size', type=int, default=1024)
+    args = parser.parse_args()
+
+    hub = PubSubHub()
+    hub.start('127.0.0.1', 0)
+    address = hub.address()
+    sockets = [subscribe(address, args.policy, args.queue_size) for _ in range(args.subscribers)]
+    while len(hub.subscribers) < args.subscribers:
+        time.sleep(0.01)
+
+    stop = threading.Event()
+    counts = [0] * args.subscribers
+    # 前 slow 个订阅者只连接不读取
+    threads = [threading.Thread(target=reader, args=(sock, counts, i, stop), daemon=True)
+               for i, sock in enumerate(sockets) if i >= args.slow]
+    for thread in threads:
+        thread.start()
+
+    now = time.time()
+    batch = [(now + i, 20.0 + i * 0.01, 50.0) for i in range(args.batch_size)]
+    started = time.perf_counter()
+    for i in range(args.batches):
+        hub.publish(f'client-{i % args.clients}', batch)
+    publish_time = time.perf_counter() - started
+
+    # 等待快订阅者收完：收到的消息数不再变化即视为结束（conflate 策略下会少于发布数）
+    last = None
+    finished = time.perf_counter()
+    while last != counts[args.slow:]:
+        last = list(counts[args.slow:])
+        finished = time.perf_counter()
+        time.sleep(0.3)
+    total_time = finished - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    fast = counts[args.slow:]
+    delivered = sum(fast) - len(fast)
+    print(f'{args.subscribers} 个订阅者（{args.slow} 个不读取），发布 {args.batches} 批 × {args.batch_size} 个样本')
+    print(f'发布耗时：{publish_time:.2f} 秒，每批 {publish_time / args.batches * 1e6:.1f} 微秒')
+    print(f'分发：{delivered / total_time:,.0f} 条消息/秒（快订阅者最少收到 {min(fast, default=0) - 1} 条）')
+    dropped = sum(subscriber.dropped for subscriber in hub.subscribers)
+    print(f'丢弃/合并：{dropped} 条，队列上限 {args.queue_size}，策略 {args.policy}')
+    for sock in sockets:
+        sock.close()
+    hub.stop()
+
+if __name__ == '__main__':
+    main()
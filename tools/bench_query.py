@@ -0,0 +1,85 @@
+"""历史查询的延迟测试
+
+在持续接入数据的同时并发发起范围查询，统计查询延迟的分位数。
+
+用法：python tools/bench_query.py [--clients 50] [--history 86400] [--workers 4] [--duration 10]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import urllib.request
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.core import ServerCore
+
+def main():
+    parser = argparse.ArgumentParser(description='历史查询延迟测试')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--history', type=int, default=86400, help='每个客户端预先写入的样本数')
+    parser.add_argument('--workers', type=int, default=4, help='并发查询线程数')
+    parser.add_argument('--duration', type=float, default=10, help='测试时长（秒）')
+    parser.add_argument('--span', type=float, default=3600, help='每次查询的时间范围（秒）')
+    parser.add_argument('--ingest-rate', type=int, default=5000, help='测试期间每秒接入的样本数')
+    args = parser.parse_args()
+
+    core = ServerCore(http_listen='127.0.0.1:0', history_capacity=args.history + 100000)
+    now = time.time() - args.history
+    timestamps = now + np.arange(args.history, dtype=np.float64)
+    temperature = 20 + np.sin(timestamps / 600)
+    for client in range(args.clients):
+        core.store.series(f'client-{client}').extend_arrays(timestamps, temperature, temperature + 30)
+    core.start('127.0.0.1:0')
+    host, port = core.query_server.address()
+    stop = threading.Event()
+
+    def ingest():
+        # 逐客户端写入20个样本一批，控制总速率
+        batch = 20
+        interval = batch * args.clients / args.ingest_rate
+        clock = now + args.history
+        while not stop.is_set():
+            started = time.perf_counter()
+            for client in range(args.clients):
+                core._ingest(f'client-{client}', [(clock + i, 20.0, 50.0) for i in range(batch)])
+            clock += batch
+            time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    latencies = []
+    rows = [0]
+
+    def query():
+        rng = random.Random()
+        while not stop.is_set():
+            client = rng.randrange(args.clients)
+            start = now + rng.uniform(0, args.history - args.span)
+            url = (f'http://{host}:{port}/query?clients=client-{client}'
+                   f'&start={start}&end={start + args.span}')
+            started = time.perf_counter()
+            with urllib.request.urlopen(url) as response:
+                data = response.read()
+            latencies.append(time.perf_counter() - started)
+            rows[0] += data.count(b'\n')
+
+    threads = [threading.Thread(target=ingest)] + [threading.Thread(target=query) for _ in range(args.workers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    core.stop()
+
+    samples = np.array(latencies) * 1000
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    print(f'{len(samples)} 次查询，平均每次 {rows[0] / len(samples):.0f} 行，'
+          f'{len(samples) / args.duration:.0f} 次/秒')
+    print(f'延迟（毫秒）：p50 {p50:.1f}  p90 {p90:.1f}  p99 {p99:.1f}  最大 {samples.max():.1f}')
+
+if __name__ == '__main__':
+    main()
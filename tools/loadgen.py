@@ -0,0 +1,355 @@
+"""无界面压力测试客户端
+
+在单个 asyncio 事件循环中模拟大量传感器连接服务器，按设定的采样和心跳频率、
+批量大小上报数据，支持逐步建立连接和随机断线重连，定期输出实际发送速率、
+连接耗时和错误数。指定 --gateway-size 时以网关模式运行，每个连接注册多个传感器，
+用一次心跳和多路数据帧代替每个传感器各自的连接。
+
+用法：python tools/loadgen.py --server 127.0.0.1:5000 --sensors 5000 [--batch-size 10]
+      [--ramp-up 10] [--churn 5] [--duration 60] [--gateway-size 100]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from typing import List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.sensor import SensorArraySimulator
+from common.protocol import (Protocol, FrameDecoder, RECV_BUFFER_SIZE, CODEC_BINARY, CODEC_JSON,
+                             MAX_BATCH_SIZE, MAX_GATEWAY_SENSORS)
+
+# 每个采样周期分成的时间片数，各传感器按序号错开，避免所有连接同时写入
+SLOTS = 100
+# 发送缓冲区超过该字节数时丢弃本批数据并计数，不让内存无限增长
+MAX_WRITE_BUFFER = 1024 * 1024
+# 等待连接响应的最长时间（秒）
+CONNECT_TIMEOUT = 10.0
+
+class Stats:
+    """发送统计，只在事件循环线程中修改"""
+
+    def __init__(self):
+        self.samples = 0
+        self.frames = 0
+        self.bytes = 0
+        self.heartbeats = 0
+        self.connects = 0
+        self.connect_errors = 0
+        self.rejected = 0
+        self.disconnects = 0  # 主动断开（含模拟断线）
+        self.errors = 0  # 发送或接收中出现的连接错误
+        self.dropped = 0  # 发送缓冲区积压而丢弃的样本
+        self.connect_times: List[float] = []
+
+class VirtualSensor:
+    """一个模拟连接：单个传感器，或网关模式下注册多个传感器的网关"""
+
+    def __init__(self, index: int, client_id: str, members: Optional[List[str]] = None,
+                 indices: Optional[List[int]] = None):
+        self.index = index
+        self.client_id = client_id
+        self.members = members  # 网关模式下注册的传感器ID，单个传感器时为 None
+        self.indices = indices if indices is not None else [index]  # 在模拟器中的序号
+        self.handles: List[int] = []  # 网关模式下各传感器的句柄，注册被拒绝的为 -1
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.codec = None
+        self.batch_supported = False
+        self.pending = []
+        self.last_heartbeat = 0.0
+        self.clock = None  # 最近一次心跳往返得到的 (时钟偏差, 往返时间)
+        self.connecting = False
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None
+
+class LoadGenerator:
+    """压力测试客户端"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.host, port = args.server.rsplit(':', 1)
+        self.port = int(port)
+        if args.gateway_size:
+            self.sensors = []
+            for i, start in enumerate(range(0, args.sensors, args.gateway_size)):
+                indices = list(range(start, min(start + args.gateway_size, args.sensors)))
+                self.sensors.append(VirtualSensor(i, f'{args.id_prefix}gw{i:04d}',
+                                                  [f'{args.id_prefix}{j:06d}' for j in indices], indices))
+        else:
+            self.sensors = [VirtualSensor(i, f'{args.id_prefix}{i:06d}') for i in range(args.sensors)]
+        # 所有传感器的读数由一个向量化模拟器产生，每个时间片对该片的在线传感器采样一次
+        self.simulator = SensorArraySimulator(args.sensors, seed=args.seed)
+        self.stats = Stats()
+        self.stopping = False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.started = loop.time()
+        # 在 ramp-up 时间内均匀地建立连接
+        for sensor in self.sensors:
+            delay = self.args.ramp_up * sensor.index / max(1, len(self.sensors))
+            loop.call_later(delay, self._spawn_connect, sensor)
+        tasks = [asyncio.ensure_future(self._sample_loop()), asyncio.ensure_future(self._report_loop())]
+        if self.args.churn > 0:
+            tasks.append(asyncio.ensure_future(self._churn_loop()))
+        await asyncio.sleep(self.args.duration)
+        self.stopping = True
+        for task in tasks:
+            task.cancel()
+        for sensor in self.sensors:
+            if sensor.connected:
+                self._close(sensor, graceful=True)
+        await asyncio.sleep(0.2)
+        self._report(final=True)
+
+    def _spawn_connect(self, sensor: VirtualSensor, delay: float = 0.0):
+        if self.stopping or sensor.connecting or sensor.connected:
+            return
+        sensor.connecting = True
+        asyncio.ensure_future(self._connect(sensor, delay))
+
+    async def _connect(self, sensor: VirtualSensor, delay: float):
+        stats = self.stats
+        if delay:
+            await asyncio.sleep(delay)
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT)
+            writer.write(Protocol.create_connect_message(sensor.client_id, codecs=[self.args.codec],
+                                                         sensors=sensor.members))
+            decoder = FrameDecoder()
+            # 网关模式下连接响应之后还有注册响应
+            expected = 1 if sensor.members is None else 2
+            messages = []
+            while len(messages) < expected:
+                data = await asyncio.wait_for(reader.read(RECV_BUFFER_SIZE), CONNECT_TIMEOUT)
+                if not data:
+                    raise ConnectionError('服务器已关闭连接')
+                messages.extend(decoder.feed(data))
+                if messages and not messages[0].get('success', False):
+                    break
+            response = messages[0]
+        except (OSError, asyncio.TimeoutError, ValueError):
+            sensor.connecting = False
+            stats.connect_errors += 1
+            self._spawn_connect(sensor, self.args.reconnect_delay)
+            return
+        if not response.get('success', False):
+            sensor.connecting = False
+            stats.rejected += 1
+            writer.close()
+            self._spawn_connect(sensor, self.args.reconnect_delay)
+            return
+        stats.connects += 1
+        stats.connect_times.append(time.perf_counter() - started)
+        sensor.reader, sensor.writer = reader, writer
+        sensor.codec = Protocol.create_codec(response.get('codec', CODEC_JSON), sensor.client_id,
+                                             response.get('session'))
+        sensor.batch_supported = 'session' in response
+        if sensor.members is not None:
+            registered = messages[1].get('sensors', {})
+            sensor.handles = [registered.get(member, -1) for member in sensor.members]
+            stats.rejected += len(messages[1].get('rejected', {}))
+        sensor.pending = []
+        sensor.clock = None
+        sensor.last_heartbeat = time.monotonic()
+        sensor.connecting = False
+        asyncio.ensure_future(self._receive(sensor, reader, decoder))
+
+    async def _receive(self, sensor: VirtualSensor, reader: asyncio.StreamReader, decoder: FrameDecoder):
+        """读取服务器消息，处理心跳应答并发现连接关闭"""
+        try:
+            while True:
+                data = await reader.read(RECV_BUFFER_SIZE)
+                if not data:
+                    break
+                arrived = time.time()
+                for message in decoder.feed(data):
+                    if message.get('type') == 'heartbeat_ack':
+                        sensor.clock = Protocol.clock_sample(message, arrived)
+        except (OSError, ValueError):
+            pass
+        if sensor.reader is reader and not self.stopping:
+            # 不是本端主动关闭的连接
+            self.stats.errors += 1
+            self._close(sensor, graceful=False)
+            self._spawn_connect(sensor, self.args.reconnect_delay)
+
+    def _close(self, sensor: VirtualSensor, graceful: bool):
+        writer = sensor.writer
+        sensor.reader = sensor.writer = None
+        if writer is None:
+            return
+        if graceful:
+            try:
+                writer.write(sensor.codec.disconnect())
+            except (OSError, RuntimeError):
+                pass
+            writer.close()
+        else:
+            # 模拟传感器掉电：直接丢弃连接，不发送断开消息
+            writer.transport.abort()
+
+    def _write(self, sensor: VirtualSensor, data: bytes) -> bool:
+        writer = sensor.writer
+        if writer.transport.is_closing():
+            return False
+        if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            return False
+        writer.write(data)
+        self.stats.bytes += len(data)
+        return True
+
+    async def _sample_loop(self):
+        """按时间片轮流为各传感器采样、攒批发送并发送心跳"""
+        args = self.args
+        stats = self.stats
+        interval = args.sample_interval / 1000
+        heartbeat_interval = args.heartbeat_interval / 1000
+        slots = [self.sensors[slot::SLOTS] for slot in range(SLOTS)]
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        slot = 0
+        while True:
+            monotonic = time.monotonic()
+            online = [sensor for sensor in slots[slot] if sensor.connected]
+            samples = self.simulator.samples(
+                select=[index for sensor in online for index in sensor.indices]) if online else []
+            offset = 0
+            for sensor in online:
+                count = len(sensor.indices)
+                if sensor.members is None:
+                    sensor.pending.append(samples[offset])
+                else:
+                    # 网关模式下每项为本轮所有传感器的样本
+                    sensor.pending.append(samples[offset:offset + count])
+                offset += count
+                if len(sensor.pending) >= args.batch_size:
+                    self._flush(sensor)
+                if monotonic - sensor.last_heartbeat >= heartbeat_interval:
+                    sensor.last_heartbeat = monotonic
+                    if self._write(sensor, sensor.codec.heartbeat(sensor.clock)):
+                        stats.heartbeats += 1
+            slot = (slot + 1) % SLOTS
+            next_tick += interval / SLOTS
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+    def _flush(self, sensor: VirtualSensor):
+        samples, sensor.pending = sensor.pending, []
+        if sensor.members is not None:
+            # 按传感器分组，一帧携带网关下所有传感器的样本
+            groups = [(member, handle, series) for member, handle, series
+                      in zip(sensor.members, sensor.handles, zip(*samples)) if handle >= 0]
+            if groups and self._write(sensor, sensor.codec.data_multi(groups)):
+                self.stats.samples += sum(len(series) for _, _, series in groups)
+                self.stats.frames += 1
+            return
+        if len(samples) > 1 and sensor.batch_supported:
+            frame, frames = sensor.codec.data_batch(samples), 1
+        else:
+            frame = b''.join(sensor.codec.data({'temperature': temperature, 'humidity': humidity})
+                             for _, temperature, humidity in samples)
+            frames = len(samples)
+        if self._write(sensor, frame):
+            self.stats.samples += len(samples)
+            self.stats.frames += frames
+        else:
+            self.stats.dropped += len(samples)
+
+    async def _churn_loop(self):
+        """按设定的频率随机断开一个已连接的传感器，稍后重新连接"""
+        args = self.args
+        while True:
+            await asyncio.sleep(random.expovariate(args.churn))
+            connected = [sensor for sensor in random.sample(self.sensors, min(16, len(self.sensors)))
+                         if sensor.connected]
+            if not connected:
+                continue
+            sensor = connected[0]
+            self.stats.disconnects += 1
+            self._close(sensor, graceful=random.random() >= args.churn_abort)
+            self._spawn_connect(sensor, args.reconnect_delay)
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.args.report_interval)
+            self._report()
+
+    def _report(self, final: bool = False):
+        stats = self.stats
+        now = time.monotonic()
+        previous = getattr(self, '_previous', None)
+        self._previous = (now, stats.samples, stats.frames, stats.bytes)
+        if final:
+            elapsed = self.args.duration
+            samples, frames, sent = stats.samples, stats.frames, stats.bytes
+        elif previous is None:
+            return
+        else:
+            elapsed = now - previous[0]
+            samples, frames, sent = (stats.samples - previous[1], stats.frames - previous[2],
+                                     stats.bytes - previous[3])
+        connected = sum(1 for sensor in self.sensors if sensor.connected)
+        prefix = '总计' if final else time.strftime('%H:%M:%S')
+        print(f'{prefix} 在线 {connected}/{len(self.sensors)}  样本 {samples / elapsed:,.0f}/秒  '
+              f'帧 {frames / elapsed:,.0f}/秒  {sent / elapsed / 1e6:.2f} MB/秒  '
+              f'连接 {stats.connects} 失败 {stats.connect_errors} 拒绝 {stats.rejected} '
+              f'断线 {stats.disconnects} 错误 {stats.errors} 丢弃 {stats.dropped}', flush=True)
+        if final and stats.connect_times:
+            times = np.array(stats.connect_times) * 1000
+            p50, p99 = np.percentile(times, [50, 99])
+            print(f'连接耗时（毫秒）：p50 {p50:.1f}  p99 {p99:.1f}  最大 {times.max():.1f}  '
+                  f'心跳 {stats.heartbeats}')
+
+def raise_open_file_limit():
+    """把可打开文件数的软限制提高到硬限制，每个连接占用一个文件描述符"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def main():
+    parser = argparse.ArgumentParser(description='无界面压力测试客户端')
+    parser.add_argument('--server', default='127.0.0.1:5000', help='服务器地址（host:port）')
+    parser.add_argument('--sensors', type=int, default=1000, help='模拟的传感器数')
+    parser.add_argument('--sample-interval', type=float, default=1000, help='采样间隔（毫秒）')
+    parser.add_argument('--heartbeat-interval', type=float, default=3000, help='心跳间隔（毫秒）')
+    parser.add_argument('--batch-size', type=int, default=1, help='每个数据帧携带的样本数')
+    parser.add_argument('--codec', choices=(CODEC_BINARY, CODEC_JSON), default=CODEC_BINARY)
+    parser.add_argument('--ramp-up', type=float, default=5, help='逐步建立全部连接所用的时间（秒）')
+    parser.add_argument('--churn', type=float, default=0, help='每秒随机断开的连接数，断开后重新连接')
+    parser.add_argument('--churn-abort', type=float, default=0.5,
+                        help='随机断开中不发送断开消息、直接丢弃连接的比例')
+    parser.add_argument('--reconnect-delay', type=float, default=1.0, help='断开或连接失败后重连的等待时间（秒）')
+    parser.add_argument('--duration', type=float, default=30, help='测试时长（秒）')
+    parser.add_argument('--report-interval', type=float, default=5, help='输出统计的间隔（秒）')
+    parser.add_argument('--id-prefix', default='load-', help='客户端ID前缀')
+    parser.add_argument('--seed', type=int, help='传感器读数的随机数种子')
+    parser.add_argument('--gateway-size', type=int, default=0,
+                        help='网关模式下每个连接注册的传感器数，0 表示每个传感器一个连接')
+    args = parser.parse_args()
+    if not 1 <= args.batch_size <= MAX_BATCH_SIZE:
+        parser.error(f'批量大小应在 1~{MAX_BATCH_SIZE} 之间')
+    if not 0 <= args.gateway_size <= MAX_GATEWAY_SENSORS:
+        parser.error(f'网关传感器数应在 0~{MAX_GATEWAY_SENSORS} 之间')
+
+    raise_open_file_limit()
+    try:
+        asyncio.run(LoadGenerator(args).run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()